@@ -3,17 +3,24 @@ Application factory.
 
 - Bootstraps Flask, extensions, blueprints.
 - Provides a lightweight health check.
+- Serves Prometheus metrics at /metrics (utils.metrics) and times every request
+  into http_request_seconds (until the response is returned; streamed bodies
+  are covered by their own spans).
 - For production use Gunicorn + multiple workers.
 """
 
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from config import Config
-from extensions import db, migrate, init_redis, init_celery
+from extensions import db, migrate, init_redis, init_celery, http_pool_stats
 import os
+import time
+from utils import metrics
 
 def create_app(config_object=Config):
     app = Flask(__name__, instance_relative_config=False)
     app.config.from_object(config_object)
+    for problem in config_object.validate():
+        app.logger.error("Configuration: %s", problem)
 
     # Initialize extensions
     db.init_app(app)
@@ -32,9 +39,26 @@ def create_app(config_object=Config):
     app.register_blueprint(agent_bp, url_prefix="/api/agent")
     app.register_blueprint(transaction_bp, url_prefix="/api/transaction")
 
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.get("request_started")
+        if started is not None and request.endpoint != "metrics_endpoint":
+            metrics.observe("http_request_seconds", time.perf_counter() - started,
+                            endpoint=request.endpoint or "unmatched", method=request.method,
+                            status=response.status_code)
+        return response
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
     @app.get("/health")
     def health_check():
-        return jsonify({"status": "ok", "env": app.config.get("ENV")})
+        return jsonify({"status": "ok", "env": app.config.get("ENV"), "http_pools": http_pool_stats()})
 
     return app
 
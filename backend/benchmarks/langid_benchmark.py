@@ -0,0 +1,70 @@
+"""
+Accuracy and speed of services.language_id on a held-out labelled sample.
+
+    python -m benchmarks.langid_benchmark [--repeat 200]
+
+The sample, benchmarks/data/langid_sample.jsonl, holds English, romanized and
+native-script hi/ta/te/bn/kn/ml. None of its sentences are in the training
+corpus (services.language_corpus). A prediction counts only if the locale is
+right, script included.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from services import language_id
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "data", "langid_sample.jsonl")
+
+
+def load_sample(path: str = SAMPLE_PATH):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def evaluate(sample):
+    by_locale, confident, errors = {}, 0, []
+    for row in sample:
+        detection = language_id.detect(row["text"])
+        predicted = detection["locale"] if detection else None
+        ok, n = by_locale.get(row["locale"], (0, 0))
+        by_locale[row["locale"]] = (ok + (predicted == row["locale"]), n + 1)
+        confident += bool(detection and detection["confident"])
+        if predicted != row["locale"]:
+            errors.append({"text": row["text"], "expected": row["locale"], "predicted": predicted})
+    correct = sum(ok for ok, _ in by_locale.values())
+    return {
+        "accuracy": round(correct / len(sample), 3),
+        "accuracy_by_locale": {loc: round(ok / n, 3) for loc, (ok, n) in sorted(by_locale.items())},
+        "confident_share": round(confident / len(sample), 3),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    sample = load_sample()
+    texts = [row["text"] for row in sample]
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            language_id.detect(text)
+    elapsed = time.perf_counter() - t0
+    n = args.repeat * len(texts)
+
+    report = {
+        "sample_size": len(sample),
+        "model": {"features": len(language_id._index), "table_kb": round(language_id._table.nbytes / 1024, 1)},
+        **evaluate(sample),
+        "speed": {"msgs_per_sec": round(n / elapsed), "us_per_msg": round(elapsed / n * 1e6, 2)},
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Offline load test for /api/chat/send and /api/voice/upload against local
+provider stand-ins (benchmarks.stand_ins), SQLite and fakeredis:
+    python -m benchmarks.load_test --requests 500 --concurrency 16 --llm 800:2500:0.01
+    python -m benchmarks.load_test --save-baseline benchmarks/data/load_baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/data/load_baseline.json   # exit 1 on regression
+
+The app is built by app.create_app and served on a local threaded server, so
+requests go through the real middleware, pools and rate limiter. Pass
+--database-url postgresql://... / --redis-url redis://... to run against local
+services instead. Reports p50/p95/p99, throughput, errors and SLA breaches per
+endpoint (voice latency is time to first audio byte, the VOICE_RESPONSE_SLA_MS
+measure), plus provider request counts.
+
+Provider specs are "median_ms:p99_ms[:error_rate]". Background work (Celery
+tasks) goes to an in-memory broker and is not executed.
+"""
+
+import abc
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.stand_ins import LatencyModel, ProviderStandIns
+
+QUESTIONS = [
+    "My internet is down since morning",
+    "What is the status of my refund?",
+    "How do I change my plan?",
+    "I was charged twice this month",
+    "Mera internet kaam nahi kar raha hai",
+    "Can I talk to a human agent?",
+]
+METRICS_LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def wav_sample(seconds: float = 1.5, rate: int = 16000) -> bytes:
+    """16-bit mono WAV: a short silence, one second of voiced tone, trailing silence."""
+    t = np.arange(int(rate * 1.0)) / rate
+    voiced = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    silence = np.zeros(int(rate * max(seconds - 1.0, 0) / 2))
+    samples = np.concatenate([silence, voiced, silence])
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def configure_env(stand_ins: ProviderStandIns, args, workdir: str) -> None:
+    """Must run before config/app are imported: Config reads the environment at import time."""
+    os.environ.update(stand_ins.env())
+    os.environ.update({"OPENAI_API_KEY": "sk-standin", "WHISPER_API_KEY": "standin", "TTS_API_KEY": "standin"})
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    os.environ.setdefault("TTS_CACHE_DIR", os.path.join(workdir, "tts"))
+    os.environ.setdefault("RETRIEVAL_INDEX_DIR", os.path.join(workdir, "retrieval"))
+    os.environ.setdefault("RATE_LIMIT_IP_MULTIPLIER", "1000000")  # all load comes from one address
+    os.environ.setdefault("BLIND_INDEX_KEY", "load-test-only")
+
+
+def build_app(args):
+    from config import Config
+    from app import create_app
+    from extensions import db
+
+    class LoadTestConfig(Config):
+        CELERY_BROKER_URL = "memory://"
+        CELERY_RESULT_BACKEND = "cache+memory://"
+        if not args.redis_url:
+            @staticmethod
+            def REDIS_CLIENT_FACTORY(url):
+                import fakeredis  # fakeredis[lua]: the rate limiter and queues use Lua scripts
+                return fakeredis.FakeRedis()
+        if not args.database_url:
+            SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30, "check_same_thread": False}}
+
+    app = create_app(LoadTestConfig)
+    with app.app_context():
+        db.create_all()
+        if db.engine.dialect.name == "sqlite":
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA journal_mode=WAL")  # concurrent readers during writes
+    return app, Config
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Endpoint(abc.ABC):
+    def __init__(self, name: str, sla_ms: int):
+        self.name = name
+        self.sla_ms = sla_ms
+
+    @abc.abstractmethod
+    def call(self, session: requests.Session, base_url: str, i: int, args) -> tuple:
+        """(ok, latency_ms) for request number i."""
+
+
+class ChatSend(Endpoint):
+    def call(self, session, base_url, i, args):
+        rng = random.Random(i)
+        message = rng.choice(QUESTIONS)
+        if rng.random() >= args.repeat_rate:
+            message = f"{message} (ref {i})"  # unique text: LLM response-cache miss
+        t0 = time.perf_counter()
+        resp = session.post(f"{base_url}/api/chat/send", json={
+            "user_id": f"load-user-{i % args.users}", "message": message, "locale": "en_IN"})
+        return resp.status_code == 200, (time.perf_counter() - t0) * 1000
+
+
+class VoiceUpload(Endpoint):
+    audio = None
+
+    def call(self, session, base_url, i, args):
+        t0 = time.perf_counter()
+        resp = session.post(f"{base_url}/api/voice/upload", stream=True,
+                            files={"file": ("call.wav", self.audio, "audio/wav")},
+                            data={"user_id": f"load-caller-{i % args.users}", "locale": "en_IN"})
+        first_byte_ms = None
+        with resp:
+            for chunk in resp.iter_content(chunk_size=4096):
+                if chunk and first_byte_ms is None:
+                    first_byte_ms = (time.perf_counter() - t0) * 1000
+        ok = resp.status_code == 200 and first_byte_ms is not None
+        return ok, first_byte_ms if first_byte_ms is not None else (time.perf_counter() - t0) * 1000
+
+
+def percentiles(samples_ms) -> dict:
+    if not samples_ms:
+        return {f"p{p}_ms": None for p in (50, 95, 99)}
+    return {f"p{p}_ms": round(float(np.percentile(samples_ms, p)), 2) for p in (50, 95, 99)}
+
+
+def run_endpoint(endpoint: Endpoint, base_url: str, args) -> dict:
+    local = threading.local()
+    start_index = args.warmup
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def one(i):
+        try:
+            return endpoint.call(session(), base_url, i, args)
+        except requests.RequestException:
+            return False, None
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.warmup)))  # fills caches and connection pools
+        t0 = time.perf_counter()
+        results = list(pool.map(one, range(start_index, start_index + args.requests)))
+        elapsed = time.perf_counter() - t0
+
+    ok_latencies = [ms for ok, ms in results if ok]
+    errors = len(results) - len(ok_latencies)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(ok_latencies) / elapsed, 2) if elapsed else 0.0,
+        **percentiles(ok_latencies),
+        "sla_ms": endpoint.sla_ms,
+        "sla_breach_rate": round(sum(ms > endpoint.sla_ms for ms in ok_latencies) / len(ok_latencies), 4)
+        if ok_latencies else None,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Human-readable regressions of results against baseline (latency, throughput, error rate)."""
+    regressions = []
+    for name, base in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(name)
+        if current is None:
+            continue
+        for metric in METRICS_LOWER_IS_BETTER:
+            old, new = base.get(metric), current.get(metric)
+            if old is not None and new is not None and new > old * (1 + tolerance) and new - old > min_delta_ms:
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+        old, new = base.get("throughput_rps"), current.get("throughput_rps")
+        if old and new is not None and new < old * (1 - tolerance):
+            regressions.append(f"{name} throughput_rps: {old} -> {new}")
+        old, new = base.get("error_rate", 0.0), current.get("error_rate", 0.0)
+        if new > old + 0.01:
+            regressions.append(f"{name} error_rate: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoints", default="chat_send,voice_upload")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50, help="distinct users (conversations are reused)")
+    parser.add_argument("--repeat-rate", type=float, default=0.2, help="share of canned questions (cacheable)")
+    parser.add_argument("--llm", default="600:2000:0.0", help="median_ms:p99_ms[:error_rate]")
+    parser.add_argument("--stt", default="300:900:0.0")
+    parser.add_argument("--tts", default="150:500:0.0")
+    parser.add_argument("--token-ms", type=float, default=15, help="stand-in LLM inter-token delay when streaming")
+    parser.add_argument("--database-url", default=None, help="default: SQLite in a temp dir")
+    parser.add_argument("--redis-url", default=None, help="default: in-process fakeredis")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--save-baseline", default=None, help="write results as the new baseline")
+    parser.add_argument("--baseline", default=None, help="compare against this baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore latency changes below this")
+    args = parser.parse_args()
+    # Injected provider failures would log a traceback each; failures are counted in the results
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger("werkzeug").setLevel(logging.CRITICAL)
+
+    llm, stt, tts = LatencyModel.parse(args.llm), LatencyModel.parse(args.stt), LatencyModel.parse(args.tts)
+    stand_ins = ProviderStandIns(llm, stt, tts, token_ms=args.token_ms)
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    configure_env(stand_ins, args, workdir)
+    try:
+        app, Config = build_app(args)
+        server, base_url = serve(app)
+        VoiceUpload.audio = wav_sample()
+        endpoints = {
+            "chat_send": ChatSend("chat_send", Config.TEXT_RESPONSE_SLA_MS),
+            "voice_upload": VoiceUpload("voice_upload", Config.VOICE_RESPONSE_SLA_MS),
+        }
+        results = {
+            "settings": {"requests": args.requests, "concurrency": args.concurrency, "users": args.users,
+                         "repeat_rate": args.repeat_rate, "llm": llm.describe(), "stt": stt.describe(),
+                         "tts": tts.describe(), "database": "sqlite" if not args.database_url else "external",
+                         "redis": "fakeredis" if not args.redis_url else "external"},
+            "endpoints": {},
+            "providers": {},
+        }
+        for name in args.endpoints.split(","):
+            stand_ins.reset()
+            results["endpoints"][name] = run_endpoint(endpoints[name], base_url, args)
+            results["providers"][name] = stand_ins.counts
+        server.shutdown()
+    finally:
+        stand_ins.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as fh:
+                json.dump(results, fh, indent=2)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance, args.min_delta_ms)
+        results["regressions"] = regressions
+    print(json.dumps(results, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
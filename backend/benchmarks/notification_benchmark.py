@@ -0,0 +1,159 @@
+"""
+Throughput benchmark for services.notification_dispatcher against local stand-in
+Twilio/SendGrid servers (no vendor traffic):
+    python -m benchmarks.notification_benchmark --recipients 5000 --latency-ms 40 --error-rate 0.01
+
+Simulates an incident broadcast: every recipient gets the same SMS and email, a
+fraction get a second update and a duplicate. Compares one vendor call per
+message (what one Celery task per notification did) with the dispatcher's
+dedupe + coalesce + bulk path. Uses fakeredis when installed, else REDIS_URL.
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import redis
+
+from config import Config
+from services import notification_dispatcher, notifications
+
+
+class StandIn:
+    """Local HTTP server answering the Twilio Messages and SendGrid mail/send endpoints."""
+
+    def __init__(self, latency_ms: float, error_rate: float):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.counts = {"sms_requests": 0, "email_requests": 0, "email_personalizations": 0, "errors": 0}
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(stand_in.latency)
+                with stand_in.lock:
+                    if random.random() < stand_in.error_rate:
+                        stand_in.counts["errors"] += 1
+                        return self._reply(503, b"{}")
+                    if self.path.endswith("/Messages.json"):
+                        stand_in.counts["sms_requests"] += 1
+                        return self._reply(201, b'{"sid": "SM1", "status": "queued"}')
+                    stand_in.counts["email_requests"] += 1
+                    stand_in.counts["email_personalizations"] += len(json.loads(body)["personalizations"])
+                return self._reply(202, b"")
+
+            def _reply(self, status, payload):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {key: 0 for key in self.counts}
+
+
+def workload(recipients: int, followup_rate: float, duplicate_rate: float, seed: int = 0):
+    rng = random.Random(seed)
+    sms, email = [], []
+    for i in range(recipients):
+        phone, addr = f"+9190000{i:05d}", f"user{i}@example.com"
+        sms.append((phone, "Service outage in your area. We are working on it."))
+        email.append((addr, "Service outage", "<p>Service outage in your area. We are working on it.</p>"))
+        if rng.random() < followup_rate:
+            sms.append((phone, "Update: engineers are on site, ETA 2 hours."))
+            email.append((addr, "Service outage", "<p>Update: engineers are on site, ETA 2 hours.</p>"))
+        if rng.random() < duplicate_rate:
+            sms.append(sms[-1])
+            email.append(email[-1])
+    return sms, email
+
+
+def run_naive(sms, email, concurrency: int) -> float:
+    def send(job):
+        try:
+            job()
+        except Exception:
+            pass  # a real task would retry; failures are counted by the stand-in
+    jobs = [lambda m=m: notifications.send_sms(*m) for m in sms] + \
+           [lambda m=m: notifications.send_email(*m) for m in email]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, jobs))
+    return time.perf_counter() - t0
+
+
+def run_dispatcher(sms, email) -> dict:
+    t0 = time.perf_counter()
+    for to, body in sms:
+        notification_dispatcher.enqueue_sms(to, body, notification_dispatcher.BULK)
+    for to, subject, body in email:
+        notification_dispatcher.enqueue_email(to, subject, body, notification_dispatcher.BULK)
+    enqueue_s = time.perf_counter() - t0
+    stats = {channel: notification_dispatcher.flush(channel, notification_dispatcher.BULK)
+             for channel in notification_dispatcher.CHANNELS}
+    return {"enqueue_s": enqueue_s, "total_s": time.perf_counter() - t0, "flush": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=2000)
+    parser.add_argument("--followup-rate", type=float, default=0.3)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # injected 503s would otherwise log one warning each
+
+    try:
+        import fakeredis
+        notification_dispatcher.redis_client = fakeredis.FakeRedis()
+    except ImportError:
+        notification_dispatcher.redis_client = redis.from_url(Config.REDIS_URL)
+    notification_dispatcher.schedule_flush = lambda *a, **k: None  # flushed explicitly below
+
+    stand_in = StandIn(args.latency_ms, args.error_rate)
+    Config.TWILIO_API_URL = Config.SENDGRID_API_URL = stand_in.url
+    Config.TWILIO_ACCOUNT_SID, Config.TWILIO_FROM_NUMBER = "ACbench", "+10000000000"
+    Config.SENDGRID_FROM_EMAIL = "support@example.com"
+
+    sms, email = workload(args.recipients, args.followup_rate, args.duplicate_rate)
+    messages = len(sms) + len(email)
+
+    naive_s = run_naive(sms, email, Config.NOTIFY_SMS_CONCURRENCY)
+    naive_counts = dict(stand_in.counts)
+    stand_in.reset()
+    dispatched = run_dispatcher(sms, email)
+
+    print(json.dumps({
+        "messages": messages,
+        "stand_in_latency_ms": args.latency_ms,
+        "per_message": {"seconds": round(naive_s, 2), "msgs_per_s": round(messages / naive_s, 1),
+                        "vendor": naive_counts},
+        "dispatcher": {"seconds": round(dispatched["total_s"], 2),
+                       "enqueue_seconds": round(dispatched["enqueue_s"], 2),
+                       "msgs_per_s": round(messages / dispatched["total_s"], 1),
+                       "vendor": stand_in.counts, "flush": dispatched["flush"]},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Lookup-by-phone benchmark: blind-index equality vs decrypt-and-scan.
+
+Builds a SQLite users table with an indexed phone_bidx column (default 10M rows):
+    python -m benchmarks.pii_lookup_benchmark --users 10000000 --queries 2000
+
+Bulk rows only carry the blind index (ciphertext size does not change an index
+probe); the decrypt path is measured on a real Fernet sample and extrapolated to
+the full table, since actually decrypting 10M rows per lookup is the problem
+being removed. Reports lookup p50/p95/p99, and serial vs decrypt_many throughput.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault("BLIND_INDEX_KEY", "benchmark-only")  # utils.security refuses to start without one
+from utils.security import blind_index, decrypt_many, encrypt_field, fernet
+
+
+def phone(i: int) -> str:
+    return f"+91 9{i:09d}"
+
+
+def build(path: str, users: int, chunk: int = 200000) -> float:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, phone_enc BLOB, phone_bidx BLOB)")
+    t0 = time.perf_counter()
+    for start in range(0, users, chunk):
+        rows = ((i, None, blind_index(phone(i), "phone")) for i in range(start, min(start + chunk, users)))
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)", rows)
+    conn.execute("CREATE INDEX ix_users_phone_bidx ON users (phone_bidx)")
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def percentiles(samples_ms) -> dict:
+    return {f"p{p}_ms": round(float(np.percentile(samples_ms, p)), 4) for p in (50, 95, 99)}
+
+
+def bench_lookup(path: str, users: int, queries: int) -> dict:
+    conn = sqlite3.connect(path)
+    rng = random.Random(0)
+    latencies = []
+    for q in range(queries):
+        # 90% existing users, 10% unknown callers
+        number = phone(rng.randrange(users)) if q % 10 else f"+1 555{rng.randrange(10 ** 7):07d}"
+        t0 = time.perf_counter()
+        conn.execute("SELECT id FROM users WHERE phone_bidx = ?", (blind_index(number, "phone"),)).fetchall()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    conn.close()
+    return percentiles(latencies)
+
+
+def bench_decrypt(users: int, sample: int) -> dict:
+    ciphers = [encrypt_field(phone(i)) for i in range(sample)]
+    t0 = time.perf_counter()
+    for c in ciphers:
+        fernet.decrypt(c)
+    serial_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    decrypt_many(ciphers)
+    batched_s = time.perf_counter() - t0
+    return {
+        "sample": sample,
+        "serial_per_s": round(sample / serial_s),
+        "decrypt_many_per_s": round(sample / batched_s),
+        "full_scan_lookup_estimate_s": round(users * batched_s / sample, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--decrypt-sample", type=int, default=20000)
+    parser.add_argument("--db", default=None, help="SQLite path (default: temp file, removed afterwards)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="pii-bench-"), "users.db")
+    try:
+        build_s = build(path, args.users) if not os.path.exists(path) else 0.0
+        results = {
+            "users": args.users,
+            "build_s": round(build_s, 1),
+            "blind_index_lookup": bench_lookup(path, args.users, args.queries),
+            "decrypt": bench_decrypt(args.users, args.decrypt_sample),
+        }
+    finally:
+        if not args.db and os.path.exists(path):
+            os.unlink(path)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
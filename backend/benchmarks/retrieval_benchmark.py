@@ -0,0 +1,80 @@
+"""
+Recall/latency benchmark for services.retrieval (exact scan vs IVF).
+
+Runs offline on synthetic clustered embeddings, no provider calls:
+    python -m benchmarks.retrieval_benchmark --rows 200000 --dim 1536 --queries 200
+
+Reports p50/p95 query latency for each mode and IVF recall@k against the exact scan.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from config import Config
+from services.retrieval import VectorStore, _normalize
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = _normalize(rng.normal(size=(clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, clusters, rows)
+    noise = rng.normal(scale=0.5 / np.sqrt(dim) * 8, size=(rows, dim)).astype(np.float32)
+    return _normalize(centers[labels] + noise), rng
+
+
+def percentile(samples, pct):
+    return round(float(np.percentile(samples, pct)), 3)
+
+
+def run(rows: int, dim: int, queries: int, k: int, nlist: int, nprobe: int, dtype: str) -> dict:
+    Config.RETRIEVAL_DTYPE = dtype
+    Config.RETRIEVAL_IVF_NPROBE = nprobe
+    data, rng = synthetic_corpus(rows, dim, clusters=max(nlist // 4, 8))
+    store = VectorStore(tempfile.mkdtemp(prefix="retrieval-bench-"))
+    for start in range(0, rows, 10000):
+        block = data[start:start + 10000]
+        store.add(start, [""] * len(block), block)
+
+    t0 = time.perf_counter()
+    store.build_ivf(nlist=nlist)
+    build_s = time.perf_counter() - t0
+    store.refresh(force=True)
+
+    picks = rng.choice(rows, size=queries, replace=False)
+    probes = _normalize(data[picks] + rng.normal(scale=0.02, size=(queries, dim)).astype(np.float32))
+
+    results = {"rows": rows, "dim": dim, "dtype": dtype, "k": k, "nlist": nlist, "nprobe": nprobe,
+               "ivf_build_s": round(build_s, 2)}
+    hits = {}
+    for mode, use_ivf in (("exact", False), ("ivf", True)):
+        latencies, hits[mode] = [], []
+        for q in probes:
+            t0 = time.perf_counter()
+            found = store.search(q, k, use_ivf=use_ivf)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits[mode].append({(r["doc_id"], r["chunk"]) for _, r in found})
+        results[mode] = {"p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}
+    results["ivf"]["recall_at_k"] = round(
+        float(np.mean([len(a & b) / k for a, b in zip(hits["exact"], hits["ivf"])])), 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.dim, args.queries, args.k, args.nlist, args.nprobe, args.dtype), indent=2))
+
+
+if __name__ == "__main__":
+    main()
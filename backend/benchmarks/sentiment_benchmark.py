@@ -0,0 +1,85 @@
+"""
+Throughput and accuracy of services.sentiment_service vs. the old per-call TextBlob path.
+
+    python -m benchmarks.sentiment_benchmark [--repeat 200]
+
+Accuracy is 3-way (positive/neutral/negative) on the bundled labelled sample
+benchmarks/data/sentiment_sample.jsonl (English, Hindi, Hinglish, Tamil, romanized Tamil).
+TextBlob is optional; it is skipped if not installed.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from services.sentiment_service import analyze_sentiment, analyze_sentiment_batch, sentiment_label
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "data", "sentiment_sample.jsonl")
+
+
+def load_sample(path: str = SAMPLE_PATH):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def accuracy(scores, sample, by_lang=False):
+    correct = {}
+    for score, row in zip(scores, sample):
+        lang = row["locale"].split("_")[0] if by_lang else "all"
+        ok, n = correct.get(lang, (0, 0))
+        correct[lang] = (ok + (sentiment_label(score) == row["label"]), n + 1)
+    return {lang: round(ok / n, 3) for lang, (ok, n) in correct.items()}
+
+
+def throughput(fn, texts, locales, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for text, locale in zip(texts, locales):
+            fn(text, locale)
+    elapsed = time.perf_counter() - t0
+    n = repeat * len(texts)
+    return {"msgs_per_sec": round(n / elapsed), "us_per_msg": round(elapsed / n * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    sample = load_sample()
+    texts = [row["text"] for row in sample]
+    locales = [row["locale"] for row in sample]
+
+    t0 = time.perf_counter()
+    batch_scores = analyze_sentiment_batch(texts * args.repeat, locales * args.repeat)
+    batch_elapsed = time.perf_counter() - t0
+    report = {
+        "sample_size": len(sample),
+        "lexicon": {
+            "accuracy": accuracy(batch_scores[:len(sample)], sample),
+            "accuracy_by_lang": accuracy(batch_scores[:len(sample)], sample, by_lang=True),
+            "single": throughput(analyze_sentiment, texts, locales, args.repeat),
+            "batch": {"msgs_per_sec": round(len(batch_scores) / batch_elapsed)},
+        },
+    }
+
+    try:
+        from textblob import TextBlob
+    except ImportError:
+        report["textblob"] = "not installed"
+    else:
+        def textblob_score(text, locale):
+            return TextBlob(text).sentiment.polarity
+        scores = [textblob_score(t, l) for t, l in zip(texts, locales)]
+        report["textblob"] = {
+            "accuracy": accuracy(scores, sample),
+            "accuracy_by_lang": accuracy(scores, sample, by_lang=True),
+            "single": throughput(textblob_score, texts, locales, max(1, args.repeat // 10)),
+        }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
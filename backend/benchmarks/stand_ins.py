@@ -0,0 +1,221 @@
+"""
+Local stand-ins for the LLM, STT and TTS providers (no vendor traffic).
+
+One keep-alive HTTP server answers the endpoints the services call:
+- POST /v1/chat/completions   OpenAI chat, plain JSON or SSE when "stream": true
+- POST /v1/embeddings         OpenAI embeddings (deterministic vectors)
+- POST /v1/audio/transcriptions  Whisper, returns {"text": ...}
+- POST /v1/text:synthesize    Google TTS, returns {"audioContent": base64}
+
+Each provider gets a LatencyModel: lognormal with a given median and p99, plus
+an error rate answered with 503 (retryable, so STT retries and LLM fallback
+paths are exercised). Point the app at it with OPENAI_API_BASE=<url>/v1,
+WHISPER_API_URL=<url>/v1/audio/transcriptions and TTS_API_URL=<url>/v1/text:synthesize.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+Z_99 = 2.3263  # standard normal 99th percentile
+
+REPLIES = [
+    "Thanks for reaching out. I have checked your account and the connection looks active. "
+    "Please restart your router and let me know if the problem continues.",
+    "I understand how frustrating this is. Your refund was issued today. It should reach your bank in 3 to 5 days.",
+    "Your current plan includes unlimited calls and 2 GB of data per day. Would you like to upgrade?",
+]
+TRANSCRIPTS = [
+    "My internet has been down since morning",
+    "I want to know the status of my refund",
+    "Which plan am I on right now",
+    "Please connect me to a human agent",
+]
+
+
+class LatencyModel:
+    """Lognormal latency defined by its median and p99 (ms), plus an error rate."""
+
+    def __init__(self, median_ms: float, p99_ms: float = None, error_rate: float = 0.0):
+        p99_ms = max(p99_ms or median_ms, median_ms)
+        self.median_ms = median_ms
+        self.p99_ms = p99_ms
+        self.error_rate = error_rate
+        self._mu = math.log(max(median_ms, 0.001))
+        self._sigma = math.log(p99_ms / median_ms) / Z_99 if median_ms > 0 else 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """"median_ms:p99_ms[:error_rate]", e.g. "800:2500:0.01"."""
+        parts = [float(p) for p in spec.split(":")]
+        return cls(*parts)
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(self._mu, self._sigma) / 1000.0
+
+    def fails(self, rng: random.Random) -> bool:
+        return rng.random() < self.error_rate
+
+    def describe(self) -> dict:
+        return {"median_ms": self.median_ms, "p99_ms": self.p99_ms, "error_rate": self.error_rate}
+
+
+class ProviderStandIns:
+    """Threaded HTTP server impersonating the three providers; counts requests and injected errors."""
+
+    def __init__(self, llm: LatencyModel, stt: LatencyModel, tts: LatencyModel,
+                 token_ms: float = 15, seed: int = 0):
+        self.models = {"llm": llm, "stt": stt, "tts": tts, "embeddings": llm}
+        self.token_ms = token_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {name: {"requests": 0, "errors": 0} for name in self.models}
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                route = stand_in.route(self.path)
+                if route is None:
+                    return self._reply(404, b"{}")
+                delay, failed = stand_in.draw(route)
+                if failed:
+                    time.sleep(delay)
+                    return self._reply(503, b'{"error": {"message": "injected failure"}}')
+                if route == "llm":
+                    request = json.loads(body)
+                    if request.get("stream"):
+                        return self._stream_chat(request, delay)
+                    time.sleep(delay)
+                    return self._json(stand_in.chat_completion(request))
+                time.sleep(delay)
+                if route == "embeddings":
+                    return self._json(stand_in.embeddings(json.loads(body)))
+                if route == "stt":
+                    return self._json({"text": stand_in.choice(TRANSCRIPTS)})
+                return self._json({"audioContent": stand_in.audio(body)})
+
+            def _stream_chat(self, request, delay):
+                # Time to first token is ~1/3 of the sampled latency; tokens then arrive every token_ms
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(delay / 3)
+                for i, token in enumerate(stand_in.reply_tokens()):
+                    if i:
+                        time.sleep(stand_in.token_ms / 1000.0)
+                    self._chunk(_sse({"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}))
+                self._chunk(_sse({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+                self._chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _json(self, payload):
+                return self._reply(200, json.dumps(payload).encode("utf-8"))
+
+            def _reply(self, status, payload):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, name="stand-ins", daemon=True).start()
+
+    def env(self) -> dict:
+        """Environment variables pointing the services at this server."""
+        return {
+            "OPENAI_API_BASE": f"{self.url}/v1",
+            "WHISPER_API_URL": f"{self.url}/v1/audio/transcriptions",
+            "TTS_API_URL": f"{self.url}/v1/text:synthesize",
+        }
+
+    @staticmethod
+    def route(path: str):
+        path = path.split("?", 1)[0]
+        if path.endswith("/chat/completions"):
+            return "llm"
+        if path.endswith("/embeddings"):
+            return "embeddings"
+        if path.endswith("/audio/transcriptions"):
+            return "stt"
+        if path.endswith("text:synthesize"):
+            return "tts"
+        return None
+
+    def draw(self, route: str):
+        model = self.models[route]
+        with self.lock:
+            delay, failed = model.sample(self.rng), model.fails(self.rng)
+            self.counts[route]["requests"] += 1
+            self.counts[route]["errors"] += int(failed)
+        return delay, failed
+
+    def choice(self, options):
+        with self.lock:
+            return self.rng.choice(options)
+
+    def reply_tokens(self):
+        words = self.choice(REPLIES).split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def chat_completion(self, request: dict) -> dict:
+        reply = "".join(self.reply_tokens())
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+        completion_tokens = len(reply.split())
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @staticmethod
+    def embeddings(request: dict) -> dict:
+        inputs = request.get("input") or []
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = []
+        for i, text in enumerate(inputs):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+            rng = random.Random(seed)
+            data.append({"object": "embedding", "index": i, "embedding": [rng.uniform(-1, 1) for _ in range(1536)]})
+        return {"object": "list", "data": data, "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @staticmethod
+    def audio(body: bytes) -> str:
+        # ~4 KB of opaque "audio" per request, roughly one spoken sentence of 64 kbps MP3
+        text = json.loads(body).get("input", {}).get("text", "")
+        return base64.b64encode(hashlib.sha256(text.encode("utf-8")).digest() * 128).decode("ascii")
+
+    def reset(self):
+        with self.lock:
+            self.counts = {name: {"requests": 0, "errors": 0} for name in self.models}
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _sse(payload: dict) -> bytes:
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
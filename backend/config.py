@@ -26,14 +26,21 @@ class Config:
 
     # External APIs (limit to 3: SMS, EMAIL, PAYMENT)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
     WHISPER_API_KEY = os.getenv("WHISPER_API_KEY")
+    WHISPER_API_URL = os.getenv("WHISPER_API_URL", "https://api.openai.com/v1/audio/transcriptions")
 
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER")
+    TWILIO_API_URL = os.getenv("TWILIO_API_URL", "https://api.twilio.com")
 
     SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
     SENDGRID_FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL")
+    SENDGRID_API_URL = os.getenv("SENDGRID_API_URL", "https://api.sendgrid.com")
+
+    TTS_API_KEY = os.getenv("TTS_API_KEY")
+    TTS_API_URL = os.getenv("TTS_API_URL", "https://texttospeech.googleapis.com/v1/text:synthesize")
 
     STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
     STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
@@ -41,16 +48,188 @@ class Config:
     # SLA / Performance tuning
     LLM_REQUEST_TIMEOUT_SEC = int(os.getenv("LLM_REQUEST_TIMEOUT_SEC", "8"))
     STT_REQUEST_TIMEOUT_SEC = int(os.getenv("STT_REQUEST_TIMEOUT_SEC", "10"))
+    TTS_REQUEST_TIMEOUT_SEC = int(os.getenv("TTS_REQUEST_TIMEOUT_SEC", "5"))
     TEXT_RESPONSE_SLA_MS = int(os.getenv("TEXT_RESPONSE_SLA_MS", "5000"))
     VOICE_RESPONSE_SLA_MS = int(os.getenv("VOICE_RESPONSE_SLA_MS", "15000"))
 
+    # LLM provider routing (circuit breaker + hedged requests)
+    LLM_DEADLINE_RESERVE_MS = int(os.getenv("LLM_DEADLINE_RESERVE_MS", "500"))  # SLA headroom kept for DB/persistence
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_DEFAULT_MS = int(os.getenv("LLM_HEDGE_DEFAULT_MS", "2500"))  # used until enough latency samples exist
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN_SEC = int(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+    LLM_ROUTER_MAX_WORKERS = int(os.getenv("LLM_ROUTER_MAX_WORKERS", "32"))
+    PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "16"))  # per-process stage pool for /send
+    PIPELINE_BACKGROUND_WORKERS = int(os.getenv("PIPELINE_BACKGROUND_WORKERS", "4"))  # fire-and-forget writes
+    PIPELINE_VOICE_WORKERS = int(os.getenv("PIPELINE_VOICE_WORKERS", "8"))  # per-sentence TTS of streamed voice replies
+
+    # Outbound provider HTTP (shared keep-alive pools, see extensions.http_session)
+    HTTP_CONNECT_TIMEOUT_SEC = float(os.getenv("HTTP_CONNECT_TIMEOUT_SEC", "3"))
+    HTTP_READ_TIMEOUT_SEC = float(os.getenv("HTTP_READ_TIMEOUT_SEC", "10"))  # default when a call has no SLA timeout
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))  # kept-alive connections per host
+    # Per-host overrides, e.g. "api.openai.com=64,texttospeech.googleapis.com=32"
+    HTTP_POOL_SIZES = os.getenv("HTTP_POOL_SIZES", "api.openai.com=64")
+    HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true"  # wait for a free connection instead of opening a throwaway one
+    CRM_BASE_URL = os.getenv("CRM_BASE_URL")  # unset -> CRM adapter runs in stub mode
+    CRM_API_KEY = os.getenv("CRM_API_KEY")
+    CRM_REQUEST_TIMEOUT_SEC = float(os.getenv("CRM_REQUEST_TIMEOUT_SEC", "3"))
+
+    # CRM profile cache + ticket batching (services.crm_cache)
+    CRM_FIELD_TTLS = os.getenv("CRM_FIELD_TTLS", "name=86400,email=21600,phone=21600,products=600")
+    CRM_DEFAULT_FIELD_TTL_SEC = int(os.getenv("CRM_DEFAULT_FIELD_TTL_SEC", "3600"))
+    CRM_STALE_FACTOR = float(os.getenv("CRM_STALE_FACTOR", "4"))  # stale fields are served (and refreshed) until ttl x factor
+    CRM_NEGATIVE_TTL_SEC = int(os.getenv("CRM_NEGATIVE_TTL_SEC", "300"))  # "unknown user" answers
+    CRM_CACHE_LOCAL_MAX = int(os.getenv("CRM_CACHE_LOCAL_MAX", "5000"))
+    CRM_CACHE_LOCAL_TTL_SEC = int(os.getenv("CRM_CACHE_LOCAL_TTL_SEC", "30"))
+    CRM_BATCH_SIZE = int(os.getenv("CRM_BATCH_SIZE", "50"))  # ids per bulk profile lookup
+    CRM_PREFETCH_INTERVAL_SEC = int(os.getenv("CRM_PREFETCH_INTERVAL_SEC", "600"))  # 0 disables the beat job
+    CRM_TICKET_BATCH_WINDOW_SEC = int(os.getenv("CRM_TICKET_BATCH_WINDOW_SEC", "5"))
+    CRM_TICKET_BATCH_MAX = int(os.getenv("CRM_TICKET_BATCH_MAX", "50"))
+    CRM_TICKET_DEDUPE_TTL_SEC = int(os.getenv("CRM_TICKET_DEDUPE_TTL_SEC", "86400"))
+    CRM_TICKET_FLUSH_LOCK_SEC = int(os.getenv("CRM_TICKET_FLUSH_LOCK_SEC", "120"))  # a dead flush's batch is resent after this
+    CRM_TICKET_SWEEP_SEC = int(os.getenv("CRM_TICKET_SWEEP_SEC", "60"))  # beat safety net; 0 disables
+
+    # Notification dispatch (services.notification_dispatcher)
+    NOTIFY_QUEUE_TRANSACTIONAL = os.getenv("NOTIFY_QUEUE_TRANSACTIONAL", "notify_high")  # Celery queue names
+    NOTIFY_QUEUE_BULK = os.getenv("NOTIFY_QUEUE_BULK", "notify_bulk")
+    NOTIFY_TRANSACTIONAL_WINDOW_SEC = int(os.getenv("NOTIFY_TRANSACTIONAL_WINDOW_SEC", "1"))  # coalescing window
+    NOTIFY_BULK_WINDOW_SEC = int(os.getenv("NOTIFY_BULK_WINDOW_SEC", "15"))
+    NOTIFY_DEDUPE_TTL_SEC = int(os.getenv("NOTIFY_DEDUPE_TTL_SEC", "600"))  # identical message to same recipient
+    NOTIFY_BATCH_MAX = int(os.getenv("NOTIFY_BATCH_MAX", "1000"))  # queued items drained per flush round
+    NOTIFY_SMS_CONCURRENCY = int(os.getenv("NOTIFY_SMS_CONCURRENCY", "16"))
+    NOTIFY_SMS_MAX_CHARS = int(os.getenv("NOTIFY_SMS_MAX_CHARS", "1600"))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "6"))
+    NOTIFY_BACKOFF_BASE_SEC = float(os.getenv("NOTIFY_BACKOFF_BASE_SEC", "2"))
+    NOTIFY_BACKOFF_MAX_SEC = float(os.getenv("NOTIFY_BACKOFF_MAX_SEC", "300"))
+    NOTIFY_FLUSH_LOCK_SEC = int(os.getenv("NOTIFY_FLUSH_LOCK_SEC", "120"))  # a dead flush's in-flight batch is resent after this
+
+    # Stripe webhook pipeline + idempotent PaymentIntent creation (services.stripe_events, services.payments)
+    STRIPE_EVENT_DEDUPE_TTL_SEC = int(os.getenv("STRIPE_EVENT_DEDUPE_TTL_SEC", str(3 * 24 * 3600)))  # Stripe retries for 3 days
+    STRIPE_EVENT_SHARDS = int(os.getenv("STRIPE_EVENT_SHARDS", "8"))  # events of one PaymentIntent always share a shard
+    STRIPE_EVENT_BATCH = int(os.getenv("STRIPE_EVENT_BATCH", "100"))
+    STRIPE_EVENT_CLAIM_IDLE_MS = int(os.getenv("STRIPE_EVENT_CLAIM_IDLE_MS", "60000"))
+    STRIPE_EVENT_SWEEP_SEC = int(os.getenv("STRIPE_EVENT_SWEEP_SEC", "30"))  # beat safety net; 0 disables
+    STRIPE_EVENT_MAX_DELIVERIES = int(os.getenv("STRIPE_EVENT_MAX_DELIVERIES", "10"))  # failing event is then dead-lettered
+    STRIPE_WEBHOOK_ACK_BUDGET_MS = int(os.getenv("STRIPE_WEBHOOK_ACK_BUDGET_MS", "50"))
+    STRIPE_IDEMPOTENCY_TTL_SEC = int(os.getenv("STRIPE_IDEMPOTENCY_TTL_SEC", "86400"))  # Stripe keeps keys 24h
+
+    # Agent ticket queue (keyset pages + push feed, services.ticket_events)
+    TICKET_PAGE_MAX = int(os.getenv("TICKET_PAGE_MAX", "200"))
+    TICKET_EVENTS_MAXLEN = int(os.getenv("TICKET_EVENTS_MAXLEN", "10000"))  # approximate stream cap
+    TICKET_FEED_BUFFER = int(os.getenv("TICKET_FEED_BUFFER", "1000"))  # recent events kept per process for fan-out
+    TICKET_STREAM_HEARTBEAT_SEC = int(os.getenv("TICKET_STREAM_HEARTBEAT_SEC", "15"))
+    TICKET_LONGPOLL_MAX_SEC = int(os.getenv("TICKET_LONGPOLL_MAX_SEC", "25"))
+
+    # Streaming STT (VAD segmentation + concurrent segment transcription)
+    STT_MAX_WORKERS = int(os.getenv("STT_MAX_WORKERS", "8"))  # per-process segment transcription pool
+    STT_MAX_RETRIES = int(os.getenv("STT_MAX_RETRIES", "2"))
+    STT_VAD_FRAME_MS = int(os.getenv("STT_VAD_FRAME_MS", "30"))
+    STT_VAD_MIN_SILENCE_MS = int(os.getenv("STT_VAD_MIN_SILENCE_MS", "600"))  # pause that ends an utterance
+    STT_VAD_PAD_MS = int(os.getenv("STT_VAD_PAD_MS", "200"))  # audio kept around each utterance
+    STT_VAD_MIN_SPEECH_MS = int(os.getenv("STT_VAD_MIN_SPEECH_MS", "250"))  # shorter blips are dropped
+    STT_VAD_MAX_SEGMENT_SEC = int(os.getenv("STT_VAD_MAX_SEGMENT_SEC", "30"))
+
+    # TTS audio cache (content-addressed, size-capped LRU on disk)
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/var/cache/customer_ai/tts")
+    TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    TTS_CACHE_LOW_WATER = float(os.getenv("TTS_CACHE_LOW_WATER", "0.9"))  # evict down to 90% of the cap
+    TTS_CACHE_REDIS_INDEX = os.getenv("TTS_CACHE_REDIS_INDEX", "false").lower() == "true"
+    TTS_PREWARM_ON_START = os.getenv("TTS_PREWARM_ON_START", "true").lower() == "true"
+
+    # Knowledge retrieval (RAG) — in-process vector index
+    RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "/var/lib/customer_ai/knowledge_index")
+    RETRIEVAL_DTYPE = os.getenv("RETRIEVAL_DTYPE", "float16")  # float16 halves memory; float32 uses the BLAS path
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.75"))
+    RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "800"))
+    RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "100"))
+    RETRIEVAL_IVF_MIN_ROWS = int(os.getenv("RETRIEVAL_IVF_MIN_ROWS", "200000"))
+    RETRIEVAL_IVF_NLIST = int(os.getenv("RETRIEVAL_IVF_NLIST", "1024"))
+    RETRIEVAL_IVF_NPROBE = int(os.getenv("RETRIEVAL_IVF_NPROBE", "16"))
+    RETRIEVAL_REFRESH_SEC = float(os.getenv("RETRIEVAL_REFRESH_SEC", "1.0"))
+    RETRIEVAL_QUERY_CACHE_MAX = int(os.getenv("RETRIEVAL_QUERY_CACHE_MAX", "4096"))
+    RETRIEVAL_QUERY_CACHE_TTL_SEC = int(os.getenv("RETRIEVAL_QUERY_CACHE_TTL_SEC", "3600"))
+    RETRIEVAL_EMBED_TIMEOUT_MS = int(os.getenv("RETRIEVAL_EMBED_TIMEOUT_MS", "800"))  # query embedding budget per turn
+
+    # Rate limiting
+    RATE_LIMIT_IP_MULTIPLIER = int(os.getenv("RATE_LIMIT_IP_MULTIPLIER", "5"))
+    RATE_LIMIT_LOCAL_PREFILTER = os.getenv("RATE_LIMIT_LOCAL_PREFILTER", "true").lower() == "true"
+    RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+
     # Security / Encryption
     FERNET_KEY = os.getenv("FERNET_KEY")  # Use KMS in production
+    # Comma-separated, newest first; encrypts with the first, decrypts with any (MultiFernet rotation)
+    FERNET_KEYS = os.getenv("FERNET_KEYS")
+    BLIND_INDEX_KEY = os.getenv("BLIND_INDEX_KEY")  # required; HMAC key for email/phone lookup columns, keep apart from FERNET_KEYS
+    PII_DEFAULT_COUNTRY_CODE = os.getenv("PII_DEFAULT_COUNTRY_CODE", "91")  # for 10-digit local phone numbers
+    PII_DECRYPT_WORKERS = int(os.getenv("PII_DECRYPT_WORKERS", "8"))
+    PII_DECRYPT_CHUNK = int(os.getenv("PII_DECRYPT_CHUNK", "256"))  # ciphertexts per pool task
+    PII_CACHE_MAX = int(os.getenv("PII_CACHE_MAX", "10000"))
+    PII_CACHE_TTL_SEC = int(os.getenv("PII_CACHE_TTL_SEC", "60"))
+    PII_ROTATE_BATCH = int(os.getenv("PII_ROTATE_BATCH", "1000"))  # rows re-encrypted per transaction
+
+    # Agent JWT verification (utils.security.verify_agent_token)
+    JWT_SECRET = os.getenv("JWT_SECRET", "secret")  # HS256 shared secret
+    JWT_ALGORITHMS = os.getenv("JWT_ALGORITHMS", "HS256")  # e.g. "RS256,ES256" with JWT_JWKS_PATH
+    JWT_JWKS_PATH = os.getenv("JWT_JWKS_PATH")  # local JWKS file (synced from the IdP); reloaded when it changes
+    JWT_AUDIENCE = os.getenv("JWT_AUDIENCE")
+    JWT_ISSUER = os.getenv("JWT_ISSUER")
+    JWT_LEEWAY_SEC = int(os.getenv("JWT_LEEWAY_SEC", "0"))
+    JWT_CACHE_MAX = int(os.getenv("JWT_CACHE_MAX", "10000"))
+    JWT_REVOCATION_REFRESH_SEC = float(os.getenv("JWT_REVOCATION_REFRESH_SEC", "5"))
 
     # Misc
     MAX_CONTEXT_MESSAGES = int(os.getenv("MAX_CONTEXT_MESSAGES", "8"))
     TOKEN_BUDGET = int(os.getenv("TOKEN_BUDGET", "2000"))
 
+    # Write-behind message persistence (Redis stream -> batched INSERT)
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() == "true"
+    MESSAGE_WRITE_BEHIND_BATCH = int(os.getenv("MESSAGE_WRITE_BEHIND_BATCH", "500"))
+    MESSAGE_WRITE_BEHIND_MAX_BATCHES = int(os.getenv("MESSAGE_WRITE_BEHIND_MAX_BATCHES", "20"))
+    MESSAGE_WRITE_BEHIND_FLUSH_SEC = float(os.getenv("MESSAGE_WRITE_BEHIND_FLUSH_SEC", "1.0"))
+    MESSAGE_WRITE_BEHIND_CLAIM_IDLE_MS = int(os.getenv("MESSAGE_WRITE_BEHIND_CLAIM_IDLE_MS", "30000"))
+    MESSAGE_WRITE_BEHIND_MAX_DELIVERIES = int(os.getenv("MESSAGE_WRITE_BEHIND_MAX_DELIVERIES", "10"))  # then dead-lettered
+
+    # Rolling summarization (context compaction)
+    SUMMARY_TRIGGER_MESSAGES = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "20"))
+    SUMMARY_BATCH_MESSAGES = int(os.getenv("SUMMARY_BATCH_MESSAGES", "10"))
+    SUMMARY_MIN_FOLD_MESSAGES = int(os.getenv("SUMMARY_MIN_FOLD_MESSAGES", "4"))
+    SUMMARY_MAX_FOLD_MESSAGES = int(os.getenv("SUMMARY_MAX_FOLD_MESSAGES", "40"))
+    SUMMARY_LOCK_TTL_SEC = int(os.getenv("SUMMARY_LOCK_TTL_SEC", "120"))
+
+    # Caching
+    CONTEXT_CACHE_TTL_SEC = int(os.getenv("CONTEXT_CACHE_TTL_SEC", "1800"))  # idle conversations expire
+    CONVERSATION_CACHE_TTL_SEC = int(os.getenv("CONVERSATION_CACHE_TTL_SEC", "1800"))
+    CONVERSATION_CACHE_LOCAL_MAX = int(os.getenv("CONVERSATION_CACHE_LOCAL_MAX", "50000"))
+    CONVERSATION_CACHE_LOCAL_TTL_SEC = int(os.getenv("CONVERSATION_CACHE_LOCAL_TTL_SEC", "60"))
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SEC = int(os.getenv("LLM_CACHE_TTL_SEC", "3600"))
+    LLM_CACHE_LOCAL_MAX = int(os.getenv("LLM_CACHE_LOCAL_MAX", "1024"))
+    LLM_CACHE_LOCAL_TTL_SEC = int(os.getenv("LLM_CACHE_LOCAL_TTL_SEC", "300"))
+    LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+    # Language identification (services.language_id)
+    LANGID_ENABLED = os.getenv("LANGID_ENABLED", "true").lower() == "true"  # false -> trust the client locale
+    LANGID_MIN_MARGIN = float(os.getenv("LANGID_MIN_MARGIN", "0.15"))  # mean log-likelihood margin to switch language
+    LANGID_MIN_LETTERS = int(os.getenv("LANGID_MIN_LETTERS", "10"))  # shorter messages keep the conversation's language
+    LANGID_CACHE_TTL_SEC = int(os.getenv("LANGID_CACHE_TTL_SEC", "1800"))
+    LANGID_CACHE_LOCAL_MAX = int(os.getenv("LANGID_CACHE_LOCAL_MAX", "50000"))
+    LANGID_CACHE_LOCAL_TTL_SEC = int(os.getenv("LANGID_CACHE_LOCAL_TTL_SEC", "60"))
+
+    # Tracing / metrics (utils.metrics, served at /metrics)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_FLUSH_SEC = float(os.getenv("METRICS_FLUSH_SEC", "5"))  # per-process push to Redis; 0 = this process only
+    METRICS_TRACE_REDIS = os.getenv("METRICS_TRACE_REDIS", "true").lower() == "true"  # per-command Redis latency
+
+    @classmethod
+    def validate(cls) -> list:
+        """Misconfigurations logged by create_app at startup; none of them stops the app from booting."""
+        problems = []
+        if not cls.BLIND_INDEX_KEY:
+            problems.append("BLIND_INDEX_KEY is not set: email/phone lookups (services.pii_service) will fail")
+        return problems
+
 class DevConfig(Config):
     DEBUG = True
 
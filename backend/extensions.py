@@ -2,23 +2,98 @@
 Initialize and expose extensions: db, migrate, redis client, celery.
 
 This centralizes initialization to avoid circular imports.
+
+Provider clients:
+- http_session(url) returns one pooled requests.Session per host (keep-alive, pool
+  size from HTTP_POOL_MAXSIZE / HTTP_POOL_SIZES), so STT/TTS/CRM/notification calls
+  reuse TLS connections instead of handshaking on every request.
+- http_request() applies (connect, read) timeouts from Config.
+- sdk_session(url) is for SDKs that own and periodically close() their session
+  (openai 0.28 does, per thread): a fresh Session on the host's shared adapter
+  whose close() leaves the shared pool alone.
+- provider_client(name, factory) caches vendor SDK clients (Twilio, Stripe, ...) built
+  on top of those sessions.
+- Everything is dropped in a forked child (Gunicorn/Celery prefork) so processes
+  never share sockets; it is rebuilt lazily on first use.
+- http_pool_stats() reports in-flight/peak requests and saturation per host.
+
+The Redis client times every command (and pipeline) into the
+redis_command_seconds histogram when METRICS_TRACE_REDIS is on. Blocking reads
+(XREAD/XREADGROUP with BLOCK, BLPOP, ...) go to redis_blocking_command_seconds
+instead, so time spent waiting for stream entries doesn't skew command latency.
 """
 
+import os
+import threading
+from typing import Callable, Dict
+from urllib.parse import urlsplit
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import redis
+import requests
+from requests.adapters import HTTPAdapter
 from celery import Celery
+from config import Config
+from utils import metrics
 
 db = SQLAlchemy()
 migrate = Migrate()
 redis_client = None
 celery = None
 
+BLOCKING_COMMANDS = {"BLPOP", "BRPOP", "BRPOPLPUSH", "BLMOVE", "BLMPOP", "BZPOPMIN", "BZPOPMAX", "BZMPOP"}
+
+
+def _redis_metric(args) -> tuple:
+    """(histogram, command) for a command; waits on empty keys/streams get their own histogram."""
+    command = str(args[0]).split(" ", 1)[0].upper()
+    if command in BLOCKING_COMMANDS or (
+            command in ("XREAD", "XREADGROUP") and "BLOCK" in _stream_options(args)):
+        return "redis_blocking_command_seconds", command
+    return "redis_command_seconds", command
+
+
+def _stream_options(args) -> set:
+    """XREAD/XREADGROUP option words, i.e. everything before STREAMS (keys and ids may be any string)."""
+    options = set()
+    for arg in args[1:]:
+        word = arg.decode() if isinstance(arg, bytes) else str(arg)
+        if word.upper() == "STREAMS":
+            break
+        options.add(word.upper())
+    return options
+
+
+class _TracedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        with metrics.span("redis_command_seconds", command="PIPELINE"):
+            return super().execute(raise_on_error)
+
+
+class _TracedRedis(redis.Redis):
+    """redis.Redis that records per-command latency in utils.metrics."""
+
+    def execute_command(self, *args, **options):
+        name, command = _redis_metric(args)
+        with metrics.span(name, command=command):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _TracedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 def init_redis(app):
-    """Initialize redis client (used for cache, rate-limit, celery broker)."""
+    """
+    Initialize redis client (used for cache, rate-limit, celery broker).
+    A config object may set REDIS_CLIENT_FACTORY(url) to substitute another
+    client, e.g. fakeredis in the offline load-test harness.
+    """
     global redis_client
     url = app.config.get("REDIS_URL")
-    redis_client = redis.from_url(url)
+    default = _TracedRedis.from_url if app.config.get("METRICS_TRACE_REDIS") else redis.from_url
+    factory = app.config.get("REDIS_CLIENT_FACTORY") or default
+    redis_client = factory(url)
     return redis_client
 
 def init_celery(app):
@@ -32,4 +107,118 @@ def init_celery(app):
                 return self.run(*args, **kwargs)
     celery.Task = ContextTask
     return celery
-  
+
+
+class _MeteredAdapter(HTTPAdapter):
+    """HTTPAdapter that counts concurrent requests so pool saturation is observable."""
+
+    def __init__(self, host: str, pool_maxsize: int, **kwargs):
+        self.host = host
+        self.stats = {"pool_maxsize": pool_maxsize, "in_flight": 0, "peak_in_flight": 0,
+                      "requests": 0, "saturated": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=Config.HTTP_POOL_BLOCK, **kwargs)
+
+    def send(self, request, **kwargs):
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            if self.stats["in_flight"] > self.stats["pool_maxsize"]:
+                self.stats["saturated"] += 1  # this request waits or opens a connection that won't be kept
+        try:
+            return super().send(request, **kwargs)
+        except requests.RequestException:
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.stats["in_flight"] -= 1
+
+
+_http_lock = threading.Lock()
+_http_sessions: Dict[str, requests.Session] = {}
+_http_adapters: Dict[str, _MeteredAdapter] = {}
+_provider_clients: Dict[str, object] = {}
+
+
+def _pool_size(host: str) -> int:
+    for item in Config.HTTP_POOL_SIZES.split(","):
+        name, _, size = item.strip().partition("=")
+        if name == host and size:
+            return int(size)
+    return Config.HTTP_POOL_MAXSIZE
+
+
+def http_session(url: str) -> requests.Session:
+    """Shared keep-alive session for the host of url (scheme://host[:port])."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    session = _http_sessions.get(key)
+    if session is not None:
+        return session
+    with _http_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            adapter = _MeteredAdapter(parts.netloc, _pool_size(parts.hostname or parts.netloc))
+            session = requests.Session()
+            session.mount(key, adapter)
+            _http_adapters[key] = adapter
+            _http_sessions[key] = session
+    return session
+
+
+class _BorrowedSession(requests.Session):
+    """Session mounted on a shared adapter; close() must not tear down other callers' connections."""
+
+    def close(self):
+        pass
+
+
+def sdk_session(url: str) -> requests.Session:
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    http_session(url)  # creates the host's adapter on first use
+    session = _BorrowedSession()
+    session.mount(key, _http_adapters[key])
+    return session
+
+
+def http_request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """
+    Send a request over the host's pooled session. timeout is the read timeout in
+    seconds (or a full (connect, read) tuple); connect always uses HTTP_CONNECT_TIMEOUT_SEC.
+    """
+    if not isinstance(timeout, tuple):
+        timeout = (Config.HTTP_CONNECT_TIMEOUT_SEC, timeout or Config.HTTP_READ_TIMEOUT_SEC)
+    return http_session(url).request(method, url, timeout=timeout, **kwargs)
+
+
+def provider_client(name: str, factory: Callable[[], object]):
+    """Per-process cached vendor client; factory() runs once per process (again after fork)."""
+    client = _provider_clients.get(name)
+    if client is None:
+        with _http_lock:
+            client = _provider_clients.get(name)
+            if client is None:
+                client = _provider_clients[name] = factory()
+    return client
+
+
+def http_pool_stats() -> Dict[str, dict]:
+    """{"https://host": {pool_maxsize, in_flight, peak_in_flight, requests, saturated, errors}}"""
+    return {key: dict(adapter.stats) for key, adapter in list(_http_adapters.items())}
+
+
+def reset_provider_clients() -> None:
+    """Forget pooled sessions and vendor clients (runs in every forked child)."""
+    global _http_lock
+    _http_lock = threading.Lock()  # the parent may have held it while forking
+    _http_sessions.clear()
+    _http_adapters.clear()
+    _provider_clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_provider_clients)
@@ -3,6 +3,8 @@ SQLAlchemy models. Production-ready structure with PII encryption and vector sup
 
 - If using Postgres + pgvector, use `sqlalchemy.dialects.postgresql` for vector column.
 - For MongoDB, convert these models to MongoEngine or pydantic/ODM.
+- Column types degrade to JSON / INTEGER keys on SQLite so the offline benchmark
+  harness (benchmarks.load_test) can create the schema without Postgres.
 """
 
 from datetime import datetime
@@ -12,18 +14,25 @@ from sqlalchemy.dialects.postgresql import JSONB
 # Optional: pgvector import if installed
 # from pgvector.sqlalchemy import Vector
 
+JSONType = db.JSON().with_variant(JSONB(), "postgresql")
+BigIntPK = db.BigInteger().with_variant(db.Integer(), "sqlite")  # SQLite only autoincrements INTEGER keys
+
 class User(db.Model):
     """
     User profile
     - email_enc and phone_enc store encrypted PII
+    - email_bidx / phone_bidx are HMAC blind indexes of the normalized values for
+      equality lookup without decrypting (see services.pii_service)
     - external_id maps to CRM or SSO provider
     """
     __tablename__ = "users"
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     external_id = db.Column(db.String(128), unique=True, nullable=True)
     name = db.Column(db.String(256), nullable=True)
     email_enc = db.Column(db.LargeBinary, nullable=True)
     phone_enc = db.Column(db.LargeBinary, nullable=True)
+    email_bidx = db.Column(db.LargeBinary(32), index=True, nullable=True)
+    phone_bidx = db.Column(db.LargeBinary(32), index=True, nullable=True)
     locale = db.Column(db.String(10), default="en_IN")
     crm_id = db.Column(db.String(128), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -33,52 +42,72 @@ class Conversation(db.Model):
     Conversation session
     - status: open, resolved, escalated
     - meta: arbitrary JSON for extra metadata
+    - language: detected reply locale, e.g. "hi_IN" or "hi_IN@latin" for romanized
+      text (services.language_id)
     """
     __tablename__ = "conversations"
-    id = db.Column(db.BigInteger, primary_key=True)
+    __table_args__ = (
+        db.Index("ix_conversations_user_status_active", "user_id", "status", "last_active_at"),
+        # At most one open conversation per user; concurrent first messages converge on it
+        db.Index("uq_conversations_user_open", "user_id", unique=True,
+                 postgresql_where=db.text("status = 'open'"), sqlite_where=db.text("status = 'open'")),
+    )
+    id = db.Column(BigIntPK, primary_key=True)
     user_id = db.Column(db.BigInteger, db.ForeignKey("users.id"), nullable=False)
     channel = db.Column(db.String(50), nullable=False, default="web")
     status = db.Column(db.String(50), default="open")
-    language = db.Column(db.String(10), default="en_IN")
-    meta = db.Column(JSONB, nullable=True)
+    language = db.Column(db.String(16), default="en_IN")
+    meta = db.Column(JSONType, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_active_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Message(db.Model):
     """
     Each message in a conversation.
-    - metadata holds sentiment, intent, llm tokens, attachments meta, etc.
+    - metadata holds sentiment, intent, llm tokens, attachments meta, etc. (mapped as
+      meta_data: "metadata" is reserved on declarative models)
+    - dedupe_key makes write-behind batch inserts idempotent on redelivery
     """
     __tablename__ = "messages"
-    id = db.Column(db.BigInteger, primary_key=True)
+    __table_args__ = (
+        db.Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
+    id = db.Column(BigIntPK, primary_key=True)
     conversation_id = db.Column(db.BigInteger, db.ForeignKey("conversations.id"), index=True, nullable=False)
     sender = db.Column(db.String(20), nullable=False)  # user|bot|agent|system
     text = db.Column(db.Text, nullable=False)
-    metadata = db.Column(JSONB, nullable=True)
+    meta_data = db.Column("metadata", JSONType, nullable=True)
+    dedupe_key = db.Column(db.String(32), unique=True, nullable=True)  # set by write-behind persistence
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Ticket(db.Model):
     """
     Ticket for human agent escalation or follow up.
+    - The agent queue pages by (status, created_at, id) keyset; see routes.agent.list_tickets.
     """
     __tablename__ = "tickets"
-    id = db.Column(db.BigInteger, primary_key=True)
+    __table_args__ = (
+        db.Index("ix_tickets_status_created", "status", "created_at", "id"),
+    )
+    id = db.Column(BigIntPK, primary_key=True)
     conversation_id = db.Column(db.BigInteger, db.ForeignKey("conversations.id"), nullable=False)
     status = db.Column(db.String(50), default="open")
     assigned_agent = db.Column(db.String(128), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     closed_at = db.Column(db.DateTime, nullable=True)
-    meta = db.Column(JSONB, nullable=True)
+    meta = db.Column(JSONType, nullable=True)
 
 class KnowledgeDocument(db.Model):
     """
     Knowledge base document (for RAG).
     - embedding vector column if using pgvector
+    - without pgvector, chunks are embedded into the in-process index (services.retrieval);
+      enqueue tasks.celery_tasks.index_document_task after create/update
     """
     __tablename__ = "knowledge_documents"
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     title = db.Column(db.String(512), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    meta = db.Column(JSONB, nullable=True)
+    meta = db.Column(JSONType, nullable=True)
     # embedding = db.Column(Vector(1536))  # enable if pgvector installed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
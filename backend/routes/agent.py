@@ -3,29 +3,173 @@ Agent endpoints & handoff APIs.
 - Agents authenticate via JWT.
 - Provide endpoints to list tickets, claim, append message, close ticket.
 - Provide context payload for agent UI.
+
+Queue scaling:
+- GET /tickets pages with a keyset cursor over (status, created_at, id), so each
+  page is one index range scan regardless of queue depth.
+- GET /tickets/stream (SSE) and GET /tickets/updates (long-poll) push ticket
+  created/claimed events from services.ticket_events instead of agents re-polling Postgres.
+- POST /tickets/<id>/claim is a single conditional UPDATE; concurrent claims get 409.
+- GET /tickets/<id>/context is the agent UI payload: recent messages, rolling
+  summary and the customer's CRM profile from services.crm_cache (stale-while-
+  revalidate; open-ticket profiles are prefetched by a beat job).
+- POST /tickets/<id>/close closes the ticket, marks its conversation resolved and
+  drops the customer's cached conversation mapping, so their next message opens
+  a fresh conversation.
 """
 
-from flask import Blueprint, request, jsonify
+import base64
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import tuple_
+from config import Config
 from utils.security import admin_required
-from models import Ticket, Conversation, Message
+from models import Ticket, Conversation, Message, User
 from extensions import db
+from services import context_cache, conversation_service, crm_cache, summary_service, ticket_events
 
 agent_bp = Blueprint("agent", __name__)
 
 @agent_bp.route("/tickets", methods=["GET"])
 @admin_required
 def list_tickets():
-    # Pagination and filters in production
-    tickets = Ticket.query.filter_by(status="open").all()
-    return jsonify([{"ticket_id": t.id, "conversation_id": t.conversation_id} for t in tickets])
+    """
+    Query: status (default "open"), limit (<= TICKET_PAGE_MAX), cursor (from the previous page).
+    Response: {"tickets": [...], "next_cursor": "..." | null, "feed_cursor": "<stream id>"}
+    Oldest first; pass feed_cursor to /tickets/stream to receive changes after this page.
+    """
+    status = request.args.get("status", "open")
+    limit = max(1, min(request.args.get("limit", 50, type=int), Config.TICKET_PAGE_MAX))
+    feed_cursor = ticket_events.feed.current_id()  # read before the page so no change falls in between
+    query = Ticket.query.filter(Ticket.status == status)
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            created_at, ticket_id = _decode_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "invalid cursor"}), 400
+        query = query.filter(tuple_(Ticket.created_at, Ticket.id) > tuple_(created_at, ticket_id))
+    tickets = query.order_by(Ticket.created_at, Ticket.id).limit(limit + 1).all()
+    page, more = tickets[:limit], len(tickets) > limit
+    return jsonify({
+        "tickets": [_ticket_json(t) for t in page],
+        "next_cursor": _encode_cursor(page[-1]) if more else None,
+        "feed_cursor": feed_cursor,
+    })
+
+@agent_bp.route("/tickets/stream", methods=["GET"])
+@admin_required
+def stream_tickets():
+    """
+    Server-Sent Events: `event: ticket.created|ticket.claimed`, `id:` is the resume
+    cursor (Last-Event-ID header or ?after=). Heartbeat comments keep proxies from
+    closing idle connections. Run web workers with gevent/threads for long-lived streams.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("after") or ticket_events.feed.current_id()
+    try:
+        ticket_events.parse_cursor(last_id)
+    except ValueError:
+        return jsonify({"error": "invalid cursor"}), 400
+
+    def events():
+        cursor = last_id
+        yield "retry: 3000\n\n"
+        while True:
+            batch = ticket_events.feed.wait(cursor, Config.TICKET_STREAM_HEARTBEAT_SEC)
+            if not batch:
+                yield ": heartbeat\n\n"
+                continue
+            for event_id, event in batch:
+                cursor = event_id
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+@agent_bp.route("/tickets/updates", methods=["GET"])
+@admin_required
+def ticket_updates():
+    """Long-poll: ?after=<cursor>&timeout=<sec>. Returns {"events": [...], "cursor": "..."} as soon as any arrive."""
+    cursor = request.args.get("after") or ticket_events.feed.current_id()
+    timeout = max(0, min(request.args.get("timeout", Config.TICKET_LONGPOLL_MAX_SEC, type=float),
+                         Config.TICKET_LONGPOLL_MAX_SEC))
+    try:
+        batch = ticket_events.feed.wait(cursor, timeout)
+    except ValueError:
+        return jsonify({"error": "invalid cursor"}), 400
+    return jsonify({"events": [event for _, event in batch], "cursor": batch[-1][0] if batch else cursor})
 
 @agent_bp.route("/tickets/<int:ticket_id>/claim", methods=["POST"])
 @admin_required
 def claim(ticket_id):
     data = request.json or {}
     agent_id = data.get("agent_id")
+    # Single conditional UPDATE: only one concurrent claimer can match status='open'
+    claimed = (
+        Ticket.query.filter(Ticket.id == ticket_id, Ticket.status == "open")
+        .update({"assigned_agent": agent_id, "status": "assigned"}, synchronize_session=False)
+    )
+    db.session.commit()
+    if not claimed:
+        ticket = Ticket.query.get_or_404(ticket_id)
+        return jsonify({"ok": False, "error": "already claimed", "assigned_agent": ticket.assigned_agent,
+                        "status": ticket.status}), 409
+    ticket_events.publish("ticket.claimed", Ticket.query.get(ticket_id))
+    return jsonify({"ok": True})
+
+@agent_bp.route("/tickets/<int:ticket_id>/context", methods=["GET"])
+@admin_required
+def ticket_context(ticket_id):
+    """Response: {"ticket": {...}, "conversation": {...}, "summary": str|null, "messages": [...], "customer": {...}}"""
     ticket = Ticket.query.get_or_404(ticket_id)
-    ticket.assigned_agent = agent_id
-    ticket.status = "assigned"
+    conv, external_id = (
+        db.session.query(Conversation, User.external_id).join(User, Conversation.user_id == User.id)
+        .filter(Conversation.id == ticket.conversation_id).one()
+    )
+    return jsonify({
+        "ticket": _ticket_json(ticket),
+        "conversation": {"id": conv.id, "channel": conv.channel, "status": conv.status, "language": conv.language},
+        "summary": summary_service.get_summary(conv.id),
+        "messages": [{"role": m["role"], "content": m["content"]} for m in context_cache.get_recent_messages(conv.id)],
+        "customer": crm_cache.get_profile(external_id) if external_id else {},
+    })
+
+@agent_bp.route("/tickets/<int:ticket_id>/close", methods=["POST"])
+@admin_required
+def close(ticket_id):
+    closed = (
+        Ticket.query.filter(Ticket.id == ticket_id, Ticket.status != "closed")
+        .update({"status": "closed", "closed_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    if not closed:
+        Ticket.query.get_or_404(ticket_id)
+        return jsonify({"ok": False, "error": "already closed"}), 409
+    ticket = Ticket.query.get(ticket_id)
+    Conversation.query.filter_by(id=ticket.conversation_id).update({"status": "resolved"}, synchronize_session=False)
+    external_id = (
+        db.session.query(User.external_id).join(Conversation, Conversation.user_id == User.id)
+        .filter(Conversation.id == ticket.conversation_id).scalar()
+    )
     db.session.commit()
+    if external_id:
+        conversation_service.forget(external_id)
+    ticket_events.publish("ticket.closed", ticket)
     return jsonify({"ok": True})
+
+def _ticket_json(ticket) -> dict:
+    return {"ticket_id": ticket.id, "conversation_id": ticket.conversation_id, "status": ticket.status,
+            "assigned_agent": ticket.assigned_agent,
+            "created_at": ticket.created_at.isoformat() if ticket.created_at else None}
+
+def _encode_cursor(ticket) -> str:
+    raw = json.dumps([ticket.created_at.isoformat(), ticket.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(ticket_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as exc:
+        raise ValueError("invalid cursor") from exc
@@ -3,6 +3,7 @@ Text chat endpoints.
 
 Endpoints:
 - POST /send      → Send a user text message and get assistant reply
+- POST /stream    → Same as /send, reply streamed as Server-Sent Events
 - GET /history    → Get recent conversation history
 - POST /escalate  → Request human escalation
 
@@ -11,12 +12,19 @@ Important:
 - Keep request/response sizes small to meet 5s SLA.
 """
 
-from flask import Blueprint, request, jsonify, current_app
-from models import Conversation, Message, User, Ticket
-from extensions import db, redis_client
-from services.llm_service import call_llm
+import json
+import logging
+import time
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from config import Config
+from extensions import redis_client
+from services.llm_service import call_llm, stream_llm
 from services.sentiment_service import analyze_sentiment
+from services import (context_cache, conversation_service, language_id, llm_router, message_store, retrieval,
+                      summary_service)
+from utils import metrics
 from utils.rate_limiter import rate_limit
+from utils.pipeline import run_stages, timed_stage
 
 chat_bp = Blueprint("chat", __name__)
 
@@ -35,9 +43,11 @@ def send():
     {
         "reply": "...",
         "conversation_id": 1234,
-        "meta": {"sentiment": -0.6, "llm_meta": {...}}
+        "meta": {"sentiment": -0.6, "llm_meta": {...}, "timings_ms": {"conversation": 3.1, "context": 0.8, ...}}
     }
     """
+    started = time.perf_counter()
+    deadline = llm_router.request_deadline()  # LLM budget counts from request arrival
     payload = request.json or {}
     user_id = payload.get("user_id")
     text = payload.get("message", "").strip()[:5000]  # limit length
@@ -47,62 +57,152 @@ def send():
     if not user_id or not text:
         return jsonify({"error": "user_id and message required"}), 400
 
-    # Create or fetch conversation
-    conversation = _get_or_create_conversation(user_id, payload.get("conversation_id"), locale)
+    # Conversation, context, sentiment and user-message persistence (independent stages overlap)
+    turn = _prepare_turn(user_id, payload.get("conversation_id"), text, locale, deadline=deadline)
+    timings = turn["timings"]
 
-    # Append user message
-    user_msg = Message(conversation_id=conversation.id, sender="user", text=text, metadata={"locale": locale})
-    db.session.add(user_msg)
-    db.session.commit()
+    # Call LLM adapter
+    assistant_reply, llm_meta = timed_stage(timings, "llm", call_llm, turn["context"], text, turn["locale"],
+                                            cacheable=turn["cacheable"], deadline=deadline, summary=turn["summary"],
+                                            knowledge=turn["knowledge"])
+
+    # Read-your-writes for the next turn comes from the context cache; the DB write goes through write-behind
+    context_cache.append_message(turn["conversation_id"], "bot", assistant_reply)
+    timed_stage(timings, "persist_bot", _persist_bot_reply, turn["conversation_id"], assistant_reply, llm_meta,
+                turn["sentiment"])
+    timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+    if timings["total"] > Config.TEXT_RESPONSE_SLA_MS:
+        metrics.inc("sla_breaches_total", endpoint="chat_send")
+
+    return jsonify({"reply": assistant_reply, "conversation_id": turn["conversation_id"],
+                    "meta": {"sentiment": turn["sentiment"], "llm_meta": llm_meta, "timings_ms": timings}})
+
+@chat_bp.route("/stream", methods=["POST"])
+@rate_limit("chat_send", limit=60, period=60)
+def stream():
+    """
+    Same request body as /send. Response is text/event-stream:
+      event: start  data: {"conversation_id": 1234, "sentiment": -0.6, "timings_ms": {...}}
+      event: token  data: {"delta": "..."}        (repeated)
+      event: done   data: {"reply": "...", "conversation_id": 1234, "meta": {...}}
+    The bot Message is persisted only after the provider stream completes;
+    a client disconnect closes the provider stream and persists nothing.
+    """
+    deadline = llm_router.request_deadline()
+    payload = request.json or {}
+    user_id = payload.get("user_id")
+    text = payload.get("message", "").strip()[:5000]
+    locale = payload.get("locale", "en_IN")
+
+    if not user_id or not text:
+        return jsonify({"error": "user_id and message required"}), 400
 
-    # Quick sentiment (inline to allow immediate reaction)
-    sentiment = analyze_sentiment(text, locale)
+    turn = _prepare_turn(user_id, payload.get("conversation_id"), text, locale, deadline=deadline)
+    conversation_id, sentiment = turn["conversation_id"], turn["sentiment"]
+
+    def events():
+        yield _sse("start", {"conversation_id": conversation_id, "sentiment": sentiment, "timings_ms": turn["timings"]})
+        llm_stream = stream_llm(turn["context"], text, turn["locale"], cacheable=turn["cacheable"], deadline=deadline,
+                                summary=turn["summary"], knowledge=turn["knowledge"])
+        try:
+            for event in llm_stream:
+                if not event.get("done"):
+                    yield _sse("token", {"delta": event["delta"]})
+                    continue
+                reply, llm_meta = event["reply"], event["meta"]
+                context_cache.append_message(conversation_id, "bot", reply)
+                _persist_bot_reply(conversation_id, reply, llm_meta, sentiment)
+                yield _sse("done", {"reply": reply, "conversation_id": conversation_id,
+                                    "meta": {"sentiment": sentiment, "llm_meta": llm_meta}})
+        except GeneratorExit:
+            logging.info("Client disconnected from stream (conversation %s)", conversation_id)
+            raise
+        finally:
+            llm_stream.close()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # disable proxy buffering
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+def _prepare_turn(user_id: str, conversation_id, text: str, locale: str, channel: str = "web",
+                  deadline: float = None) -> dict:
+    """
+    Pre-LLM stages of a chat turn. Conversation resolution runs first (everything
+    keys off its id), then local language identification picks the reply locale
+    (the client's locale is only the fallback). The context read comes next, before
+    the user message is inserted, so a cache miss rebuilt from the DB can never
+    include this turn's own message. Summary fetch, knowledge retrieval (bounded by
+    deadline), sentiment and the user-message insert then run concurrently on the
+    pipeline pool, and the message is appended to the context cache afterwards.
+    """
+    timings = {}
+    conv_id = timed_stage(timings, "conversation", _get_or_create_conversation, user_id, conversation_id,
+                          locale, channel)
+    locale = timed_stage(timings, "language", language_id.conversation_locale, conv_id, text, locale)
+    recent_context = timed_stage(timings, "context", _fetch_recent_messages, conv_id)
+    results, stage_timings = run_stages({
+        "summary": (summary_service.get_summary, conv_id),
+        "knowledge": (retrieval.search_snippets, text, deadline),  # gives up rather than delay the LLM call
+        "sentiment": (analyze_sentiment, text, locale),
+        "persist_user": (_insert_user_message, conv_id, text, locale),
+    })
+    timings.update(stage_timings)
+    context_cache.append_message(conv_id, "user", text)
+
+    return {
+        "conversation_id": conv_id,
+        # History and summary are this customer's own; such turns never read or fill the shared response cache
+        "cacheable": not (recent_context or results["summary"]),
+        "summary": results["summary"],
+        "knowledge": results["knowledge"],
+        "context": recent_context,
+        "sentiment": results["sentiment"],
+        "locale": locale,
+        "timings": timings,
+    }
 
-    # Build short context: fetch recent N messages
-    recent_context = _fetch_recent_messages(conversation.id)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-    # Call LLM adapter
-    assistant_reply, llm_meta = call_llm(recent_context, text, locale)
-
-    # Persist bot reply
-    bot_msg = Message(conversation_id=conversation.id, sender="bot", text=assistant_reply, metadata={"llm": llm_meta})
-    db.session.add(bot_msg)
-    db.session.commit()
-
-    # Escalation rules: E.g., negative sentiment or keywords
-    if should_escalate(sentiment, assistant_reply):
-        ticket = Ticket(conversation_id=conversation.id, status="open")
-        db.session.add(ticket)
-        db.session.commit()
-        # schedule agent notification via Celery or internal queue
-
-    return jsonify({"reply": assistant_reply, "conversation_id": conversation.id, "meta": {"sentiment": sentiment, "llm_meta": llm_meta}})
-
-def _get_or_create_conversation(user_external_id: str, conversation_id: int, locale: str):
-    """Helper to fetch or create conversation. This function should be atomic in production."""
-    if conversation_id:
-        conv = Conversation.query.get(conversation_id)
-        if conv:
-            return conv
-    # find last open conversation for user
-    user = User.query.filter_by(external_id=user_external_id).first()
-    if not user:
-        # In production, create user record with minimal data and fill later from CRM
-        user = User(external_id=user_external_id, locale=locale)
-        db.session.add(user)
-        db.session.commit()
-    conv = Conversation(user_id=user.id, channel="web", language=locale)
-    db.session.add(conv)
-    db.session.commit()
-    return conv
+def _insert_user_message(conversation_id: int, text: str, locale: str):
+    return message_store.persist_message(conversation_id, "user", text, {"locale": locale})
+
+def _persist_bot_reply(conversation_id: int, assistant_reply: str, llm_meta: dict, sentiment: float):
+    """
+    Store the bot Message and queue a ticket if escalation rules fire. Runs on the
+    request thread once the reply exists, but stays cheap and durable: with
+    write-behind the message is one XADD to the message stream, and the ticket is
+    a Celery task. The caller has already appended the reply to the context cache.
+    Failures are logged; the customer already has the reply.
+    """
+    try:
+        bot_msg_id = message_store.persist_message(conversation_id, "bot", assistant_reply, {"llm": llm_meta})
+        summary_service.maybe_schedule(conversation_id, new_messages=2)  # user + bot turn
+
+        # Escalation rules: E.g., negative sentiment or keywords
+        if should_escalate(sentiment, assistant_reply):
+            from tasks.celery_tasks import escalate_conversation_task  # avoid import cycle at module load
+            escalate_conversation_task.delay(conversation_id, assistant_reply, sentiment)
+    except Exception:
+        logging.exception("Persisting bot reply failed (conversation %s)", conversation_id)
+        return None
+    return bot_msg_id
+
+def _get_or_create_conversation(user_external_id: str, conversation_id: int, locale: str, channel: str = "web") -> int:
+    """
+    Resolve the conversation id for a message: zero DB round trips when the user's
+    open conversation is cached, otherwise one atomic upsert/lookup statement.
+    """
+    conv_id, created = conversation_service.resolve(user_external_id, locale, channel, conversation_id)
+    if created:
+        context_cache.seed_empty(conv_id)  # first turns are served from cache even before write-behind flushes
+    return conv_id
 
 def _fetch_recent_messages(conversation_id: int, limit:int=8):
     """
     Try Redis cache for speed; otherwise read from DB.
     Returns a list of dicts {'role': 'user'|'assistant', 'content': '...'}
     """
-    # Implementation details described in service skeletons
-    return []
+    return context_cache.get_recent_messages(conversation_id, limit)
 
 def should_escalate(sentiment_score: float, assistant_reply: str) -> bool:
     """Simple heuristic; replace with ML model later."""
@@ -7,10 +7,20 @@ Transaction routes for payments.
 Security:
 - Validate Stripe webhook signature using STRIPE_WEBHOOK_SECRET
 - Idempotency keys for PaymentIntent creation
+
+The webhook only verifies, dedupes and queues the event (services.stripe_events);
+processing happens in Celery so Stripe gets its 2xx within STRIPE_WEBHOOK_ACK_BUDGET_MS.
 """
 
+import json
+import logging
+import time
+
+import redis
 from flask import Blueprint, request, jsonify, current_app
-from services.payments import create_payment_intent, handle_stripe_webhook
+from config import Config
+from services import stripe_events
+from services.payments import IdempotencyConflict, create_payment_intent, handle_stripe_webhook
 
 transaction_bp = Blueprint("transaction", __name__)
 
@@ -21,7 +31,8 @@ def create_payment():
     {
         "amount_cents": 12345,
         "currency": "inr",
-        "metadata": {...}
+        "metadata": {...},
+        "idempotency_key": "..."   # optional; the Idempotency-Key header works too
     }
     """
     payload = request.json or {}
@@ -29,16 +40,29 @@ def create_payment():
     currency = payload.get("currency", "inr")
     if not amount:
         return jsonify({"error": "amount_cents required"}), 400
-    pi = create_payment_intent(amount, currency, metadata=payload.get("metadata"))
+    idempotency_key = request.headers.get("Idempotency-Key") or payload.get("idempotency_key")
+    try:
+        pi = create_payment_intent(amount, currency, metadata=payload.get("metadata"),
+                                   idempotency_key=idempotency_key)
+    except IdempotencyConflict as e:
+        return jsonify({"error": str(e)}), 409
     return jsonify(pi)
 
 @transaction_bp.route("/webhook", methods=["POST"])
 def stripe_webhook():
+    started = time.perf_counter()
     raw = request.data
     sig = request.headers.get("Stripe-Signature")
     try:
-        event = handle_stripe_webhook(raw, sig)
-        # Process event types: payment_intent.succeeded etc.
-        return jsonify({"received": True})
+        handle_stripe_webhook(raw, sig)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+    try:
+        queued = stripe_events.ingest(json.loads(raw), raw)
+    except redis.RedisError:
+        logging.exception("Stripe event could not be queued; asking Stripe to redeliver")
+        return jsonify({"error": "temporarily unavailable"}), 503
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > Config.STRIPE_WEBHOOK_ACK_BUDGET_MS:
+        logging.warning("Stripe webhook ack took %.1fms (budget %dms)", elapsed_ms, Config.STRIPE_WEBHOOK_ACK_BUDGET_MS)
+    return jsonify({"received": True, "duplicate": not queued})
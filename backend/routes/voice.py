@@ -2,23 +2,43 @@
 Voice channel endpoints.
 
 - POST /upload  -> Accept file multipart, transcribe via STT, forward to chat pipeline.
+- POST /transcribe -> Transcribe only; partial transcripts streamed as Server-Sent Events.
 - Response can be returned as audio (TTS) or text depending on Accept header.
 
 Performance notes:
 - STT and LLM calls must be parallelized where possible.
 - For longer audio, accept streaming or chunked uploads and return partial transcripts.
+
+Audio replies are streamed:
+- The LLM reply is streamed and cut into sentences as tokens arrive; each sentence
+  is synthesized on the pipeline pool while the LLM keeps generating.
+- MP3 audio for each sentence is written to the response in reply order with
+  chunked transfer encoding, so the caller hears the first sentence while later
+  ones are still being generated/synthesized.
+- Time-to-first-audio (from request arrival) is logged against VOICE_RESPONSE_SLA_MS.
 """
 
-from flask import Blueprint, request, jsonify, send_file
-from services.stt_service import transcribe_audio_file
+import io
+import logging
+import time
+from collections import deque
+from urllib.parse import quote
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config import Config
+from services.stt_service import transcribe_audio_file, transcribe_stream
 from services.tts_service import synthesize_speech
-from routes.chat import _get_or_create_conversation, _fetch_recent_messages
-from services.llm_service import call_llm
-from extensions import db
-from models import Message
+from routes.chat import _prepare_turn, _persist_bot_reply, _sse
+from services.llm_service import call_llm, stream_llm
+from services import context_cache, llm_router
+from utils import metrics
+from utils.helpers import split_sentences
+from utils.pipeline import submit, timed_stage
 
 voice_bp = Blueprint("voice", __name__)
 
+AUDIO_CHUNK_BYTES = 16 * 1024
+
 @voice_bp.route("/upload", methods=["POST"])
 def upload_audio():
     """
@@ -27,25 +47,157 @@ def upload_audio():
       - user_id
       - conversation_id (optional)
       - accept_audio: bool (if True return audio TTS)
+
+    Audio response: chunked audio/mpeg body; X-Conversation-Id and X-Transcript
+    (percent-encoded) headers. Text response: {"reply", "transcript", "conversation_id", "meta"}.
     """
+    started = time.perf_counter()
+    deadline = llm_router.request_deadline()
     if 'file' not in request.files:
         return jsonify({"error": "audio file required"}), 400
     file = request.files['file']
     user_id = request.form.get('user_id')
-    conv_id = request.form.get('conversation_id')
+    conv_id = request.form.get('conversation_id', type=int)  # form fields are strings; ids are ints
     accept_audio = request.form.get('accept_audio', "true").lower() == "true"
     locale = request.form.get('locale', None)
+    if not user_id:
+        return jsonify({"error": "user_id required"}), 400
 
     # Transcribe (blocking or async depending on SLA)
-    stt_result = transcribe_audio_file(file.stream, language=locale)  # returns dict {'text':..., 'language':...}
+    timings = {}
+    language_hint = locale.split("_")[0] if locale else None
+    try:
+        stt_result = timed_stage(timings, "stt", transcribe_audio_file, file.stream,
+                                 filename=file.filename or "upload.wav", language=language_hint)
+    except Exception:
+        logging.exception("STT failed for voice upload")
+        return jsonify({"error": "transcription failed"}), 502
+    transcript = (stt_result.get("text") or "").strip()[:5000]
+    if not transcript:
+        return jsonify({"error": "no speech detected"}), 422
+    locale = locale or stt_result.get("language") or "en_IN"
 
     # Reuse text pipeline
-    # ... create conversation, store user message, call LLM ...
-    # final_reply_text = ...
+    turn = _prepare_turn(user_id, conv_id, transcript, locale, channel="voice", deadline=deadline)
+    timings.update(turn["timings"])
+    conversation_id, sentiment, locale = turn["conversation_id"], turn["sentiment"], turn["locale"]
+
+    if not accept_audio:
+        reply, llm_meta = timed_stage(timings, "llm", call_llm, turn["context"], transcript, locale,
+                                      cacheable=turn["cacheable"], deadline=deadline, summary=turn["summary"],
+                                      knowledge=turn["knowledge"])
+        context_cache.append_message(conversation_id, "bot", reply)
+        timed_stage(timings, "persist_bot", _persist_bot_reply, conversation_id, reply, llm_meta, sentiment)
+        return jsonify({"reply": reply, "transcript": transcript, "conversation_id": conversation_id,
+                        "meta": {"sentiment": sentiment, "llm_meta": llm_meta, "timings_ms": timings}})
+
+    voice = _voice_for(locale)
+
+    def audio_chunks():
+        llm_stream = stream_llm(turn["context"], transcript, locale, cacheable=turn["cacheable"], deadline=deadline,
+                                summary=turn["summary"], knowledge=turn["knowledge"])
+        pending = deque()  # (TTS future, sentence) per sentence, in reply order
+        buffer, spoken, first_audio_ms = "", False, None
+        try:
+            for event in llm_stream:
+                if not event.get("done"):
+                    buffer += event["delta"]
+                    sentences, buffer = split_sentences(buffer)
+                    for sentence in sentences:
+                        pending.append((submit(synthesize_speech, sentence, voice), sentence))
+                        spoken = True
+                    while pending and pending[0][0].done():
+                        for chunk in _read_audio(*pending.popleft(), voice):
+                            first_audio_ms = first_audio_ms or _first_audio(started, conversation_id)
+                            yield chunk
+                    continue
+                reply, llm_meta = event["reply"], event["meta"]
+                # Provider fallback text arrives only in the done event
+                tail = buffer.strip() if spoken or buffer.strip() else reply
+                if tail:
+                    pending.append((submit(synthesize_speech, tail, voice), tail))
+                context_cache.append_message(conversation_id, "bot", reply)
+                _persist_bot_reply(conversation_id, reply, {**llm_meta, "channel": "voice"}, sentiment)
+            while pending:
+                for chunk in _read_audio(*pending.popleft(), voice):
+                    first_audio_ms = first_audio_ms or _first_audio(started, conversation_id)
+                    yield chunk
+        except GeneratorExit:
+            logging.info("Client disconnected from voice stream (conversation %s)", conversation_id)
+            raise
+        finally:
+            llm_stream.close()
+            for fut, _ in pending:
+                fut.cancel()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # disable proxy buffering
+        "X-Conversation-Id": str(conversation_id),
+        "X-Transcript": quote(transcript),
+    }
+    return Response(stream_with_context(audio_chunks()), mimetype="audio/mpeg", headers=headers)
+
+@voice_bp.route("/transcribe", methods=["POST"])
+def transcribe():
+    """
+    Multipart form: file, locale (optional). Response is text/event-stream:
+      event: partial  data: {"index": 0, "text": "...", "start_ms": 0, "end_ms": 2100}   (one per utterance, in order)
+      event: final    data: {"text": "...", "language": "hi", "duration_ms": 8400, "segments": [...]}
+      event: error    data: {"error": "transcription failed"}
+    """
+    if 'file' not in request.files:
+        return jsonify({"error": "audio file required"}), 400
+    file = request.files['file']
+    locale = request.form.get('locale', None)
+    audio = io.BytesIO(file.stream.read())  # the upload stream is gone once the response starts
+    filename = file.filename or "upload.wav"
+
+    def events():
+        try:
+            for result in transcribe_stream(audio, filename=filename, language=locale.split("_")[0] if locale else None):
+                partial = result.pop("partial")
+                yield _sse("partial" if partial else "final", result)
+        except Exception:
+            logging.exception("STT failed for transcribe stream")
+            yield _sse("error", {"error": "transcription failed"})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+def _voice_for(locale: str) -> str:
+    """'hi_IN' / 'hi_IN@latin' / 'hi' -> 'hi-IN' (TTS language code)."""
+    lang, _, region = locale.split("@", 1)[0].replace("-", "_").partition("_")
+    return f"{lang.lower()}-{(region or 'IN').upper()}"
+
+def _read_audio(future, sentence: str, voice: str):
+    """
+    Yield one synthesized sentence in AUDIO_CHUNK_BYTES pieces; a failed sentence is skipped, not fatal.
+    A file evicted from the TTS cache before it was opened is synthesized once more.
+    """
+    try:
+        path = future.result()
+        try:
+            fh = open(path, "rb")
+        except FileNotFoundError:
+            logging.info("TTS cache file evicted before playback; synthesizing the sentence again")
+            fh = open(synthesize_speech(sentence, voice), "rb")
+    except Exception:
+        logging.exception("TTS failed for one reply sentence; skipping it")
+        return
+    with fh:
+        while True:
+            chunk = fh.read(AUDIO_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
 
-    # Optionally synthesize TTS
-    if accept_audio:
-        audio_file_path = synthesize_speech(final_reply_text, voice="en-IN")
-        return send_file(audio_file_path, mimetype="audio/mpeg")
+def _first_audio(started: float, conversation_id: int) -> float:
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    if elapsed_ms > Config.VOICE_RESPONSE_SLA_MS:
+        metrics.inc("sla_breaches_total", endpoint="voice_upload")
+        logging.warning("Voice time-to-first-audio %.0fms exceeds SLA %dms (conversation %s)",
+                        elapsed_ms, Config.VOICE_RESPONSE_SLA_MS, conversation_id)
     else:
-        return jsonify({"reply": final_reply_text, "transcript": stt_result.get("text")})
+        logging.info("Voice time-to-first-audio %.0fms (conversation %s)", elapsed_ms, conversation_id)
+    return elapsed_ms
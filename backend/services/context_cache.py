@@ -0,0 +1,119 @@
+"""
+Conversation context cache (Redis, write-through).
+
+- One capped Redis list per conversation holding the last MAX_CONTEXT_MESSAGES
+  entries as JSON {"role": ..., "content": ..., "tokens": n}. The token count is
+  computed once when the entry is written, so prompt assembly never re-tokenizes history.
+- Appended whenever the chat pipeline persists a Message, so the hot path never
+  has to read the messages table.
+- On a miss the list is rebuilt from Postgres with a single indexed query
+  (conversation_id, created_at), plus any of the conversation's rows still
+  queued in the write-behind stream (services.message_store.queued_messages).
+- Idle conversations expire via CONTEXT_CACHE_TTL_SEC.
+- A rebuilt list always starts with a marker entry, so conversations with no
+  history yet are cached too and later appends land in an existing list. This is
+  what gives read-your-writes when messages are persisted write-behind
+  (services.message_store).
+"""
+
+import json
+import logging
+from typing import List
+
+import redis
+from config import Config
+from extensions import redis_client
+from models import Message
+from services import message_store
+from utils.helpers import count_tokens
+
+KEY_PREFIX = "ctx"
+MARKER = json.dumps({"role": "_init"})
+
+# Message.sender -> chat role understood by the LLM adapter
+SENDER_ROLES = {"user": "user", "bot": "assistant", "agent": "assistant", "system": "system"}
+
+
+def _key(conversation_id: int) -> str:
+    return f"{KEY_PREFIX}:{conversation_id}"
+
+
+def _entry(sender: str, text: str) -> dict:
+    return {"role": SENDER_ROLES.get(sender, "user"), "content": text, "tokens": count_tokens(text)}
+
+
+def append_message(conversation_id: int, sender: str, text: str) -> None:
+    """
+    Write-through append after a Message has been persisted.
+
+    Uses RPUSHX so a cold conversation is not seeded with a partial history;
+    the next read rebuilds it from the DB instead.
+    """
+    key = _key(conversation_id)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.rpushx(key, json.dumps(_entry(sender, text)))
+        pipe.ltrim(key, -Config.MAX_CONTEXT_MESSAGES, -1)
+        pipe.expire(key, Config.CONTEXT_CACHE_TTL_SEC)
+        pipe.execute()
+    except redis.RedisError:
+        logging.warning("Context cache append failed for conversation %s", conversation_id, exc_info=True)
+
+
+def get_recent_messages(conversation_id: int, limit: int = None) -> List[dict]:
+    """Return up to `limit` most recent context entries ({role, content, tokens}), oldest first."""
+    limit = min(limit or Config.MAX_CONTEXT_MESSAGES, Config.MAX_CONTEXT_MESSAGES)
+    key = _key(conversation_id)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.lrange(key, -limit, -1)
+        pipe.expire(key, Config.CONTEXT_CACHE_TTL_SEC)
+        cached, exists = pipe.execute()
+        if exists:
+            return [entry for entry in map(json.loads, cached) if entry.get("role") != "_init"]
+    except redis.RedisError:
+        logging.warning("Context cache read failed for conversation %s", conversation_id, exc_info=True)
+        return _load_from_db(conversation_id, limit)
+
+    entries = _load_from_db(conversation_id, Config.MAX_CONTEXT_MESSAGES)
+    _store(conversation_id, entries)
+    return entries[-limit:]
+
+
+def seed_empty(conversation_id: int) -> None:
+    """Mark a just-created conversation as cached-with-no-history (skips the first DB rebuild)."""
+    _store(conversation_id, [])
+
+
+def invalidate(conversation_id: int) -> None:
+    try:
+        redis_client.delete(_key(conversation_id))
+    except redis.RedisError:
+        logging.warning("Context cache invalidate failed for conversation %s", conversation_id, exc_info=True)
+
+
+def _load_from_db(conversation_id: int, limit: int) -> List[dict]:
+    """Single indexed query on (conversation_id, created_at), then rows not yet flushed by write-behind."""
+    rows = (
+        Message.query.with_entities(Message.sender, Message.text, Message.dedupe_key)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+        .all()
+    )
+    history = [(sender, text) for sender, text, _ in reversed(rows)]
+    history += message_store.queued_messages(conversation_id, {key for _, _, key in rows if key})
+    return [_entry(sender, text) for sender, text in history[-limit:]]
+
+
+def _store(conversation_id: int, entries: List[dict]) -> None:
+    key = _key(conversation_id)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.rpush(key, MARKER, *[json.dumps(e) for e in entries])
+        pipe.ltrim(key, -Config.MAX_CONTEXT_MESSAGES, -1)
+        pipe.expire(key, Config.CONTEXT_CACHE_TTL_SEC)
+        pipe.execute()
+    except redis.RedisError:
+        logging.warning("Context cache rebuild failed for conversation %s", conversation_id, exc_info=True)
@@ -0,0 +1,145 @@
+"""
+Conversation resolution for incoming messages.
+
+- Maps external user id -> (user_id, open conversation_id) with a per-worker LRU
+  in front of Redis, so a returning user costs zero DB round trips.
+- On a miss, a single statement upserts the user (INSERT ... ON CONFLICT) and
+  inserts-or-reuses their open conversation; the partial unique index
+  uq_conversations_user_open (one open conversation per user) settles concurrent
+  first messages instead of a check-then-insert. Databases without data-modifying
+  CTEs (SQLite, used by the offline load-test harness) run the same steps as ORM queries.
+- Closing a ticket (routes.agent.close) resolves its conversation and calls
+  forget(), so the customer's next message opens a fresh one. Escalation keeps
+  the conversation open (the agent takes it over), so its mapping stays valid.
+"""
+
+import json
+import logging
+from typing import Optional, Tuple
+
+import redis
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from extensions import db, redis_client
+from models import Conversation, User
+from utils.cache import LRUCache
+
+KEY_PREFIX = "convmap"
+
+_local = LRUCache(maxsize=Config.CONVERSATION_CACHE_LOCAL_MAX, ttl=Config.CONVERSATION_CACHE_LOCAL_TTL_SEC)
+
+# One round trip: upsert user, then insert-or-reuse their open conversation. The partial
+# unique index uq_conversations_user_open makes concurrent first messages converge on one
+# row. DO UPDATE (rather than DO NOTHING) so RETURNING always yields the id, even for a
+# row another transaction has just inserted; xmax = 0 only for a freshly inserted row.
+RESOLVE_SQL = text("""
+WITH u AS (
+    INSERT INTO users (external_id, locale, created_at)
+    VALUES (:external_id, :locale, (now() AT TIME ZONE 'utc'))
+    ON CONFLICT (external_id) DO UPDATE SET external_id = EXCLUDED.external_id
+    RETURNING id
+), conv AS (
+    INSERT INTO conversations (user_id, channel, status, language, created_at, last_active_at)
+    VALUES ((SELECT id FROM u), :channel, 'open', :locale, (now() AT TIME ZONE 'utc'), (now() AT TIME ZONE 'utc'))
+    ON CONFLICT (user_id) WHERE status = 'open' DO UPDATE SET last_active_at = EXCLUDED.last_active_at
+    RETURNING id, (xmax = 0) AS created
+)
+SELECT (SELECT id FROM u) AS user_id, conv.id AS conversation_id, conv.created AS created FROM conv
+""")
+
+
+def resolve(external_id: str, locale: str = "en_IN", channel: str = "web",
+            conversation_id: Optional[int] = None) -> Tuple[int, bool]:
+    """
+    Return (conversation_id, created) for a user's message.
+
+    An explicit conversation_id is honoured only when it belongs to the user (checked
+    on every call, cached or not); otherwise the user's open conversation is reused
+    (or created). Ids from form fields arrive as strings and are coerced here.
+    """
+    conversation_id = _as_id(conversation_id)
+    cached = _cache_get(external_id)
+    if cached and (not conversation_id or conversation_id == cached["conversation_id"]):
+        return cached["conversation_id"], False
+
+    if conversation_id:
+        conv = db.session.get(Conversation, conversation_id)
+        if conv and conv.user_id == _user_id(external_id, cached):
+            return conv.id, False
+
+    if db.engine.dialect.name == "postgresql":
+        row = db.session.execute(RESOLVE_SQL, {"external_id": external_id, "locale": locale, "channel": channel}).one()
+        user_id, conv_id, created = row.user_id, row.conversation_id, bool(row.created)
+    else:
+        user_id, conv_id, created = _resolve_orm(external_id, locale, channel)
+    db.session.commit()
+    _cache_set(external_id, {"user_id": user_id, "conversation_id": conv_id})
+    return conv_id, created
+
+
+def _as_id(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None  # not an id: fall back to the user's open conversation
+
+
+def _user_id(external_id: str, cached: Optional[dict]) -> Optional[int]:
+    if cached:
+        return cached["user_id"]
+    return db.session.execute(db.select(User.id).filter_by(external_id=external_id)).scalar()
+
+
+def _resolve_orm(external_id: str, locale: str, channel: str) -> Tuple[int, int, bool]:
+    """RESOLVE_SQL as separate statements: (user_id, conversation_id, created)."""
+    user = User.query.filter_by(external_id=external_id).first()
+    if user is None:
+        user = User(external_id=external_id, locale=locale)
+        db.session.add(user)
+        db.session.flush()
+    conv = Conversation.query.filter_by(user_id=user.id, status="open").first()
+    if conv is not None:
+        return user.id, conv.id, False
+    try:
+        with db.session.begin_nested():
+            conv = Conversation(user_id=user.id, channel=channel, status="open", language=locale)
+            db.session.add(conv)
+        return user.id, conv.id, True
+    except IntegrityError:
+        # A concurrent first message created it (uq_conversations_user_open)
+        conv = Conversation.query.filter_by(user_id=user.id, status="open").one()
+        return user.id, conv.id, False
+
+
+def forget(external_id: str) -> None:
+    """Drop the cached open-conversation mapping once that conversation is no longer open."""
+    _local.pop(external_id)
+    try:
+        redis_client.delete(f"{KEY_PREFIX}:{external_id}")
+    except redis.RedisError:
+        logging.warning("Conversation cache delete failed", exc_info=True)
+
+
+def _cache_get(external_id: str) -> Optional[dict]:
+    value = _local.get(external_id)
+    if value is not None:
+        return value
+    try:
+        raw = redis_client.get(f"{KEY_PREFIX}:{external_id}")
+    except redis.RedisError:
+        logging.warning("Conversation cache read failed", exc_info=True)
+        return None
+    if raw:
+        value = json.loads(raw)
+        _local.set(external_id, value)
+    return value
+
+
+def _cache_set(external_id: str, value: dict) -> None:
+    _local.set(external_id, value)
+    try:
+        redis_client.set(f"{KEY_PREFIX}:{external_id}", json.dumps(value), ex=Config.CONVERSATION_CACHE_TTL_SEC)
+    except redis.RedisError:
+        logging.warning("Conversation cache write failed", exc_info=True)
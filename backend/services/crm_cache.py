@@ -0,0 +1,314 @@
+"""
+Read-through cache in front of services.crm_service.
+
+Profiles:
+- Two tiers: per-worker LRU (utils.cache.LRUCache) in front of a shared Redis tier
+  ("crm:profile:<external_id>"), so one CRM call serves every worker.
+- Per-field TTLs (CRM_FIELD_TTLS): names change rarely, products often. Each field
+  carries its own fetch time.
+- Stale-while-revalidate: a field past its TTL is still served (until TTL x
+  CRM_STALE_FACTOR) while tasks.celery_tasks.refresh_crm_profile_task refetches it.
+  Past that hard limit the read blocks on the CRM.
+- Negative caching: users the CRM doesn't know are remembered for CRM_NEGATIVE_TTL_SEC.
+- prefetch_open_ticket_profiles() warms every user with an open ticket using the
+  CRM's bulk lookup.
+
+Tickets:
+- request_ticket() dedupes per conversation (Redis SET NX) and queues the ticket;
+  flush_tickets() sends queued tickets to the CRM in one bulk call per batch window.
+- No loss on crash or CRM error: one flush at a time (Redis lock); each batch is
+  moved atomically (Lua) into a processing list that is deleted only after the
+  CRM returns ids. The next flush (retry or the CRM_TICKET_SWEEP_SEC beat sweep)
+  resends a batch left behind (at-least-once).
+"""
+
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import redis
+from config import Config
+from extensions import db, redis_client
+from models import Conversation, Ticket, User
+from services import crm_service
+from utils.cache import LRUCache, SingleFlight
+
+PROFILE_PREFIX = "crm:profile"
+REFRESH_PREFIX = "crm:refresh"
+TICKET_PREFIX = "crm:ticket"
+TICKET_QUEUE = "crm:ticket:queue"
+TICKET_FLUSH_LOCK = "crm:ticket:flush"  # one scheduled flush per batch window
+TICKET_PROCESSING = "crm:ticket:processing"  # the batch being sent
+TICKET_RUN_LOCK = "crm:ticket:flush:run"
+PENDING = "pending"
+
+# KEYS[1] = queue, KEYS[2] = processing list; ARGV[1] = max items
+CLAIM_LUA = """
+local batch = redis.call('LRANGE', KEYS[1], 0, ARGV[1] - 1)
+if #batch > 0 then
+  redis.call('LTRIM', KEYS[1], #batch, -1)
+  redis.call('RPUSH', KEYS[2], unpack(batch))
+end
+return batch
+"""
+
+_claim_script = None
+
+_local = LRUCache(maxsize=Config.CRM_CACHE_LOCAL_MAX, ttl=Config.CRM_CACHE_LOCAL_TTL_SEC)
+_refresh_sent = LRUCache(maxsize=Config.CRM_CACHE_LOCAL_MAX, ttl=Config.CRM_CACHE_LOCAL_TTL_SEC)
+_inflight = SingleFlight()
+
+
+def _field_ttls() -> Dict[str, int]:
+    ttls = {}
+    for item in Config.CRM_FIELD_TTLS.split(","):
+        name, _, ttl = item.strip().partition("=")
+        if name and ttl:
+            ttls[name] = int(ttl)
+    return ttls
+
+
+FIELD_TTLS = _field_ttls()
+
+
+def _ttl(field: str) -> int:
+    return FIELD_TTLS.get(field, Config.CRM_DEFAULT_FIELD_TTL_SEC)
+
+
+def get_profile(external_user_id: str) -> dict:
+    """
+    Cached fetch_customer_profile(). Returns {} for unknown users, and the last
+    cached profile (or {}) when the CRM is unavailable.
+    """
+    entry = _lookup(external_user_id)
+    now = time.time()
+    if entry is not None:
+        state = _freshness(entry, now)
+        if state == "fresh":
+            return _fields(entry)
+        if state == "stale":
+            _schedule_refresh(external_user_id)
+            return _fields(entry)
+    try:
+        entry, _ = _inflight.do(external_user_id, refresh_profile, external_user_id)
+    except Exception:
+        logging.warning("CRM profile fetch failed for %s; serving cached data", external_user_id, exc_info=True)
+        return _fields(entry) if entry else {}
+    return _fields(entry)
+
+
+def refresh_profile(external_user_id: str) -> dict:
+    """Fetch from the CRM and store in both tiers. Returns the cache entry."""
+    try:
+        profile = crm_service.fetch_customer_profile(external_user_id)
+    finally:
+        _clear_refresh(external_user_id)
+    entry = _make_entry(profile or None)
+    _store(external_user_id, entry)
+    return entry
+
+
+def invalidate(external_user_id: str) -> None:
+    _local.pop(external_user_id)
+    try:
+        redis_client.delete(f"{PROFILE_PREFIX}:{external_user_id}")
+    except redis.RedisError:
+        logging.warning("CRM cache invalidate failed for %s", external_user_id, exc_info=True)
+
+
+def prefetch_open_ticket_profiles(force: bool = False) -> dict:
+    """
+    Warm profiles for every user with an open ticket. Only users whose cache
+    entry is missing or stale are looked up, in CRM_BATCH_SIZE bulk calls.
+    """
+    rows = (
+        db.session.query(User.external_id)
+        .join(Conversation, Conversation.user_id == User.id)
+        .join(Ticket, Ticket.conversation_id == Conversation.id)
+        .filter(Ticket.status == "open", User.external_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    ids = [row[0] for row in rows]
+    if not force:
+        now = time.time()
+        cached = _redis_get_many(ids)
+        ids = [ext_id for ext_id in ids if cached.get(ext_id) is None or _freshness(cached[ext_id], now) != "fresh"]
+    profiles = crm_service.fetch_customer_profiles(ids) if ids else {}
+    for ext_id, profile in profiles.items():
+        _store(ext_id, _make_entry(profile))
+    return {"open_ticket_users": len(rows), "prefetched": len(profiles)}
+
+
+def _make_entry(profile: Optional[dict]) -> dict:
+    now = time.time()
+    if profile is None:
+        return {"missing": True, "fetched_at": now}
+    return {"fields": {k: {"v": v, "t": now} for k, v in profile.items()}}
+
+
+def _fields(entry: dict) -> dict:
+    if entry.get("missing"):
+        return {}
+    return {k: f["v"] for k, f in entry.get("fields", {}).items()}
+
+
+def _freshness(entry: dict, now: float) -> str:
+    """'fresh', 'stale' (serve + refresh) or 'expired' (must refetch)."""
+    if entry.get("missing"):
+        return "fresh" if now - entry["fetched_at"] < Config.CRM_NEGATIVE_TTL_SEC else "expired"
+    state = "fresh"
+    for name, field in entry.get("fields", {}).items():
+        age = now - field["t"]
+        if age >= _ttl(name) * Config.CRM_STALE_FACTOR:
+            return "expired"
+        if age >= _ttl(name):
+            state = "stale"
+    return state
+
+
+def _redis_ttl(entry: dict) -> int:
+    if entry.get("missing"):
+        return Config.CRM_NEGATIVE_TTL_SEC
+    longest = max((_ttl(name) for name in entry.get("fields", {})), default=Config.CRM_DEFAULT_FIELD_TTL_SEC)
+    return int(longest * Config.CRM_STALE_FACTOR)
+
+
+def _lookup(external_user_id: str) -> Optional[dict]:
+    entry = _local.get(external_user_id)
+    if entry is not None:
+        return entry
+    try:
+        raw = redis_client.get(f"{PROFILE_PREFIX}:{external_user_id}")
+    except redis.RedisError:
+        logging.warning("CRM cache read failed for %s", external_user_id, exc_info=True)
+        return None
+    if raw is None:
+        return None
+    entry = json.loads(raw)
+    _local.set(external_user_id, entry)
+    return entry
+
+
+def _redis_get_many(ids: List[str]) -> Dict[str, Optional[dict]]:
+    if not ids:
+        return {}
+    try:
+        raws = redis_client.mget([f"{PROFILE_PREFIX}:{ext_id}" for ext_id in ids])
+    except redis.RedisError:
+        logging.warning("CRM cache bulk read failed", exc_info=True)
+        return {}
+    return {ext_id: json.loads(raw) if raw else None for ext_id, raw in zip(ids, raws)}
+
+
+def _store(external_user_id: str, entry: dict) -> None:
+    _local.set(external_user_id, entry)
+    try:
+        redis_client.set(f"{PROFILE_PREFIX}:{external_user_id}", json.dumps(entry, default=str), ex=_redis_ttl(entry))
+    except redis.RedisError:
+        logging.warning("CRM cache write failed for %s", external_user_id, exc_info=True)
+
+
+def _schedule_refresh(external_user_id: str) -> None:
+    """Enqueue one background refresh per user across workers."""
+    if _refresh_sent.get(external_user_id):
+        return
+    _refresh_sent.set(external_user_id, True)
+    try:
+        if not redis_client.set(f"{REFRESH_PREFIX}:{external_user_id}", 1, nx=True, ex=Config.CRM_CACHE_LOCAL_TTL_SEC):
+            return
+    except redis.RedisError:
+        return  # serve stale; the next expired read refetches inline
+
+    from tasks.celery_tasks import refresh_crm_profile_task  # avoid import cycle at module load
+    refresh_crm_profile_task.delay(external_user_id)
+
+
+def _clear_refresh(external_user_id: str) -> None:
+    _refresh_sent.pop(external_user_id)
+    try:
+        redis_client.delete(f"{REFRESH_PREFIX}:{external_user_id}")
+    except redis.RedisError:
+        pass
+
+
+def request_ticket(conversation_id: int, summary: str, metadata: dict = None) -> Optional[str]:
+    """
+    Ask for a CRM ticket for a conversation. Returns the existing external id when
+    one was already created, None when the ticket is queued (or already pending).
+    Without Redis the ticket is created inline.
+    """
+    key = f"{TICKET_PREFIX}:{conversation_id}"
+    try:
+        if not redis_client.set(key, PENDING, nx=True, ex=Config.CRM_TICKET_DEDUPE_TTL_SEC):
+            existing = redis_client.get(key)
+            existing = existing.decode() if existing else None
+            return None if existing == PENDING else existing
+        redis_client.rpush(TICKET_QUEUE, json.dumps(
+            {"conversation_id": conversation_id, "summary": summary, "metadata": metadata or {}}, default=str))
+        first_in_window = redis_client.set(TICKET_FLUSH_LOCK, 1, nx=True, ex=Config.CRM_TICKET_BATCH_WINDOW_SEC)
+    except redis.RedisError:
+        logging.warning("CRM ticket queue unavailable; creating ticket inline", exc_info=True)
+        ticket_id = crm_service.create_crm_ticket(conversation_id, summary, metadata)
+        _record_ticket_ids({conversation_id: ticket_id})
+        return ticket_id
+
+    if first_in_window:
+        from tasks.celery_tasks import flush_crm_tickets_task  # avoid import cycle at module load
+        flush_crm_tickets_task.apply_async(countdown=Config.CRM_TICKET_BATCH_WINDOW_SEC)
+    return None
+
+
+def flush_tickets() -> dict:
+    """Create every queued ticket, CRM_TICKET_BATCH_MAX per bulk call. Raises if the CRM call fails."""
+    global _claim_script
+    if _claim_script is None:
+        _claim_script = redis_client.register_script(CLAIM_LUA)
+    lock = redis_client.lock(TICKET_RUN_LOCK, timeout=Config.CRM_TICKET_FLUSH_LOCK_SEC)
+    if not lock.acquire(blocking=False):
+        return {"created": 0}  # another worker is flushing; it drains the queue before it exits
+    created = 0
+    try:
+        raws = redis_client.lrange(TICKET_PROCESSING, 0, -1)  # batch of a flush that died or failed
+        if raws:
+            logging.warning("Resending %d CRM tickets left by an interrupted flush", len(raws))
+        while True:
+            if not raws:
+                raws = _claim_script(keys=[TICKET_QUEUE, TICKET_PROCESSING], args=[Config.CRM_TICKET_BATCH_MAX])
+                if not raws:
+                    break
+            created += _send_tickets(raws)
+            redis_client.delete(TICKET_PROCESSING)  # the CRM has confirmed every ticket of the batch
+            lock.extend(Config.CRM_TICKET_FLUSH_LOCK_SEC, replace_ttl=True)
+            raws = None
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+    return {"created": created}
+
+
+def _send_tickets(raws) -> int:
+    batch = {}
+    for raw in raws:
+        item = json.loads(raw)
+        batch[item["conversation_id"]] = item  # latest summary wins within a batch
+    tickets = list(batch.values())
+    ids = crm_service.create_crm_tickets(tickets)
+    mapping = {t["conversation_id"]: ticket_id for t, ticket_id in zip(tickets, ids)}
+    pipe = redis_client.pipeline(transaction=False)
+    for conversation_id, ticket_id in mapping.items():
+        pipe.set(f"{TICKET_PREFIX}:{conversation_id}", ticket_id, ex=Config.CRM_TICKET_DEDUPE_TTL_SEC)
+    pipe.execute()
+    _record_ticket_ids(mapping)
+    return len(mapping)
+
+
+def _record_ticket_ids(mapping: Dict[int, str]) -> None:
+    """Store external ids on the local open tickets of those conversations."""
+    tickets = Ticket.query.filter(Ticket.conversation_id.in_(list(mapping)), Ticket.status == "open").all()
+    for ticket in tickets:
+        ticket.meta = {**(ticket.meta or {}), "crm_ticket_id": mapping[ticket.conversation_id]}
+    db.session.commit()
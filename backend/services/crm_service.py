@@ -2,19 +2,70 @@
 CRM adapter to fetch and update customer records.
 - hide vendor specifics (Salesforce, Zendesk, Freshdesk) behind a simple interface.
 - used for personalization and ticket creation.
+- calls go over the shared keep-alive session for CRM_BASE_URL (extensions.http_request);
+  with CRM_BASE_URL unset the adapter runs in stub mode.
 """
 
+from config import Config
+from extensions import http_request
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {Config.CRM_API_KEY}", "Accept": "application/json"}
+
 def fetch_customer_profile(external_user_id: str) -> dict:
     """
     Fetch customer profile from CRM. Return dict with keys: name, email, phone, products.
     If not found, return empty dict.
     """
-    # Pseudocode: implement actual API call and error handling
-    return {}
+    if not Config.CRM_BASE_URL:
+        return {}
+    resp = http_request("GET", f"{Config.CRM_BASE_URL}/customers/{external_user_id}", headers=_headers(),
+                        timeout=Config.CRM_REQUEST_TIMEOUT_SEC)
+    if resp.status_code == 404:
+        return {}
+    resp.raise_for_status()
+    data = resp.json()
+    return {key: data.get(key) for key in ("name", "email", "phone", "products")}
 
 def create_crm_ticket(conversation_id: int, summary: str, metadata: dict = None) -> str:
     """
     Create a ticket in the CRM and return external ticket id.
     """
-    # Pseudocode call
-    return "CRM-123456"
+    if not Config.CRM_BASE_URL:
+        return "CRM-123456"
+    resp = http_request("POST", f"{Config.CRM_BASE_URL}/tickets", headers=_headers(),
+                        json={"conversation_id": conversation_id, "summary": summary, "metadata": metadata or {}},
+                        timeout=Config.CRM_REQUEST_TIMEOUT_SEC)
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+def fetch_customer_profiles(external_user_ids: list) -> dict:
+    """
+    Bulk profile lookup: {external_user_id: profile dict, or None when the CRM has no such user}.
+    One call per CRM_BATCH_SIZE ids.
+    """
+    if not Config.CRM_BASE_URL:
+        return {ext_id: None for ext_id in external_user_ids}
+    out = {}
+    for i in range(0, len(external_user_ids), Config.CRM_BATCH_SIZE):
+        chunk = external_user_ids[i:i + Config.CRM_BATCH_SIZE]
+        resp = http_request("GET", f"{Config.CRM_BASE_URL}/customers", params={"ids": ",".join(chunk)},
+                            headers=_headers(), timeout=Config.CRM_REQUEST_TIMEOUT_SEC)
+        resp.raise_for_status()
+        found = {str(row.get("external_id")): row for row in resp.json().get("customers", [])}
+        for ext_id in chunk:
+            row = found.get(ext_id)
+            out[ext_id] = {key: row.get(key) for key in ("name", "email", "phone", "products")} if row else None
+    return out
+
+def create_crm_tickets(tickets: list) -> list:
+    """
+    Bulk ticket creation. tickets: [{"conversation_id", "summary", "metadata"}];
+    returns external ticket ids in the same order.
+    """
+    if not Config.CRM_BASE_URL:
+        return [create_crm_ticket(t["conversation_id"], t["summary"], t.get("metadata")) for t in tickets]
+    resp = http_request("POST", f"{Config.CRM_BASE_URL}/tickets/batch", headers=_headers(),
+                        json={"tickets": tickets}, timeout=Config.CRM_REQUEST_TIMEOUT_SEC)
+    resp.raise_for_status()
+    return [row["id"] for row in resp.json()["tickets"]]
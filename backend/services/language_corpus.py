@@ -0,0 +1,245 @@
+"""
+Seed sentences for services.language_id.
+
+Romanized (Latin-script) support messages per language. Native-script text is
+identified by its Unicode block and needs no samples. The sentences deliberately
+share the loanwords customers use in every language ("recharge", "network",
+"customer care"), so the model learns to ignore them. Keep them lower-case
+and domain-focused; the held-out evaluation set is
+benchmarks/data/langid_sample.jsonl.
+"""
+
+EN = [
+    "my internet has not been working since yesterday",
+    "i want to see my bill",
+    "when will i get my refund",
+    "this is a really bad service",
+    "can you please help me",
+    "i recharged but the balance did not show up",
+    "money was deducted but the recharge failed",
+    "i have been struggling for three days",
+    "please change my plan",
+    "i want to talk to an agent",
+    "there is no network at all",
+    "your customer care is useless",
+    "okay thank you",
+    "yes this is exactly what i needed",
+    "my sim card has been blocked",
+    "how many days will it take to fix this",
+    "will it be done by tomorrow",
+    "i have paid twice",
+    "i still have not received any reply",
+    "you people never do anything",
+    "i need a new connection",
+    "is this offer still available",
+    "i want to port my number",
+    "it was nice talking to you",
+    "i do not understand what to do",
+    "please fix it as soon as possible",
+    "i forgot my wifi password",
+    "what happened to my complaint",
+    "why was i charged this wrong amount",
+    "when will the technician come to my house",
+    "the speed is very slow in the evening",
+    "could you send me the invoice by email",
+]
+
+HI = [
+    "mera internet kal se kaam nahi kar raha hai",
+    "mujhe apna bill dekhna hai",
+    "aap mujhe refund kab tak denge",
+    "yeh bahut kharab service hai",
+    "kya aap meri madad kar sakte hain",
+    "mera recharge ho gaya lekin balance nahi aaya",
+    "paise kat gaye par recharge nahi hua",
+    "main pichle teen din se pareshan hoon",
+    "kripya mera plan badal dijiye",
+    "mujhe kisi agent se baat karni hai",
+    "network bilkul nahi aa raha",
+    "aapka customer care bekaar hai",
+    "theek hai dhanyavad",
+    "haan mujhe yahi chahiye tha",
+    "mera sim card band ho gaya hai",
+    "kitne din lagenge isko theek hone mein",
+    "kal tak ho jayega kya",
+    "maine do baar payment kiya hai",
+    "abhi tak koi jawab nahi mila",
+    "aap log kuch bhi nahi karte",
+    "mujhe naya connection chahiye",
+    "kya yeh offer abhi bhi chalu hai",
+    "mera number port karna hai",
+    "bahut accha laga aapse baat karke",
+    "samajh nahi aa raha kya karun",
+    "jaldi se jaldi theek kar do please",
+    "wifi ka password bhool gaya hoon",
+    "meri shikayat ka kya hua",
+    "yeh galat charge kyun laga hai",
+    "ghar pe technician kab aayega",
+]
+
+TA = [
+    "en internet netru irundhu velai seiyavillai",
+    "enakku en bill paarkanum",
+    "refund eppo varum",
+    "romba mosamana service",
+    "neenga enakku udhavi panna mudiyuma",
+    "recharge pannen aana balance varala",
+    "kaasu poyiduchu recharge aagala",
+    "moonu naala romba kashtama irukku",
+    "dayavu senju en plan maathunga",
+    "naan oru agent kitta pesanum",
+    "network sutthama varala",
+    "ungal customer care waste",
+    "sari nandri",
+    "aama enakku idhu dhaan venum",
+    "en sim card block aagiduchu",
+    "idhu sari aaga evlo naal aagum",
+    "naalaikku mudinjidumaa",
+    "naan rendu thadava pay panniten",
+    "innum edhuvum pathil varala",
+    "neenga onnume panna maatringa",
+    "enakku pudhu connection venum",
+    "indha offer ippavum irukka",
+    "en number port pannanum",
+    "ungakitta pesinadhu romba nalla irundhuchu",
+    "enna pannanum nu puriyala",
+    "seekiram sari pannunga please",
+    "wifi password marandhutten",
+    "en complaint enna aachu",
+    "yen indha thappana charge vandhirukku",
+    "technician veetukku eppo varuvaanga",
+]
+
+TE = [
+    "naa internet ninna nunchi pani cheyyatledu",
+    "naaku naa bill chudali",
+    "refund eppudu vastundi",
+    "chala chetta service",
+    "meeru naaku sahayam cheyagalara",
+    "recharge chesanu kani balance raaledu",
+    "dabbulu poyayi recharge avvaledu",
+    "moodu rojula nunchi chala ibbandi padutunnanu",
+    "dayachesi naa plan marchandi",
+    "nenu oka agent tho matladali",
+    "network asalu raavatledu",
+    "mee customer care waste",
+    "sare dhanyavadalu",
+    "avunu naaku ide kavali",
+    "naa sim card block ayyindi",
+    "idi sari avvadaniki enni rojulu padutundi",
+    "repati lopu avutunda",
+    "nenu rendu sarlu payment chesanu",
+    "inka emi samadhanam raaledu",
+    "meeru emi cheyyaru",
+    "naaku kotha connection kavali",
+    "ee offer ippudu kuda undaa",
+    "naa number port cheyyali",
+    "mitho matladadam chala bagundi",
+    "emi cheyyalo ardham kavatledu",
+    "tondaraga sari cheyyandi please",
+    "wifi password marchipoyanu",
+    "naa complaint emaindi",
+    "ee tappu charge enduku vachindi",
+    "technician intiki eppudu vastaru",
+]
+
+BN = [
+    "amar internet kal theke kaaj korche na",
+    "ami amar bill dekhte chai",
+    "refund kobe pabo",
+    "khub kharap service",
+    "apni ki amake sahajjo korte paren",
+    "recharge korechi kintu balance ashe ni",
+    "taka kete niyeche kintu recharge hoy ni",
+    "tin din dhore khub jhamela hocche",
+    "doya kore amar plan bodle din",
+    "ami ekjon agent er sathe kotha bolte chai",
+    "network ekdom ashche na",
+    "apnader customer care bekar",
+    "thik ache dhonnobad",
+    "haan amar eta i dorkar chilo",
+    "amar sim card bondho hoye geche",
+    "eta thik hote koto din lagbe",
+    "kal er moddhe hobe ki",
+    "ami dubar payment korechi",
+    "ekhono kono uttor pai ni",
+    "apnara kichui koren na",
+    "amar notun connection dorkar",
+    "ei offer ta ki ekhono chalu ache",
+    "amar number port korte chai",
+    "apnar sathe kotha bole khub bhalo laglo",
+    "bujhte parchi na ki korbo",
+    "taratari thik kore din please",
+    "wifi er password bhule gechi",
+    "amar obhijog er ki holo",
+    "ei bhul charge keno laglo",
+    "technician kobe barite ashbe",
+]
+
+KN = [
+    "nanna internet ninne inda kelsa madtilla",
+    "nanage nanna bill nodbeku",
+    "refund yavaga barutte",
+    "tumba ketta service",
+    "neevu nanage sahaya madtira",
+    "recharge madide adre balance bandilla",
+    "duddu hoytu recharge aagilla",
+    "mooru dinadinda tumba tondare aagtide",
+    "dayavittu nanna plan badalayisi",
+    "nanu obba agent jothe mathadbeku",
+    "network swalpanu barta illa",
+    "nimma customer care waste",
+    "sari dhanyavadagalu",
+    "houdu nanage idhe beku",
+    "nanna sim card block aagide",
+    "idu sari aagoke eshtu dina beku",
+    "naale olage aagutta",
+    "nanu eradu sala payment madidini",
+    "innu yavude uttara bandilla",
+    "neevu enu madalla",
+    "nanage hosa connection beku",
+    "ee offer iga kooda ideya",
+    "nanna number port madbeku",
+    "nimjothe mathadi tumba khushi aaytu",
+    "enu madbeku antha gothagtilla",
+    "bega sari madi please",
+    "wifi password marethu hoytu",
+    "nanna complaint enaaytu",
+    "ee thappu charge yake bantu",
+    "technician manege yavaga bartare",
+]
+
+ML = [
+    "ente internet innale muthal work cheyyunnilla",
+    "enikku ente bill kananam",
+    "refund eppol kittum",
+    "valare mosham service",
+    "ningalkku enne sahayikkan pattumo",
+    "recharge cheythu pakshe balance vannilla",
+    "paisa poyi recharge aayilla",
+    "moonnu divasamayi valiya budhimuttanu",
+    "dayavayi ente plan maattitharu",
+    "enikku oru agent-inodu samsarikkanam",
+    "network theere kittunnilla",
+    "ningalude customer care waste aanu",
+    "sheri nanni",
+    "athe enikku ithu thanne aanu vendathu",
+    "ente sim card block aayi",
+    "ithu sheriyakan ethra divasam edukkum",
+    "naale aakumbozhekkum aakumo",
+    "njan randu thavana payment cheythu",
+    "ithuvare oru marupadiyum kittiyilla",
+    "ningal onnum cheyyunnilla",
+    "enikku puthiya connection venam",
+    "ee offer ippozhum undo",
+    "ente number port cheyyanam",
+    "ningalodu samsarichathil valare santhosham",
+    "enthu cheyyanam ennu manassilakunnilla",
+    "vegam sheriyakku please",
+    "wifi password marannu poyi",
+    "ente complaint enthayi",
+    "ee thettaya charge enthinu vannu",
+    "technician eppol veettil varum",
+]
+
+ROMANIZED = {"en": EN, "hi": HI, "ta": TA, "te": TE, "bn": BN, "kn": KN, "ml": ML}
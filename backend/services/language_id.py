@@ -0,0 +1,168 @@
+"""
+Local language identification for incoming messages (no provider call).
+
+- Native-script text (Devanagari, Bengali, Tamil, Telugu, Kannada, Malayalam) is
+  identified by its Unicode block.
+- Latin-script text is scored by a multinomial naive Bayes model over character
+  2-4 grams and whole words. The model covers English plus romanized
+  hi/ta/te/bn/kn/ml and is trained at import from services.language_corpus
+  (a few thousand features). A message costs a few dict lookups and one numpy
+  row sum, i.e. tens of microseconds.
+- Locales: "hi_IN" for native script, "hi_IN@latin" for romanized text (replies
+  stay in the script the customer types), "en_IN" for English.
+- conversation_locale() keeps the language sticky per conversation. The value is
+  stored in Conversation.language, cached in a per-worker LRU backed by Redis,
+  and changed only by a confident detection. Short or ambiguous messages
+  ("ok", "123") keep the conversation's language.
+"""
+
+import logging
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import redis
+
+from config import Config
+from extensions import db, redis_client
+from models import Conversation
+from services.language_corpus import ROMANIZED
+from utils.cache import LRUCache
+
+LANGUAGES = ("en", "hi", "ta", "te", "bn", "kn", "ml")
+NAMES = {"en": "English", "hi": "Hindi", "ta": "Tamil", "te": "Telugu", "bn": "Bengali", "kn": "Kannada",
+         "ml": "Malayalam"}
+KEY_PREFIX = "convlang"
+MAX_CHARS = 300  # the start of a message is enough to identify it
+SMOOTHING = 0.5
+
+# 128-code-point Unicode blocks from U+0900: Devanagari, Bengali, (Gurmukhi, Gujarati, Oriya), Tamil, ...
+_BLOCKS = {0: "hi", 1: "bn", 5: "ta", 6: "te", 7: "kn", 8: "ml"}
+_INDIC_RE = re.compile(r"[ऀ-ൿ]")
+_LATIN_RE = re.compile(r"[a-z]+")
+
+_local = LRUCache(maxsize=Config.LANGID_CACHE_LOCAL_MAX, ttl=Config.LANGID_CACHE_LOCAL_TTL_SEC)
+
+
+def _features(text: str) -> List[str]:
+    feats = []
+    for word in _LATIN_RE.findall(text):
+        feats.append("w:" + word)
+        padded = f" {word} "
+        for n in (2, 3, 4):
+            feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return feats
+
+
+def _train(corpus: Dict[str, List[str]]) -> Tuple[Dict[str, int], np.ndarray]:
+    """(feature -> row, log P(feature | language) matrix with one column per LANGUAGES entry)."""
+    counts = {lang: Counter(f for sentence in corpus[lang] for f in _features(sentence)) for lang in LANGUAGES}
+    vocab = sorted(set().union(*counts.values()))
+    index = {feature: row for row, feature in enumerate(vocab)}
+    table = np.empty((len(vocab), len(LANGUAGES)), dtype=np.float32)
+    for col, lang in enumerate(LANGUAGES):
+        freq = np.fromiter((counts[lang].get(f, 0) for f in vocab), dtype=np.float64, count=len(vocab))
+        table[:, col] = np.log((freq + SMOOTHING) / (freq.sum() + SMOOTHING * len(vocab)))
+    return index, table
+
+
+_index, _table = _train(ROMANIZED)
+
+
+def locale_for(lang: str, romanized: bool = False) -> str:
+    if lang == "en":
+        return "en_IN"
+    return f"{lang}_IN@latin" if romanized else f"{lang}_IN"
+
+
+def language_name(locale: str) -> str:
+    """Prompt-friendly name: "hi_IN" -> "Hindi", "hi_IN@latin" -> "Hindi written in Latin script"."""
+    base, _, modifier = (locale or "en_IN").partition("@")
+    name = NAMES.get(base.split("_", 1)[0].lower(), base)
+    return f"{name} written in Latin script (romanized)" if modifier == "latin" else name
+
+
+def detect(text: str) -> Optional[dict]:
+    """
+    {"language", "locale", "romanized", "confidence", "confident"} for text, or
+    None when it has no letters. Native scripts report the share of letters in
+    their block. Latin text reports the mean per-feature log-likelihood margin
+    between the best and second-best language.
+    """
+    text = (text or "")[:MAX_CHARS].casefold()
+    latin_letters = sum(map(len, _LATIN_RE.findall(text)))
+    indic = _INDIC_RE.findall(text)
+    if len(indic) > latin_letters:
+        block, count = Counter((ord(ch) - 0x900) >> 7 for ch in indic).most_common(1)[0]
+        lang = _BLOCKS.get(block)
+        if lang is None:
+            return None
+        share = count / (len(indic) + latin_letters)
+        return {"language": lang, "locale": locale_for(lang), "romanized": False, "confidence": round(share, 3),
+                "confident": share >= 0.5 and count >= Config.LANGID_MIN_LETTERS}
+
+    rows = [row for row in map(_index.get, _features(text)) if row is not None]
+    if not rows:
+        return None
+    scores = _table[rows].sum(axis=0) / len(rows)
+    second, best = np.argpartition(scores, -2)[-2:]
+    margin = float(scores[best] - scores[second])
+    lang = LANGUAGES[best]
+    return {"language": lang, "locale": locale_for(lang, romanized=lang != "en"), "romanized": lang != "en",
+            "confidence": round(margin, 3),
+            "confident": margin >= Config.LANGID_MIN_MARGIN and latin_letters >= Config.LANGID_MIN_LETTERS}
+
+
+def conversation_locale(conversation_id: int, text: str, fallback: str = "en_IN") -> str:
+    """
+    Locale to answer this message in. The conversation's stored language is used
+    unless the message is confidently in another language, in which case the
+    conversation switches (cache now, Conversation.language in the background).
+    """
+    if not Config.LANGID_ENABLED:
+        return fallback
+    current = _cached_language(conversation_id) or fallback
+    detection = detect(text)
+    if detection is None or not detection["confident"] or detection["locale"] == current:
+        return current
+    locale = detection["locale"]
+    _cache_set(conversation_id, locale)
+    from utils.pipeline import run_background  # needs the request's app; imported late to keep this module light
+    run_background(_store_language, conversation_id, locale)
+    return locale
+
+
+def _cached_language(conversation_id: int) -> Optional[str]:
+    value = _local.get(conversation_id)
+    if value is not None:
+        return value
+    try:
+        raw = redis_client.get(f"{KEY_PREFIX}:{conversation_id}")
+    except redis.RedisError:
+        logging.warning("Conversation language cache read failed", exc_info=True)
+        raw = None
+    if raw:
+        value = raw.decode()
+    else:
+        conv = db.session.get(Conversation, conversation_id)
+        value = conv.language if conv else None
+        if value is None:
+            return None
+    _cache_set(conversation_id, value, shared=raw is None)
+    return value
+
+
+def _cache_set(conversation_id: int, locale: str, shared: bool = True) -> None:
+    _local.set(conversation_id, locale)
+    if not shared:
+        return
+    try:
+        redis_client.set(f"{KEY_PREFIX}:{conversation_id}", locale, ex=Config.LANGID_CACHE_TTL_SEC)
+    except redis.RedisError:
+        logging.warning("Conversation language cache write failed", exc_info=True)
+
+
+def _store_language(conversation_id: int, locale: str) -> None:
+    Conversation.query.filter_by(id=conversation_id).update({"language": locale})
+    db.session.commit()
@@ -0,0 +1,124 @@
+"""
+LLM response cache.
+
+- Two tiers: per-worker LRU (utils.cache.LRUCache) in front of a shared Redis tier.
+- Key = digest(normalized user message, locale, system prompt, context fingerprint),
+  so only genuinely identical turns share an answer.
+- Only first turns are cached: the chat and voice routes pass cacheable=False
+  once a conversation has history or a summary, so personal turns never share
+  an answer with other customers.
+- Cross-process single-flight: the first worker to miss takes a short Redis lock;
+  others poll the Redis tier for its result instead of calling the provider.
+- Hit/miss/token-saved counters are kept per worker and surfaced in call_llm meta.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import redis
+from config import Config
+from extensions import redis_client
+from utils.cache import LRUCache
+
+KEY_PREFIX = "llm:resp"
+LOCK_PREFIX = "llm:lock"
+
+_local = LRUCache(maxsize=Config.LLM_CACHE_LOCAL_MAX, ttl=Config.LLM_CACHE_LOCAL_TTL_SEC)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "tokens_saved": 0}
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Case/whitespace-insensitive form; trailing punctuation does not change intent."""
+    return _WS_RE.sub(" ", text.casefold()).strip().rstrip("?!. ")
+
+
+def make_key(user_message: str, locale: str, system_prompt: str, context_messages: List[dict]) -> str:
+    fingerprint = hashlib.sha1(
+        json.dumps([(m.get("role"), m.get("content")) for m in context_messages], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    raw = "\x1f".join([normalize_message(user_message), locale or "", system_prompt, fingerprint])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str) -> Tuple[Optional[dict], Optional[str]]:
+    """Return (entry, tier) where entry = {"reply": ..., "meta": ...}; (None, None) on miss."""
+    entry = _local.get(key)
+    if entry is not None:
+        return entry, "local"
+    entry = _redis_get(key)
+    if entry is not None:
+        _local.set(key, entry)
+        return entry, "redis"
+    return None, None
+
+
+def store(key: str, reply: str, meta: dict) -> None:
+    entry = {"reply": reply, "meta": meta}
+    _local.set(key, entry)
+    try:
+        redis_client.set(f"{KEY_PREFIX}:{key}", json.dumps(entry, default=str), ex=Config.LLM_CACHE_TTL_SEC)
+    except redis.RedisError:
+        logging.warning("LLM cache store failed", exc_info=True)
+
+
+def acquire_lock(key: str) -> bool:
+    """Try to become the single caller for key across workers. Fails open if Redis is down."""
+    try:
+        return bool(redis_client.set(f"{LOCK_PREFIX}:{key}", 1, nx=True, ex=Config.LLM_REQUEST_TIMEOUT_SEC))
+    except redis.RedisError:
+        return True
+
+
+def release_lock(key: str) -> None:
+    try:
+        redis_client.delete(f"{LOCK_PREFIX}:{key}")
+    except redis.RedisError:
+        pass
+
+
+def wait_for(key: str, timeout: float, poll_interval: float = 0.05) -> Optional[dict]:
+    """Poll the shared tier while another worker's call for key is in flight."""
+    deadline = time.monotonic() + timeout
+    lock_key = f"{LOCK_PREFIX}:{key}"
+    while time.monotonic() < deadline:
+        entry = _redis_get(key)
+        if entry is not None:
+            _local.set(key, entry)
+            return entry
+        try:
+            if not redis_client.exists(lock_key):
+                return _redis_get(key)
+        except redis.RedisError:
+            return None
+        time.sleep(poll_interval)
+    return None
+
+
+def record(event: str, tokens_saved: int = 0) -> dict:
+    """Bump a counter ("hits" | "misses" | "coalesced") and return a snapshot."""
+    with _stats_lock:
+        _stats[event] += 1
+        _stats["tokens_saved"] += tokens_saved
+        return dict(_stats)
+
+
+def tokens_of(meta: dict) -> int:
+    usage = (meta or {}).get("usage") or {}
+    return int(usage.get("total_tokens") or 0)
+
+
+def _redis_get(key: str) -> Optional[dict]:
+    try:
+        raw = redis_client.get(f"{KEY_PREFIX}:{key}")
+    except redis.RedisError:
+        logging.warning("LLM cache read failed", exc_info=True)
+        return None
+    return json.loads(raw) if raw else None
@@ -0,0 +1,218 @@
+"""
+LLM provider router: circuit breakers, hedged requests and per-request deadlines.
+
+- CircuitBreaker: per-model; opens after N consecutive failures and skips the model
+  until a cooldown elapses, then lets one trial call through (half-open).
+- LatencyTracker: rolling window of successful call latencies per model; its
+  percentile is the hedge trigger.
+- route(): starts the primary model, and if it has not answered by the hedge
+  delay starts the fallback in parallel; first success wins. Every call is
+  bounded by a deadline derived from TEXT_RESPONSE_SLA_MS.
+
+Losing hedged calls are not cancelled (the provider SDK is blocking) but finish on
+the pool in the background and still feed the breaker and latency stats. A call
+still running at the deadline counts as a breaker failure right away (once per
+call), so a hanging provider opens its circuit instead of filling the pool.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Tuple
+
+from config import Config
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_sec: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown_sec:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial slot whose call ended without a verdict (e.g. client disconnect)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+
+    def percentile(self, pct: float, default: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 20:  # not enough data to trust the tail yet
+            return default
+        idx = min(len(samples) - 1, int(len(samples) * pct / 100.0))
+        return samples[idx]
+
+
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=Config.LLM_ROUTER_MAX_WORKERS, thread_name_prefix="llm")
+
+
+def breaker(model: str) -> CircuitBreaker:
+    with _registry_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_COOLDOWN_SEC)
+        return _breakers[model]
+
+
+def latency(model: str) -> LatencyTracker:
+    with _registry_lock:
+        if model not in _latencies:
+            _latencies[model] = LatencyTracker()
+        return _latencies[model]
+
+
+def request_deadline(started_at: float = None) -> float:
+    """Monotonic deadline for the LLM stage: the text SLA minus headroom for the rest of the pipeline."""
+    started_at = started_at or time.monotonic()
+    budget_ms = Config.TEXT_RESPONSE_SLA_MS - Config.LLM_DEADLINE_RESERVE_MS
+    return started_at + max(budget_ms, 0) / 1000.0
+
+
+def call_timeout(deadline: float) -> float:
+    return max(0.1, min(Config.LLM_REQUEST_TIMEOUT_SEC, deadline - time.monotonic()))
+
+
+def route(models: List[Tuple[str, int]], call: Callable, deadline: float = None) -> Tuple[str, dict]:
+    """
+    Run call(model, max_tokens, timeout) -> (reply, meta) across models in preference order.
+
+    Returns the first successful (reply, meta) with routing info merged into meta:
+    {model, hedged, fallback, skipped, latency_ms, deadline_ms}. Raises the last
+    error if no model answers before the deadline.
+    """
+    deadline = deadline or request_deadline()
+    started = time.monotonic()
+    queue = list(models)
+    skipped = []
+    pending = {}
+    last_error = None
+    hedged = False
+
+    def submit_next() -> bool:
+        # Breakers are consulted only when a model is actually about to be called,
+        # so a half-open trial slot is never claimed for a call that doesn't happen.
+        while queue:
+            model, max_tokens = queue.pop(0)
+            if breaker(model).allow():
+                attempt = _Attempt(model)
+                fut = _executor.submit(_timed_call, call, attempt, max_tokens, call_timeout(deadline))
+                pending[fut] = attempt
+                return True
+            skipped.append(model)
+        return False
+
+    if not submit_next():
+        raise RuntimeError(f"All LLM circuits open: {', '.join(skipped)}")
+    primary = next(iter(pending.values())).model
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = remaining
+        if queue:
+            hedge_after = latency(primary).percentile(Config.LLM_HEDGE_PERCENTILE, Config.LLM_HEDGE_DEFAULT_MS) / 1000.0
+            timeout = max(0.0, min(remaining, started + hedge_after - time.monotonic()))
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            model = pending.pop(fut).model
+            try:
+                reply, meta = fut.result()
+            except Exception as exc:
+                logging.warning("LLM model %s failed: %s", model, exc)
+                last_error = exc
+                continue
+            meta.update({
+                "model": model,
+                "hedged": hedged,
+                "fallback": model != models[0][0],
+                "skipped": skipped,
+                "latency_ms": int((time.monotonic() - started) * 1000),
+                "deadline_ms": int((deadline - started) * 1000),
+            })
+            return reply, meta
+        if queue and (not done or not pending):
+            # Primary is slow (hedge) or failed (fallback): start the next model
+            was_running = bool(pending)
+            if submit_next():
+                hedged = hedged or was_running
+    for attempt in pending.values():
+        attempt.settle(False)  # overran the deadline; a late answer no longer closes the circuit
+    raise last_error or TimeoutError("LLM deadline exceeded")
+
+
+class _Attempt:
+    """One provider call; its breaker verdict is recorded exactly once."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def settle(self, ok: bool):
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        if ok:
+            breaker(self.model).record_success()
+        else:
+            breaker(self.model).record_failure()
+
+
+def _timed_call(call: Callable, attempt: _Attempt, max_tokens: int, timeout: float):
+    t0 = time.monotonic()
+    try:
+        result = call(attempt.model, max_tokens, timeout)
+    except Exception:
+        attempt.settle(False)
+        raise
+    attempt.settle(True)
+    latency(attempt.model).add((time.monotonic() - t0) * 1000)
+    return result
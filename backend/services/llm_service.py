@@ -2,7 +2,7 @@
 LLM Adapter: centralize calls to LLM providers (OpenAI GPT-4 or Google PaLM).
 
 Responsibilities:
-- Prompt assembly (system prompt + truncated context)
+- Prompt assembly (system prompt + knowledge + context packed into TOKEN_BUDGET)
 - Locale handling (respond in Hindi/Tamil/etc)
 - Token budgeting and request timeouts
 - Fallback strategy for rate limits or provider errors
@@ -11,59 +11,259 @@ Responsibilities:
 
 import os
 import logging
-from typing import List, Tuple
+import time
+from typing import Iterator, List, Tuple
 
 # Example using OpenAI client (but we must keep an adapter interface)
 import openai
 from config import Config
+from extensions import sdk_session
+from services import llm_cache, llm_router
+from services.language_id import language_name
+from utils.cache import SingleFlight
+from utils import metrics
+from utils.helpers import assemble_prompt
 
 openai.api_key = Config.OPENAI_API_KEY
+openai.api_base = Config.OPENAI_API_BASE
+# Chat and embedding calls share the registry's keep-alive pool. The SDK caches a
+# session per thread and close()s it every few minutes, so each thread gets its own
+# Session on the shared adapter (close() is a no-op), and a forked child drops the
+# copy inherited from its parent.
+openai.requestssession = lambda: sdk_session(openai.api_base)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: openai.api_requestor._thread_context.__dict__.clear())
 
 SYSTEM_PROMPT = "You are a helpful customer support assistant. Be concise and friendly."
 
-def call_llm(context_messages: List[dict], user_message: str, locale: str = "en_IN") -> Tuple[str, dict]:
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a customer support conversation. "
+    "Merge the new messages into the existing summary. Keep customer identifiers, the issue, "
+    "steps already tried, promises made and open questions. Max 120 words, third person, "
+    "in the conversation's language."
+)
+SUMMARY_MODELS = [("gpt-3.5-turbo", 250), ("gpt-4", 250)]
+
+# (model, max_tokens) in preference order; later entries are hedge/fallback targets
+MODELS = [("gpt-4", 300), ("gpt-3.5-turbo", 200)]
+
+_inflight = SingleFlight()
+
+@metrics.traced("provider_call_seconds", call="call_llm")
+def call_llm(context_messages: List[dict], user_message: str, locale: str = "en_IN", cacheable: bool = True,
+             deadline: float = None, knowledge: List[str] = None, summary: str = None) -> Tuple[str, dict]:
     """
     Query the LLM and return a tuple (reply_text, metadata).
 
     Inputs:
       - context_messages: list of {"role": "user"/"assistant", "content": "..."}
       - user_message: current user text
-      - locale: user preferred locale (e.g., "hi_IN" — used in system prompt)
+      - locale: reply locale (e.g., "hi_IN", or "hi_IN@latin" for romanized Hindi — used in system prompt)
+      - cacheable: False for personalized turns that must never be served from/into the response cache
+      - deadline: time.monotonic() cutoff for the provider call (default: derived from TEXT_RESPONSE_SLA_MS)
+      - knowledge: retrieved snippets in rank order; packed ahead of history within the token budget
+      - summary: rolling summary of turns older than context_messages (Conversation.meta["summary"])
 
     Outputs:
       - reply_text: assistant reply string
-      - metadata: dict: {model, usage, tokens, latency_ms, fallback}
+      - metadata: dict: {model, usage, latency_ms, fallback, hedged, skipped, deadline_ms, cache}
     """
-    # 1) Build messages with system prompt + context (truncate to last N)
-    messages = [{"role": "system", "content": SYSTEM_PROMPT + f" Respond in {locale} if possible."}]
-    messages.extend(context_messages[-Config.MAX_CONTEXT_MESSAGES:])
-    messages.append({"role": "user", "content": user_message})
+    # 1) Build messages with system prompt + summary + knowledge + context packed into the token budget
+    system_prompt, context, messages = _build_messages(context_messages, user_message, locale, knowledge, summary)
 
-    try:
-        # Keep a firm timeout to meet SLA
-        resp = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=300,
-            temperature=0.25,
-            timeout=Config.LLM_REQUEST_TIMEOUT_SEC
-        )
-        reply = resp["choices"][0]["message"]["content"].strip()
-        meta = {"model": "gpt-4", "usage": resp.get("usage"), "finish_reason": resp["choices"][0].get("finish_reason")}
+    deadline = deadline or llm_router.request_deadline()
+    if not (cacheable and Config.LLM_CACHE_ENABLED):
+        reply, meta = _complete(messages, deadline)
+        meta["cache"] = {"status": "bypass"}
         return reply, meta
-    except Exception as exc:
-        logging.exception("LLM call failed; attempting fallback.")
-        # Fallback logic: attempt to use a faster model or return graceful message
+
+    # 2) Response cache: identical questions in the same locale/context share one answer
+    key = llm_cache.make_key(user_message, locale, system_prompt, context)
+    entry, tier = llm_cache.lookup(key)
+    if entry is not None:
+        return _from_cache(entry, f"hit_{tier}")
+
+    # 3) Miss: single-flight so concurrent identical requests wait on one provider call
+    if Config.LLM_SINGLE_FLIGHT:
+        (reply, meta, coalesced), shared = _inflight.do(key, _complete_coalesced, key, messages, deadline)
+        if shared or coalesced:
+            return _from_cache({"reply": reply, "meta": meta}, "coalesced")
+    else:
+        reply, meta = _complete(messages, deadline)
+        _store_if_ok(key, reply, meta)
+
+    meta = dict(meta)
+    meta["cache"] = {"status": "miss", "tokens_saved": 0, "stats": llm_cache.record("misses")}
+    return reply, meta
+
+
+def stream_llm(context_messages: List[dict], user_message: str, locale: str = "en_IN", cacheable: bool = True,
+               deadline: float = None, knowledge: List[str] = None, summary: str = None) -> Iterator[dict]:
+    """
+    Streaming variant of call_llm.
+
+    Yields {"delta": "..."} as the provider emits tokens, then exactly one
+    {"done": True, "reply": full_text, "meta": {...}}. Closing the generator
+    (client disconnect) closes the upstream provider stream. The stream stops at
+    deadline (finish_reason "deadline"), and a provider that goes silent for the
+    remaining budget fails the read.
+    """
+    system_prompt, context, messages = _build_messages(context_messages, user_message, locale, knowledge, summary)
+    deadline = deadline or llm_router.request_deadline()
+    key = None
+    if cacheable and Config.LLM_CACHE_ENABLED:
+        key = llm_cache.make_key(user_message, locale, system_prompt, context)
+        entry, tier = llm_cache.lookup(key)
+        if entry is not None:
+            reply, meta = _from_cache(entry, f"hit_{tier}")
+            yield {"delta": reply}
+            yield {"done": True, "reply": reply, "meta": meta}
+            return
+
+    parts = []
+    meta = {}
+    for model, max_tokens in MODELS:
+        # No hedging once tokens flow, but skip models whose circuit is open
+        circuit = llm_router.breaker(model)
+        if time.monotonic() >= deadline or not circuit.allow():
+            continue
+        meta = {"model": model, "stream": True}
         try:
-            fallback_resp = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            resp = openai.ChatCompletion.create(
+                model=model,
                 messages=messages,
-                max_tokens=200,
+                max_tokens=max_tokens,
                 temperature=0.25,
-                timeout=Config.LLM_REQUEST_TIMEOUT_SEC
+                request_timeout=llm_router.call_timeout(deadline),  # per-read bound on the HTTP stream
+                stream=True
             )
-            reply = fallback_resp["choices"][0]["message"]["content"].strip()
-            return reply, {"model": "gpt-3.5-turbo", "fallback": True}
-        except Exception as e2:
-            logging.exception("Fallback also failed.")
-            return ("We're unable to process this request right now. We'll escalate to a human agent." , {"error": str(e2)})
+            try:
+                for chunk in resp:
+                    if time.monotonic() >= deadline:
+                        if not parts:
+                            raise TimeoutError("LLM stream deadline exceeded")
+                        meta["finish_reason"] = "deadline"  # keep what the client already has
+                        break
+                    choice = chunk["choices"][0]
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield {"delta": delta}
+                    if choice.get("finish_reason"):
+                        meta["finish_reason"] = choice["finish_reason"]
+            finally:
+                close = getattr(resp, "close", None)
+                if close:
+                    close()
+            circuit.record_success()
+            meta["fallback"] = model != MODELS[0][0]
+            break
+        except GeneratorExit:
+            if parts:
+                circuit.record_success()
+            else:
+                circuit.release()
+            raise
+        except Exception as exc:
+            circuit.record_failure()
+            if parts:
+                # Tokens already reached the client; don't splice in another model's answer
+                logging.exception("LLM stream broke mid-reply.")
+                meta = {"model": model, "error": str(exc), "stream": True}
+                break
+            logging.exception("LLM stream failed on %s.", model)
+            meta = {"error": str(exc)}
+    else:
+        reply = "We're unable to process this request right now. We'll escalate to a human agent."
+        yield {"delta": reply}
+        yield {"done": True, "reply": reply, "meta": meta}
+        return
+
+    reply = "".join(parts).strip()
+    if key is not None and "error" not in meta and meta.get("finish_reason") != "deadline":  # never cache a cut reply
+        llm_cache.store(key, reply, meta)
+    meta["cache"] = {"status": "miss" if key is not None else "bypass"}
+    yield {"done": True, "reply": reply, "meta": meta}
+
+
+def summarize_messages(previous_summary: str, messages: List[dict], locale: str = "en_IN") -> Tuple[str, dict]:
+    """
+    Fold messages ({role, content}) into previous_summary and return (summary, meta).
+    Runs off the request path (Celery), so it uses the cheaper model first and the
+    provider timeout rather than the chat SLA. Raises if every provider fails.
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT + f" Language: {language_name(locale)}."},
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    deadline = time.monotonic() + Config.LLM_REQUEST_TIMEOUT_SEC * 2
+    return llm_router.route(SUMMARY_MODELS, lambda model, max_tokens, timeout: _provider_call(model, prompt, max_tokens, timeout), deadline)
+
+
+def _build_messages(context_messages: List[dict], user_message: str, locale: str, knowledge: List[str] = None,
+                    summary: str = None):
+    """Return (system_prompt, packed_context, provider_messages) packed into Config.TOKEN_BUDGET."""
+    system_prompt = SYSTEM_PROMPT + f" Respond in {language_name(locale)} if possible."
+    messages = assemble_prompt(system_prompt, context_messages[-Config.MAX_CONTEXT_MESSAGES:], user_message,
+                               Config.TOKEN_BUDGET, knowledge=knowledge, summary=summary)
+    # Everything between the system prompt and the current turn (summary + knowledge + history)
+    return system_prompt, messages[1:-1], messages
+
+
+def _complete_coalesced(key: str, messages: List[dict], deadline: float) -> Tuple[str, dict, bool]:
+    """Leader path for one worker; coordinates with other workers through a Redis lock."""
+    if not llm_cache.acquire_lock(key):
+        entry = llm_cache.wait_for(key, timeout=llm_router.call_timeout(deadline))
+        if entry is not None:
+            return entry["reply"], entry["meta"], True
+    try:
+        reply, meta = _complete(messages, deadline)
+        _store_if_ok(key, reply, meta)
+        return reply, meta, False
+    finally:
+        llm_cache.release_lock(key)
+
+
+def _store_if_ok(key: str, reply: str, meta: dict) -> None:
+    if "error" not in meta:
+        llm_cache.store(key, reply, meta)
+
+
+def _from_cache(entry: dict, status: str) -> Tuple[str, dict]:
+    meta = dict(entry["meta"])
+    saved = llm_cache.tokens_of(meta)
+    event = "coalesced" if status == "coalesced" else "hits"
+    meta["cache"] = {"status": status, "tokens_saved": saved, "stats": llm_cache.record(event, saved)}
+    return entry["reply"], meta
+
+
+def _complete(messages: List[dict], deadline: float = None) -> Tuple[str, dict]:
+    """Routed provider call (circuit breakers + hedged fallback within the deadline); never raises."""
+    try:
+        return llm_router.route(MODELS, lambda model, max_tokens, timeout: _provider_call(model, messages, max_tokens, timeout), deadline)
+    except Exception as exc:
+        logging.exception("All LLM providers failed.")
+        return ("We're unable to process this request right now. We'll escalate to a human agent." , {"error": str(exc)})
+
+
+def _provider_call(model: str, messages: List[dict], max_tokens: int, timeout: float) -> Tuple[str, dict]:
+    with metrics.span("llm_request_seconds", model=model):
+        resp = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.25,
+            request_timeout=timeout  # HTTP timeout; `timeout` only bounds the SDK's own retry loop
+        )
+    reply = resp["choices"][0]["message"]["content"].strip()
+    meta = {"usage": resp.get("usage"), "finish_reason": resp["choices"][0].get("finish_reason")}
+    _record_usage(model, meta["usage"])
+    return reply, meta
+
+
+def _record_usage(model: str, usage: dict) -> None:
+    # Counted per provider response, so hedged calls that lose the race are billed too
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            metrics.inc("llm_tokens_total", usage[kind], model=model, kind=kind.split("_")[0])
@@ -0,0 +1,233 @@
+"""
+Message persistence with an optional write-behind mode.
+
+- Direct mode (default): one INSERT + commit per message, as before.
+- Write-behind mode (MESSAGE_WRITE_BEHIND=true): the request path only XADDs the
+  row to a durable Redis stream; tasks.celery_tasks.drain_message_stream_task
+  drains it through a consumer group and writes each batch with a single
+  multi-row INSERT ... ON CONFLICT (dedupe_key) DO NOTHING.
+- Redelivered or reclaimed stream entries are idempotent via Message.dedupe_key.
+  The ON CONFLICT insert exists on Postgres and SQLite only; write-behind is not
+  supported on other databases.
+- A batch whose INSERT fails is retried row by row. Rows that still fail, and
+  entries delivered more than MESSAGE_WRITE_BEHIND_MAX_DELIVERIES times, move to
+  the DEAD_LETTER_KEY stream and are acknowledged, so one bad row cannot block
+  the stream. requeue_dead_letters() puts them back once the cause is fixed.
+  Connection errors leave the batch pending for the next run.
+- Read-your-writes: callers append to services.context_cache on the request path,
+  so the next turn sees the message before it reaches Postgres. A context cache
+  rebuild adds rows still queued here (queued_messages()).
+"""
+
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+import redis
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from config import Config
+from extensions import db, redis_client
+from models import Message
+
+STREAM_KEY = "messages:wb"
+GROUP = "message-writers"
+DEAD_LETTER_KEY = "messages:wb:dead"
+DEAD_LETTER_MAXLEN = 100000
+_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+# Not caused by any one row (database unreachable, unsupported dialect): the batch stays pending
+_BATCH_ERRORS = (OperationalError, InterfaceError, NotImplementedError)
+
+
+def persist_message(conversation_id: int, sender: str, text: str, metadata: dict = None) -> Optional[int]:
+    """
+    Persist one Message. Returns the row id in direct mode, None when queued write-behind.
+    Falls back to a direct insert if the stream is unavailable.
+    """
+    if Config.MESSAGE_WRITE_BEHIND:
+        row = {
+            "dedupe_key": uuid.uuid4().hex,
+            "conversation_id": conversation_id,
+            "sender": sender,
+            "text": text,
+            "metadata": metadata,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        try:
+            redis_client.xadd(STREAM_KEY, {"row": json.dumps(row, default=str)})
+            return None
+        except redis.RedisError:
+            logging.warning("Write-behind stream unavailable; inserting message directly", exc_info=True)
+
+    msg = Message(conversation_id=conversation_id, sender=sender, text=text, meta_data=metadata)
+    db.session.add(msg)
+    db.session.commit()
+    return msg.id
+
+
+def drain(batch_size: int = None, max_batches: int = None) -> int:
+    """
+    Flush queued messages to Postgres. Reclaims entries left pending by a crashed
+    consumer first, then reads new ones. Returns the number of rows written.
+    """
+    batch_size = batch_size or Config.MESSAGE_WRITE_BEHIND_BATCH
+    max_batches = max_batches or Config.MESSAGE_WRITE_BEHIND_MAX_BATCHES
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    _ensure_group()
+
+    written = 0
+    _, stale, *_ = redis_client.xautoclaim(STREAM_KEY, GROUP, consumer,
+                                           min_idle_time=Config.MESSAGE_WRITE_BEHIND_CLAIM_IDLE_MS,
+                                           start_id="0-0", count=batch_size)
+    if stale:
+        written += _flush(_drop_exhausted(stale))
+
+    for _ in range(max_batches):
+        resp = redis_client.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=batch_size)
+        if not resp:
+            break
+        entries = resp[0][1]
+        written += _flush(entries)
+        if len(entries) < batch_size:
+            break
+    return written
+
+
+def backlog() -> int:
+    """Stream length (queued + unacknowledged); useful for alerting on drain lag."""
+    try:
+        return redis_client.xlen(STREAM_KEY)
+    except redis.RedisError:
+        return -1
+
+
+def queued_messages(conversation_id: int, exclude_keys=frozenset()) -> List[tuple]:
+    """
+    (sender, text) of rows still queued for conversation_id, oldest first. Scans
+    the newest MESSAGE_WRITE_BEHIND_BATCH stream entries; rows whose dedupe_key is
+    in exclude_keys (already in the DB) are skipped. Returns [] if Redis is down.
+    """
+    if not Config.MESSAGE_WRITE_BEHIND:
+        return []
+    try:
+        entries = redis_client.xrevrange(STREAM_KEY, count=Config.MESSAGE_WRITE_BEHIND_BATCH)
+    except redis.RedisError:
+        logging.warning("Write-behind stream read failed", exc_info=True)
+        return []
+    queued = []
+    for _, fields in reversed(entries):
+        try:
+            row = _decode(fields)
+        except (ValueError, TypeError, KeyError):
+            continue
+        if row["conversation_id"] == conversation_id and row["dedupe_key"] not in exclude_keys:
+            queued.append((row["sender"], row["text"]))
+    return queued
+
+
+def requeue_dead_letters(count: int = 1000) -> int:
+    """Move up to `count` dead-lettered rows back onto the write-behind stream."""
+    entries = redis_client.xrange(DEAD_LETTER_KEY, count=count)
+    for entry_id, fields in entries:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.xadd(STREAM_KEY, {"row": fields.get(b"row") or fields.get("row")})
+        pipe.xdel(DEAD_LETTER_KEY, entry_id)
+        pipe.execute()
+    return len(entries)
+
+
+def _decode(fields) -> dict:
+    row = json.loads(fields.get(b"row") or fields.get("row"))
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return row
+
+
+def _drop_exhausted(entries: List[tuple]) -> List[tuple]:
+    """Dead-letter reclaimed entries past the delivery limit; return the rest."""
+    pipe = redis_client.pipeline(transaction=False)
+    for entry_id, _ in entries:
+        pipe.xpending_range(STREAM_KEY, GROUP, min=entry_id, max=entry_id, count=1)
+    keep, exhausted = [], []
+    for entry, pending in zip(entries, pipe.execute()):
+        deliveries = pending[0]["times_delivered"] if pending else 0
+        (exhausted if deliveries > Config.MESSAGE_WRITE_BEHIND_MAX_DELIVERIES else keep).append(entry)
+    for entry_id, fields in exhausted:
+        _dead_letter(entry_id, fields, "max deliveries exceeded")
+    return keep
+
+
+def _dead_letter(entry_id, fields, error: str) -> None:
+    logging.error("Dead-lettering queued message %s: %s", entry_id, error)
+    pipe = redis_client.pipeline(transaction=True)
+    if fields:
+        pipe.xadd(DEAD_LETTER_KEY, {"row": fields.get(b"row") or fields.get("row") or b"", "error": error,
+                                    "entry_id": entry_id}, maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+    pipe.xack(STREAM_KEY, GROUP, entry_id)
+    pipe.xdel(STREAM_KEY, entry_id)
+    pipe.execute()
+
+
+def _insert(rows: List[dict]) -> None:
+    insert = _INSERTS.get(db.engine.dialect.name)
+    if insert is None:
+        raise NotImplementedError(f"write-behind needs Postgres or SQLite, not {db.engine.dialect.name}")
+    db.session.execute(insert(Message.__table__).values(rows).on_conflict_do_nothing(index_elements=["dedupe_key"]))
+    db.session.commit()
+
+
+def _flush(entries: List[tuple]) -> int:
+    done, rows = [], []  # done: entry ids to acknowledge
+    for entry_id, fields in entries:
+        if not fields:  # entry deleted while pending
+            done.append(entry_id)
+            continue
+        try:
+            rows.append((entry_id, fields, _decode(fields)))
+        except (ValueError, TypeError, KeyError) as exc:
+            _dead_letter(entry_id, fields, f"undecodable: {exc}")
+
+    try:
+        if rows:
+            _insert([row for _, _, row in rows])
+        done.extend(entry_id for entry_id, _, _ in rows)
+        written = len(rows)
+    except _BATCH_ERRORS:
+        db.session.rollback()
+        raise  # entries stay pending and are reclaimed on a later run
+    except Exception:
+        db.session.rollback()
+        logging.warning("Batch insert of %d queued messages failed; retrying one by one", len(rows), exc_info=True)
+        written = 0
+        for entry_id, fields, row in rows:
+            try:
+                _insert([row])
+            except _BATCH_ERRORS:
+                db.session.rollback()
+                raise
+            except Exception as exc:
+                db.session.rollback()
+                _dead_letter(entry_id, fields, repr(exc))
+                continue
+            done.append(entry_id)
+            written += 1
+
+    if done:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.xack(STREAM_KEY, GROUP, *done)
+        pipe.xdel(STREAM_KEY, *done)
+        pipe.execute()
+    return written
+
+
+def _ensure_group() -> None:
+    try:
+        redis_client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
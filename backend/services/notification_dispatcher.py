@@ -0,0 +1,271 @@
+"""
+Batched notification dispatch (SMS via Twilio, email via SendGrid).
+
+- enqueue_sms()/enqueue_email() cost a few Redis commands; sending happens in
+  tasks.celery_tasks.flush_notifications_task.
+- Two priorities with separate Celery queues: "transactional" (OTPs, ticket
+  updates; NOTIFY_TRANSACTIONAL_WINDOW_SEC) and "bulk" (incident broadcasts;
+  NOTIFY_BULK_WINDOW_SEC), so a broadcast never delays a transactional message.
+- Dedupe: the same body to the same recipient within NOTIFY_DEDUPE_TTL_SEC is dropped.
+- Coalescing: messages queued for one recipient within a window are merged into
+  one SMS (split at NOTIFY_SMS_MAX_CHARS) or one email.
+- Identical emails to many recipients go out as one SendGrid request with one
+  personalization per recipient; SMS fan out on a bounded pool (Twilio has no bulk send).
+- Failed sends are retried with exponential backoff and jitter via a delayed zset;
+  4xx rejections (other than 429) are dropped. A bulk email that fails part-way
+  retries only the recipients of its failed requests.
+- No loss on worker crash: one flush per (channel, priority) at a time (Redis
+  lock). Each batch is moved atomically (Lua) into a processing list, which is
+  deleted only once every item is sent, deferred or dropped. The next flush
+  resends a batch left behind by a dead worker (at-least-once).
+"""
+
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import redis
+import requests
+from config import Config
+from extensions import redis_client
+from services import notifications
+
+TRANSACTIONAL, BULK = "transactional", "bulk"
+PRIORITIES = (TRANSACTIONAL, BULK)
+CHANNELS = ("sms", "email")
+
+QUEUE_PREFIX = "notify:queue"      # list per (channel, priority)
+DELAYED_PREFIX = "notify:delayed"  # zset per (channel, priority), score = retry due time
+WINDOW_PREFIX = "notify:window"    # one scheduled flush per (channel, priority) window
+DEDUPE_PREFIX = "notify:dedupe"
+PROCESSING_PREFIX = "notify:processing"  # list per (channel, priority): the batch being sent
+LOCK_PREFIX = "notify:flush:lock"
+
+# KEYS[1] = queue, KEYS[2] = processing list, KEYS[3] = delayed zset; ARGV = max items, now.
+# Due retries first, then queued items; the whole batch lands in the processing list.
+CLAIM_LUA = """
+local batch = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[2], 'LIMIT', 0, ARGV[1])
+if #batch > 0 then
+  redis.call('ZREM', KEYS[3], unpack(batch))
+end
+local queued = redis.call('LRANGE', KEYS[1], 0, ARGV[1] - 1)
+if #queued > 0 then
+  redis.call('LTRIM', KEYS[1], #queued, -1)
+end
+for _, item in ipairs(queued) do
+  batch[#batch + 1] = item
+end
+if #batch > 0 then
+  redis.call('RPUSH', KEYS[2], unpack(batch))
+end
+return batch
+"""
+
+_claim_script = None
+
+_sms_pool = ThreadPoolExecutor(max_workers=Config.NOTIFY_SMS_CONCURRENCY, thread_name_prefix="sms")
+
+
+def enqueue_sms(to_number: str, body: str, priority: str = TRANSACTIONAL) -> bool:
+    """Queue an SMS. Returns False when it was dropped as a duplicate."""
+    return _enqueue("sms", priority, {"to": to_number, "body": body})
+
+
+def enqueue_email(to_email: str, subject: str, html_body: str, priority: str = TRANSACTIONAL) -> bool:
+    """Queue an email. Returns False when it was dropped as a duplicate."""
+    return _enqueue("email", priority, {"to": to_email, "subject": subject, "body": html_body})
+
+
+def queue_name(priority: str) -> str:
+    return Config.NOTIFY_QUEUE_BULK if priority == BULK else Config.NOTIFY_QUEUE_TRANSACTIONAL
+
+
+def _window(priority: str) -> int:
+    return Config.NOTIFY_BULK_WINDOW_SEC if priority == BULK else Config.NOTIFY_TRANSACTIONAL_WINDOW_SEC
+
+
+def _digest(channel: str, item: dict) -> str:
+    raw = "\x1f".join([channel, item["to"], item.get("subject", ""), item["body"]])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _enqueue(channel: str, priority: str, item: dict) -> bool:
+    if priority not in PRIORITIES:
+        raise ValueError(f"unknown priority {priority!r}")
+    item = {**item, "attempt": 0}
+    try:
+        if not redis_client.set(f"{DEDUPE_PREFIX}:{_digest(channel, item)}", 1, nx=True,
+                                ex=Config.NOTIFY_DEDUPE_TTL_SEC):
+            return False
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.rpush(f"{QUEUE_PREFIX}:{channel}:{priority}", json.dumps(item))
+        pipe.set(f"{WINDOW_PREFIX}:{channel}:{priority}", 1, nx=True, ex=max(_window(priority), 1))
+        _, first_in_window = pipe.execute()
+    except redis.RedisError:
+        logging.warning("Notification queue unavailable; sending %s inline", channel, exc_info=True)
+        _send(channel, [item])
+        return True
+    if first_in_window:
+        schedule_flush(channel, priority, countdown=_window(priority))
+    return True
+
+
+def schedule_flush(channel: str, priority: str, countdown: float = 0) -> None:
+    from tasks.celery_tasks import flush_notifications_task  # avoid import cycle at module load
+    flush_notifications_task.apply_async((channel, priority), countdown=countdown, queue=queue_name(priority))
+
+
+def flush(channel: str, priority: str) -> dict:
+    """Drain the (channel, priority) queue plus due retries; returns counters for this run."""
+    global _claim_script
+    if _claim_script is None:
+        _claim_script = redis_client.register_script(CLAIM_LUA)
+    stats = {"queued": 0, "sent": 0, "requests": 0, "coalesced": 0, "deferred": 0, "dropped": 0}
+    queue_key = f"{QUEUE_PREFIX}:{channel}:{priority}"
+    delayed_key = f"{DELAYED_PREFIX}:{channel}:{priority}"
+    processing_key = f"{PROCESSING_PREFIX}:{channel}:{priority}"
+    lock = redis_client.lock(f"{LOCK_PREFIX}:{channel}:{priority}", timeout=Config.NOTIFY_FLUSH_LOCK_SEC)
+    if not lock.acquire(blocking=False):
+        return stats  # another worker is draining this queue; it re-checks the queue before it exits
+
+    def send_batch(raws):
+        items = [json.loads(raw) for raw in raws]
+        stats["queued"] += len(items)
+        for key, value in _send(channel, items, delayed_key).items():
+            stats[key] += value
+        redis_client.delete(processing_key)  # every item is now sent, deferred or dropped
+        lock.extend(Config.NOTIFY_FLUSH_LOCK_SEC, replace_ttl=True)
+
+    try:
+        leftover = redis_client.lrange(processing_key, 0, -1)  # batch of a flush that died mid-send
+        if leftover:
+            logging.warning("Resending %d %s notifications left by an interrupted flush", len(leftover), channel)
+            send_batch(leftover)
+        while True:
+            raws = _claim_script(keys=[queue_key, processing_key, delayed_key],
+                                 args=[Config.NOTIFY_BATCH_MAX, time.time()])
+            if not raws:
+                break
+            send_batch(raws)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+    if redis_client.llen(queue_key):  # queued while another flush call saw the lock held
+        schedule_flush(channel, priority)
+    next_due = redis_client.zrange(delayed_key, 0, 0, withscores=True)
+    if next_due:
+        schedule_flush(channel, priority, countdown=max(0.0, next_due[0][1] - time.time()))
+    return stats
+
+
+def _send(channel: str, items: List[dict], delayed_key: str = None) -> Dict[str, int]:
+    if channel == "sms":
+        messages = _coalesce_sms(items)
+        results = list(_sms_pool.map(lambda m: _attempt(notifications.send_sms, m[0], m[1]), messages))
+        requests_made = len(messages)
+        outcomes = [(sources, outcome) for (_, _, sources), outcome in zip(messages, results)]
+    else:
+        outcomes, requests_made = [], 0
+        for (subject, body), recipients in _coalesce_email(items).items():
+            sources_by_to = dict(recipients)
+            # Per-request results: recipients of chunks that went out are never sent again
+            for chunk in notifications.send_email_bulk(list(sources_by_to), subject, body):
+                requests_made += 1
+                outcome = "ok" if chunk["ok"] else _failure_outcome(chunk["status_code"], chunk["error"])
+                outcomes.extend((sources_by_to[to], outcome) for to in chunk["to"])
+    stats = {"sent": 0, "requests": requests_made, "coalesced": len(items) - len(outcomes), "deferred": 0,
+             "dropped": 0}
+    for sources, outcome in outcomes:
+        if outcome == "ok":
+            stats["sent"] += len(sources)
+            continue
+        deferred = _defer(delayed_key, sources) if outcome == "retry" and delayed_key else 0
+        stats["deferred"] += deferred
+        stats["dropped"] += len(sources) - deferred
+    return stats
+
+
+def _attempt(fn, *args) -> str:
+    """'ok', 'retry' (transient failure) or 'drop' (rejected by the vendor)."""
+    try:
+        fn(*args)
+        return "ok"
+    except requests.HTTPError as exc:
+        return _failure_outcome(exc.response.status_code if exc.response is not None else None)
+    except Exception:
+        logging.warning("Notification send failed; will retry", exc_info=True)
+        return "retry"
+
+
+def _failure_outcome(status, error: str = None) -> str:
+    if status is not None and 400 <= status < 500 and status not in (408, 429):
+        logging.error("Notification rejected by vendor (%s); dropping", status)
+        return "drop"
+    logging.warning("Notification send failed (%s); will retry%s", status, f": {error}" if error else "")
+    return "retry"
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with equal jitter: half the step is fixed, half random."""
+    step = min(Config.NOTIFY_BACKOFF_MAX_SEC, Config.NOTIFY_BACKOFF_BASE_SEC * (2 ** attempt))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _defer(delayed_key: str, sources: List[dict]) -> int:
+    deferred = {}
+    for item in sources:
+        attempt = item["attempt"] + 1
+        if attempt >= Config.NOTIFY_MAX_ATTEMPTS:
+            logging.error("Notification to %s dropped after %d attempts", item["to"], attempt)
+            continue
+        deferred[json.dumps({**item, "attempt": attempt})] = time.time() + backoff_delay(attempt)
+    if deferred:
+        redis_client.zadd(delayed_key, deferred)
+    return len(deferred)
+
+
+def _coalesce_sms(items: List[dict]) -> List[Tuple[str, str, List[dict]]]:
+    """[(to, body, source items)]: one message per recipient, identical bodies once, split at the SMS size cap."""
+    by_recipient = OrderedDict()
+    for item in items:
+        by_recipient.setdefault(item["to"], []).append(item)
+    messages = []
+    for to, group in by_recipient.items():
+        bodies = OrderedDict()
+        for item in group:
+            bodies.setdefault(item["body"], []).append(item)
+        text, sources = "", []
+        for body, src in bodies.items():
+            candidate = f"{text}\n\n{body}" if text else body
+            if text and len(candidate) > Config.NOTIFY_SMS_MAX_CHARS:
+                messages.append((to, text, sources))
+                candidate, sources = body, []
+            text = candidate
+            sources = sources + src
+        messages.append((to, text, sources))
+    return messages
+
+
+def _coalesce_email(items: List[dict]) -> Dict[Tuple[str, str], List[Tuple[str, List[dict]]]]:
+    """{(subject, body): [(recipient, source items)]}: one email per recipient, grouped for bulk sends."""
+    by_recipient = OrderedDict()
+    for item in items:
+        by_recipient.setdefault(item["to"], OrderedDict()).setdefault((item["subject"], item["body"]), []).append(item)
+    grouped = OrderedDict()
+    for to, messages in by_recipient.items():
+        keys = list(messages)
+        if len(keys) == 1:
+            subject, body = keys[0]
+        else:
+            subject = keys[0][0] if len({s for s, _ in keys}) == 1 else f"{keys[0][0]} (+{len(keys) - 1} more)"
+            body = "<hr>".join(b for _, b in keys)
+        grouped.setdefault((subject, body), []).append((to, [item for src in messages.values() for item in src]))
+    return grouped
@@ -2,34 +2,63 @@
 Notification wrappers:
 - send_sms -> Twilio
 - send_email -> SendGrid
+- send_email_bulk -> SendGrid, one request for many recipients (personalizations)
 
 Design:
 - Keep these functions fast; use Celery to send in background to avoid blocking LLM flow.
-- Add retry/backoff and error logging.
+- Add retry/backoff and error logging (see services.notification_dispatcher).
+- Both vendors are called over the REST APIs on the shared keep-alive session for
+  their host (extensions.http_request); base URLs are configurable so the
+  throughput benchmark can point them at local stand-in servers.
 """
 
+from typing import List
+
+import requests
 from config import Config
-from twilio.rest import Client as TwilioClient
-from sendgrid import SendGridAPIClient
+from extensions import http_request
 from sendgrid.helpers.mail import Mail
 
-_twilio_client = None
-_sendgrid_client = None
-
-def init_clients():
-    global _twilio_client, _sendgrid_client
-    if not _twilio_client and Config.TWILIO_ACCOUNT_SID:
-        _twilio_client = TwilioClient(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
-    if not _sendgrid_client and Config.SENDGRID_API_KEY:
-        _sendgrid_client = SendGridAPIClient(Config.SENDGRID_API_KEY)
+SENDGRID_MAX_PERSONALIZATIONS = 1000  # per mail/send request
 
 def send_sms(to_number: str, body: str) -> dict:
-    init_clients()
-    msg = _twilio_client.messages.create(body=body, from_=Config.TWILIO_FROM_NUMBER, to=to_number)
-    return {"sid": msg.sid, "status": msg.status}
+    url = f"{Config.TWILIO_API_URL}/2010-04-01/Accounts/{Config.TWILIO_ACCOUNT_SID}/Messages.json"
+    resp = http_request("POST", url, data={"To": to_number, "From": Config.TWILIO_FROM_NUMBER, "Body": body},
+                        auth=(Config.TWILIO_ACCOUNT_SID or "", Config.TWILIO_AUTH_TOKEN or ""))
+    resp.raise_for_status()
+    msg = resp.json()
+    return {"sid": msg.get("sid"), "status": msg.get("status")}
 
 def send_email(to_email: str, subject: str, html_body: str) -> dict:
-    init_clients()
     mail = Mail(from_email=Config.SENDGRID_FROM_EMAIL, to_emails=to_email, subject=subject, html_content=html_body)
-    resp = _sendgrid_client.send(mail)
+    return _post_mail(mail.get())
+
+def send_email_bulk(to_emails: List[str], subject: str, html_body: str) -> List[dict]:
+    """
+    Same message to many recipients; each recipient gets a private personalization (no shared To: list).
+    Never raises: returns one {"to": [emails], "ok", "status_code", "error"} per request, so the caller
+    retries only the recipients of failed chunks.
+    """
+    results = []
+    for i in range(0, len(to_emails), SENDGRID_MAX_PERSONALIZATIONS):
+        chunk = to_emails[i:i + SENDGRID_MAX_PERSONALIZATIONS]
+        payload = {
+            "personalizations": [{"to": [{"email": email}]} for email in chunk],
+            "from": {"email": Config.SENDGRID_FROM_EMAIL},
+            "subject": subject,
+            "content": [{"type": "text/html", "value": html_body}],
+        }
+        try:
+            results.append({"to": chunk, "ok": True, **_post_mail(payload), "error": None})
+        except requests.HTTPError as exc:
+            status = exc.response.status_code if exc.response is not None else None
+            results.append({"to": chunk, "ok": False, "status_code": status, "error": str(exc)})
+        except Exception as exc:
+            results.append({"to": chunk, "ok": False, "status_code": None, "error": str(exc)})
+    return results
+
+def _post_mail(payload: dict) -> dict:
+    resp = http_request("POST", f"{Config.SENDGRID_API_URL}/v3/mail/send", json=payload,
+                        headers={"Authorization": f"Bearer {Config.SENDGRID_API_KEY}"})
+    resp.raise_for_status()
     return {"status_code": resp.status_code}
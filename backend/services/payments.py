@@ -7,18 +7,87 @@ Payment wrapper (Stripe).
 Security:
 - Validate webhook signature using STRIPE_WEBHOOK_SECRET
 - Use idempotency keys for safe retries
+
+Idempotency:
+- A client idempotency key is forwarded to Stripe and the created intent is cached
+  in Redis (STRIPE_IDEMPOTENCY_TTL_SEC), so a client retry returns the same intent
+  without another Stripe round trip. Reusing a key with different parameters raises
+  IdempotencyConflict. Concurrent retries in one worker share a single call.
 """
 
+import hashlib
+import json
+import logging
 import os
+
+import redis
 import stripe
 from config import Config
+from extensions import http_session, provider_client, redis_client
+from utils.cache import SingleFlight
 
 stripe.api_key = Config.STRIPE_API_KEY
+STRIPE_API_URL = "https://api.stripe.com"
+IDEMPOTENCY_PREFIX = "stripe:idem"
+
+_inflight = SingleFlight()
+
+
+class IdempotencyConflict(ValueError):
+    """The idempotency key was already used with different request parameters."""
+
+def _stripe_http_client():
+    timeout = (Config.HTTP_CONNECT_TIMEOUT_SEC, Config.HTTP_READ_TIMEOUT_SEC)
+    return stripe.RequestsClient(timeout=timeout, session=http_session(STRIPE_API_URL))
+
+def _use_pooled_client():
+    # Reassigned per call: the registry rebuilds the client after fork
+    stripe.default_http_client = provider_client("stripe", _stripe_http_client)
 
-def create_payment_intent(amount_cents: int, currency: str = "inr", metadata: dict = None) -> dict:
-    pi = stripe.PaymentIntent.create(amount=amount_cents, currency=currency, metadata=metadata or {})
+def create_payment_intent(amount_cents: int, currency: str = "inr", metadata: dict = None,
+                          idempotency_key: str = None) -> dict:
+    if not idempotency_key:
+        return _create(amount_cents, currency, metadata, None)
+
+    fingerprint = hashlib.sha256(json.dumps([amount_cents, currency, metadata or {}], sort_keys=True,
+                                            default=str).encode("utf-8")).hexdigest()
+    cache_key = f"{IDEMPOTENCY_PREFIX}:{hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest()}"
+    cached = _cached_result(cache_key)
+    if cached is None:
+        cached, _ = _inflight.do(cache_key, _create_and_cache, cache_key, fingerprint, amount_cents, currency,
+                                 metadata, idempotency_key)
+    if cached["fingerprint"] != fingerprint:
+        raise IdempotencyConflict("idempotency key reused with different parameters")
+    return cached["result"]
+
+def _create(amount_cents: int, currency: str, metadata: dict, idempotency_key: str) -> dict:
+    _use_pooled_client()
+    pi = stripe.PaymentIntent.create(amount=amount_cents, currency=currency, metadata=metadata or {},
+                                     idempotency_key=idempotency_key)
     return {"id": pi.id, "client_secret": pi.client_secret, "status": pi.status}
 
+def _create_and_cache(cache_key: str, fingerprint: str, amount_cents: int, currency: str, metadata: dict,
+                      idempotency_key: str) -> dict:
+    cached = _cached_result(cache_key)  # another worker may have finished meanwhile
+    if cached is not None:
+        return cached
+    # Stripe dedupes the key server-side too, so a cache miss never creates a second intent
+    entry = {"fingerprint": fingerprint,
+             "result": _create(amount_cents, currency, metadata, idempotency_key)}
+    try:
+        redis_client.set(cache_key, json.dumps(entry), ex=Config.STRIPE_IDEMPOTENCY_TTL_SEC)
+    except redis.RedisError:
+        logging.warning("Idempotency cache write failed", exc_info=True)
+    return entry
+
+def _cached_result(cache_key: str):
+    try:
+        raw = redis_client.get(cache_key)
+    except redis.RedisError:
+        logging.warning("Idempotency cache read failed", exc_info=True)
+        return None
+    return json.loads(raw) if raw else None
+
 def handle_stripe_webhook(raw_body: bytes, signature: str):
     try:
         event = stripe.Webhook.construct_event(raw_body, signature, Config.STRIPE_WEBHOOK_SECRET)
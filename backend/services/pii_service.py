@@ -0,0 +1,99 @@
+"""
+Encrypted PII access for User rows.
+
+- Writes go through set_contact() so the Fernet ciphertext (email_enc/phone_enc)
+  and the HMAC blind index (email_bidx/phone_bidx) always agree.
+- Lookups by email/phone are indexed equality on the blind index: one B-tree
+  probe instead of decrypting every row.
+- decrypt_contacts() decrypts a page of users in one batched, parallel call
+  (utils.security.decrypt_many), optionally through the short-TTL cache.
+- rotate_batch() re-encrypts one keyset batch under the newest key (MultiFernet)
+  and backfills missing blind indexes; each batch is its own short transaction,
+  so rotation never locks the whole table. tasks.celery_tasks.rotate_pii_task
+  chains batches until the table is done, then rotate_users() retries the rows
+  that were locked during the pass.
+"""
+
+from typing import Dict, List, Optional
+
+from config import Config
+from extensions import db
+from models import User
+from utils.security import blind_index, decrypt_many, encrypt_field, rotate_field
+
+
+def set_contact(user: User, email: str = None, phone: str = None) -> User:
+    """Set encrypted email/phone and their blind indexes (caller commits)."""
+    if email is not None:
+        user.email_enc = encrypt_field(email.strip())
+        user.email_bidx = blind_index(email, "email")
+    if phone is not None:
+        user.phone_enc = encrypt_field(phone.strip())
+        user.phone_bidx = blind_index(phone, "phone")
+    return user
+
+
+def find_user_by_email(email: str) -> Optional[User]:
+    return User.query.filter(User.email_bidx == blind_index(email, "email")).first()
+
+
+def find_users_by_phone(phone: str) -> List[User]:
+    """Phones can be shared (family plans), so every match is returned, oldest first."""
+    return User.query.filter(User.phone_bidx == blind_index(phone, "phone")).order_by(User.id).all()
+
+
+def decrypt_contacts(users: List[User], use_cache: bool = True) -> List[Dict[str, Optional[str]]]:
+    """[{"id", "email", "phone"}] for a page of users, decrypted in one batch."""
+    ciphers = [c for u in users for c in (u.email_enc, u.phone_enc)]
+    plain = decrypt_many(ciphers, use_cache=use_cache)
+    return [{"id": u.id, "email": plain[2 * i], "phone": plain[2 * i + 1]} for i, u in enumerate(users)]
+
+
+def rotate_batch(after_id: int = 0, batch_size: int = None) -> dict:
+    """
+    Re-encrypt users with id > after_id (one batch) under the newest key and fill
+    missing blind indexes. Rows locked by other transactions are skipped rather
+    than waited on and returned for rotate_users(). Returns {"rotated", "skipped",
+    "next_after_id"} where next_after_id is None once the table is done.
+    """
+    batch_size = batch_size or Config.PII_ROTATE_BATCH
+    users = (
+        User.query.filter(User.id > after_id)
+        .order_by(User.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    # Ids the locking read passed over: the keyset cursor moves past them, so report them
+    window = db.select(User.id).where(User.id > after_id)
+    if len(users) == batch_size:
+        window = window.where(User.id <= users[-1].id)  # short batch: the read reached the end of the table
+    mine = {u.id for u in users}
+    skipped = sorted(uid for uid in db.session.scalars(window) if uid not in mine)
+    _rotate(users)
+    db.session.commit()
+    return {"rotated": len(users), "skipped": skipped,
+            "next_after_id": users[-1].id if len(users) == batch_size else None}
+
+
+def rotate_users(user_ids: List[int]) -> dict:
+    """Rotate specific users (those rotate_batch skipped); still-locked ids come back in "skipped"."""
+    users = User.query.filter(User.id.in_(user_ids)).order_by(User.id).with_for_update(skip_locked=True).all()
+    _rotate(users)
+    db.session.commit()
+    rotated = {u.id for u in users}
+    existing = set(db.session.scalars(db.select(User.id).where(User.id.in_(user_ids))))  # deleted users are done
+    return {"rotated": len(users), "skipped": sorted(existing - rotated)}
+
+
+def _rotate(users: List[User]) -> None:
+    missing = [u for u in users if (u.email_enc and u.email_bidx is None) or (u.phone_enc and u.phone_bidx is None)]
+    if missing:
+        for u, contact in zip(missing, decrypt_contacts(missing, use_cache=False)):
+            if contact["email"] and u.email_bidx is None:
+                u.email_bidx = blind_index(contact["email"], "email")
+            if contact["phone"] and u.phone_bidx is None:
+                u.phone_bidx = blind_index(contact["phone"], "phone")
+    for u in users:
+        u.email_enc = rotate_field(u.email_enc)
+        u.phone_enc = rotate_field(u.phone_enc)
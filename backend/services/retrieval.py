@@ -0,0 +1,381 @@
+"""
+In-process vector retrieval over KnowledgeDocument (RAG without pgvector).
+
+Layout in RETRIEVAL_INDEX_DIR:
+- vectors.bin   row-major float32/float16 matrix of L2-normalized chunk embeddings,
+                memory-mapped read-only so every Gunicorn worker shares the same pages
+- rows.jsonl    one {"doc_id", "chunk", "text"} line per matrix row (append-only)
+- state.json    {"dim", "dtype", "count", "deleted": [row, ...], "version", "generation"}
+- ivf.npz       optional IVF index: centroids + per-row list assignment
+
+compact() writes vectors.<generation>.bin / rows.<generation>.jsonl under a new
+generation and publishes it by swapping state.json, so a reader always maps a
+matching pair. The previous generation is kept for readers still opening it.
+
+- Adds append rows; deletes tombstone rows; compact() rewrites once tombstones pile up.
+- Exact search is a blocked NumPy mat-vec; IVF search probes the nearest
+  RETRIEVAL_IVF_NPROBE lists only (for large corpora).
+- Query embeddings are cached per worker, keyed by normalized query text. On the
+  request path the embedding call gets RETRIEVAL_EMBED_TIMEOUT_MS, capped by what
+  is left of the turn's deadline; if that runs out the turn goes on without
+  knowledge instead of pushing the LLM call past the SLA.
+- Writes happen in Celery (one writer at a time via a Redis lock); readers reload
+  when state.json's version changes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import openai
+import redis
+
+from config import Config
+from extensions import redis_client
+from utils.cache import LRUCache
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+WRITE_LOCK_KEY = "retrieval:write-lock"
+BLOCK_ROWS = 65536
+
+_query_cache = LRUCache(maxsize=Config.RETRIEVAL_QUERY_CACHE_MAX, ttl=Config.RETRIEVAL_QUERY_CACHE_TTL_SEC)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?।])\s+")
+
+
+# --- embedding -----------------------------------------------------------------
+
+def embed_texts(texts: List[str], timeout: float = None) -> np.ndarray:
+    """Embed texts with the provider and return an (n, dim) float32 L2-normalized matrix."""
+    resp = openai.Embedding.create(model=EMBEDDING_MODEL, input=texts,
+                                   request_timeout=timeout or Config.LLM_REQUEST_TIMEOUT_SEC)
+    vectors = np.asarray([item["embedding"] for item in sorted(resp["data"], key=lambda d: d["index"])],
+                         dtype=np.float32)
+    return _normalize(vectors)
+
+
+def embed_query(text: str, timeout: float = None) -> np.ndarray:
+    key = hashlib.sha1(" ".join(text.casefold().split()).encode("utf-8")).hexdigest()
+    vector = _query_cache.get(key)
+    if vector is None:
+        vector = embed_texts([text], timeout)[0]
+        _query_cache.set(key, vector)
+    return vector
+
+
+def chunk_text(text: str, max_chars: int = None, overlap: int = None) -> List[str]:
+    """Sentence-aware chunks of about max_chars with a small character overlap."""
+    max_chars = max_chars or Config.RETRIEVAL_CHUNK_CHARS
+    overlap = Config.RETRIEVAL_CHUNK_OVERLAP if overlap is None else overlap
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        while len(sentence) > max_chars:  # hard-wrap very long sentences
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars - overlap:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- store -----------------------------------------------------------------------
+
+class VectorStore:
+    """Memory-mapped embedding matrix plus row metadata in one directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.dim = 0
+        self.dtype = np.dtype(Config.RETRIEVAL_DTYPE)
+        self.matrix = None
+        self.rows = []
+        self.live = None
+        self.ivf = None
+
+    # paths
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_state(self) -> Optional[dict]:
+        try:
+            with open(self._file("state.json")) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def _data_files(self, generation: int) -> Tuple[str, str]:
+        """(vectors, rows) paths of a generation; generation 0 keeps the original names."""
+        suffix = f".{generation}" if generation else ""
+        return self._file(f"vectors{suffix}.bin"), self._file(f"rows{suffix}.jsonl")
+
+    def _write_state(self, state: dict):
+        tmp = self._file("state.json.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp, self._file("state.json"))  # atomic publish for readers
+
+    def refresh(self, force: bool = False):
+        """(Re)map the files if a writer published a new version (checked at most every RETRIEVAL_REFRESH_SEC)."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < Config.RETRIEVAL_REFRESH_SEC:
+            return
+        self._checked_at = now
+        state = self._read_state()
+        if state is None or state["version"] == self._version:
+            return
+        with self._lock:
+            if state["version"] == self._version:
+                return
+            count, dim = state["count"], state["dim"]
+            dtype = np.dtype(state["dtype"])
+            vectors_path, rows_path = self._data_files(state.get("generation", 0))
+            matrix = np.memmap(vectors_path, dtype=dtype, mode="r", shape=(count, dim)) if count else None
+            with open(rows_path, encoding="utf-8") as fh:
+                rows = [json.loads(line) for _, line in zip(range(count), fh)]
+            live = np.ones(count, dtype=bool)
+            if state["deleted"]:
+                live[np.asarray(state["deleted"], dtype=np.int64)] = False
+            ivf = None
+            if state.get("ivf") and os.path.exists(self._file("ivf.npz")):
+                data = np.load(self._file("ivf.npz"))
+                assign = data["assign"]
+                if len(assign) < count:  # rows appended after the IVF build: assign to nearest centroid
+                    extra = np.asarray(matrix[len(assign):], dtype=np.float32) @ data["centroids"].T
+                    assign = np.concatenate([assign, extra.argmax(axis=1).astype(assign.dtype)])
+                # Inverted lists: rows grouped by list id, offsets[l]:offsets[l+1] are list l's rows
+                order = np.argsort(assign, kind="stable")
+                offsets = np.searchsorted(assign[order], np.arange(len(data["centroids"]) + 1))
+                ivf = {"centroids": data["centroids"], "order": order, "offsets": offsets}
+            self.dim, self.dtype, self.matrix, self.rows, self.live, self.ivf = dim, dtype, matrix, rows, live, ivf
+            self._version = state["version"]
+
+    def __len__(self):
+        self.refresh()
+        return int(self.live.sum()) if self.live is not None else 0
+
+    # queries
+    def search(self, query: np.ndarray, k: int = 5, use_ivf: bool = None) -> List[Tuple[float, dict]]:
+        """Top-k (score, row) by cosine similarity; rows are the rows.jsonl dicts."""
+        self.refresh()
+        if self.matrix is None:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        use_ivf = (self.ivf is not None) if use_ivf is None else (use_ivf and self.ivf is not None)
+        if use_ivf:
+            candidates = self._ivf_candidates(query)
+            scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+        else:
+            candidates = None
+            scores = self._scan(query)
+        mask = self.live if candidates is None else self.live[candidates]
+        scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        idx = top if candidates is None else candidates[top]
+        return [(float(scores[t]), self.rows[i]) for t, i in zip(top, idx)]
+
+    def _scan(self, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return np.asarray(self.matrix @ query)
+        # float16 has no BLAS path: upcast block by block to bound memory
+        out = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ query
+        return out
+
+    def _ivf_candidates(self, query: np.ndarray) -> np.ndarray:
+        centroid_scores = self.ivf["centroids"] @ query
+        nprobe = min(Config.RETRIEVAL_IVF_NPROBE, len(centroid_scores))
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        order, offsets = self.ivf["order"], self.ivf["offsets"]
+        return np.sort(np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists]))
+
+    # writes (call under acquire_write_lock)
+    def add(self, doc_id: int, chunks: List[str], vectors: np.ndarray):
+        os.makedirs(self.path, exist_ok=True)
+        state = self._read_state() or {"dim": vectors.shape[1], "dtype": self.dtype.name, "count": 0,
+                                       "deleted": [], "version": 0}
+        if vectors.shape[1] != state["dim"]:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} != index dim {state['dim']}")
+        vectors_path, rows_path = self._data_files(state.get("generation", 0))
+        with open(vectors_path, "ab") as fh:
+            fh.write(np.ascontiguousarray(vectors, dtype=np.dtype(state["dtype"])).tobytes())
+        with open(rows_path, "a", encoding="utf-8") as fh:
+            for n, text in enumerate(chunks):
+                fh.write(json.dumps({"doc_id": doc_id, "chunk": n, "text": text}, ensure_ascii=False) + "\n")
+        state["count"] += len(chunks)
+        state["version"] += 1
+        self._write_state(state)
+
+    def delete(self, doc_id: int) -> int:
+        state = self._read_state()
+        if state is None:
+            return 0
+        self.refresh(force=True)
+        dead = set(state["deleted"])
+        rows = [i for i, row in enumerate(self.rows) if row["doc_id"] == doc_id and i not in dead]
+        if rows:
+            state["deleted"] = sorted(dead.union(rows))
+            state["version"] += 1
+            self._write_state(state)
+        return len(rows)
+
+    def compact(self):
+        """Rewrite without tombstoned rows (drops the IVF index; rebuild it afterwards)."""
+        self.refresh(force=True)
+        state = self._read_state()
+        if state is None or not state["deleted"]:
+            return
+        keep = np.flatnonzero(self.live)
+        generation = state.get("generation", 0) + 1
+        vectors_path, rows_path = self._data_files(generation)
+        with open(vectors_path, "wb") as fh:
+            for start in range(0, len(keep), BLOCK_ROWS):
+                fh.write(np.ascontiguousarray(self.matrix[keep[start:start + BLOCK_ROWS]]).tobytes())
+        with open(rows_path, "w", encoding="utf-8") as fh:
+            for i in keep:
+                fh.write(json.dumps(self.rows[i], ensure_ascii=False) + "\n")
+        state.update({"count": int(len(keep)), "deleted": [], "ivf": False, "version": state["version"] + 1,
+                      "generation": generation})
+        self._write_state(state)  # the only publish step
+        if generation >= 2:
+            for stale in self._data_files(generation - 2):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def build_ivf(self, nlist: int = None, iterations: int = 10, seed: int = 0):
+        """Spherical k-means over the rows; stores centroids and row -> list assignment."""
+        self.refresh(force=True)
+        if self.matrix is None:
+            return
+        nlist = nlist or Config.RETRIEVAL_IVF_NLIST
+        rng = np.random.default_rng(seed)
+        data = np.asarray(self.matrix, dtype=np.float32)
+        sample = data[rng.choice(len(data), size=min(len(data), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            labels = (sample @ centroids.T).argmax(axis=1)
+            for c in range(len(centroids)):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.empty(len(data), dtype=np.int32)
+        for start in range(0, len(data), BLOCK_ROWS):
+            assign[start:start + BLOCK_ROWS] = (data[start:start + BLOCK_ROWS] @ centroids.T).argmax(axis=1)
+        np.savez(self._file("ivf.tmp.npz"), centroids=centroids, assign=assign)
+        os.replace(self._file("ivf.tmp.npz"), self._file("ivf.npz"))
+        state = self._read_state()
+        state.update({"ivf": True, "version": state["version"] + 1})
+        self._write_state(state)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> VectorStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VectorStore(Config.RETRIEVAL_INDEX_DIR)
+        return _store
+
+
+# --- service API ------------------------------------------------------------------
+
+def search_snippets(query: str, deadline: float = None, k: int = None) -> List[str]:
+    """
+    Knowledge snippets for call_llm(knowledge=...). Empty (and no provider call) if
+    the index is empty. deadline is the turn's time.monotonic() cutoff; an
+    uncached query embedding must finish within RETRIEVAL_EMBED_TIMEOUT_MS and
+    before it, or the turn gets no snippets.
+    """
+    if not Config.RETRIEVAL_ENABLED:
+        return []
+    timeout = Config.RETRIEVAL_EMBED_TIMEOUT_MS / 1000
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+    if timeout <= 0:
+        return []
+    try:
+        store = get_store()
+        if len(store) == 0:  # also (re)maps the index; a load error falls back like any other
+            return []
+        hits = store.search(embed_query(query, timeout), k or Config.RETRIEVAL_TOP_K)
+    except openai.error.Timeout:
+        logging.warning("Query embedding exceeded %.0f ms; answering without knowledge.", timeout * 1000)
+        return []
+    except Exception:
+        logging.exception("Knowledge retrieval failed; answering without it.")
+        return []
+    return [row["text"] for score, row in hits if score >= Config.RETRIEVAL_MIN_SCORE]
+
+
+def index_document(doc_id: int, content: str) -> int:
+    """(Re)index one document: tombstone its old chunks and append fresh ones."""
+    chunks = chunk_text(content)
+    vectors = embed_texts(chunks) if chunks else None
+    store = get_store()
+    with _write_lock():
+        store.delete(doc_id)
+        if chunks:
+            store.add(doc_id, chunks, vectors)
+    return len(chunks)
+
+
+def remove_document(doc_id: int) -> int:
+    with _write_lock():
+        removed = get_store().delete(doc_id)
+    return removed
+
+
+def maintain(min_rows_for_ivf: int = None) -> dict:
+    """Compact when tombstones exceed 20% and (re)build IVF for large corpora."""
+    store = get_store()
+    with _write_lock():
+        state = store._read_state() or {}
+        count, deleted = state.get("count", 0), len(state.get("deleted", []))
+        if count and deleted / count > 0.2:
+            store.compact()
+        if count - deleted >= (min_rows_for_ivf or Config.RETRIEVAL_IVF_MIN_ROWS):
+            store.build_ivf()
+    return {"rows": count - deleted}
+
+
+class _write_lock:
+    """Cluster-wide single writer for the index directory."""
+
+    def __enter__(self):
+        self._lock = redis_client.lock(WRITE_LOCK_KEY, timeout=600, blocking_timeout=600)
+        if not self._lock.acquire():
+            raise RuntimeError("Could not acquire retrieval index write lock")
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._lock.release()
+        except redis.RedisError:
+            logging.warning("Retrieval write lock release failed", exc_info=True)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,73 @@
+"""
+Sentiment lexicons for services.sentiment_service.
+
+Weights are in [-3, 3]. Entries are lower-case; romanized lists cover the common
+spellings customers actually type (e.g. "nahi"/"nahin", "romba"/"rombo").
+Keep additions small and domain-focused (telecom/billing/support vocabulary).
+"""
+
+EN = {
+    "good": 2, "great": 3, "excellent": 3, "awesome": 3, "amazing": 3, "nice": 2, "happy": 2, "glad": 2,
+    "thanks": 2, "thank": 2, "thx": 1, "helpful": 2, "resolved": 2, "fixed": 2, "working": 1, "works": 1,
+    "fast": 1, "quick": 1, "perfect": 3, "love": 3, "appreciate": 2, "satisfied": 2, "smooth": 1, "easy": 1,
+    "fine": 1, "ok": 0.5, "okay": 0.5, "best": 3, "wonderful": 3, "superb": 3, "polite": 2, "kind": 2,
+    "bad": -2, "worst": -3, "terrible": -3, "horrible": -3, "awful": -3, "poor": -2, "slow": -2,
+    "down": -1, "broken": -2, "useless": -3, "angry": -3, "frustrated": -3, "frustrating": -3,
+    "annoyed": -2, "annoying": -2, "disappointed": -2, "disappointing": -2, "unhappy": -2, "hate": -3,
+    "fraud": -3, "scam": -3, "cheated": -3, "refund": -0.5, "complaint": -2, "complain": -2,
+    "problem": -1, "issue": -1, "error": -1, "failed": -2, "fail": -2, "failure": -2, "cancel": -1,
+    "waste": -2, "wasted": -2, "rude": -3, "delay": -1, "delayed": -2, "late": -1, "overcharged": -3,
+    "charged": -1, "lost": -2, "pathetic": -3, "ridiculous": -2, "unacceptable": -3, "stuck": -2,
+    "disconnected": -2, "outage": -2, "nobody": -1, "worse": -2, "escalate": -1,
+}
+
+HI = {  # Devanagari Hindi
+    "अच्छा": 2, "अच्छी": 2, "अच्छे": 2, "बढ़िया": 3, "शानदार": 3, "धन्यवाद": 2, "शुक्रिया": 2,
+    "खुश": 2, "ठीक": 1, "सही": 1, "बेहतरीन": 3, "मदद": 1, "जल्दी": 1, "हल": 1,
+    "बुरा": -2, "बुरी": -2, "खराब": -2, "बेकार": -3, "गुस्सा": -3, "परेशान": -2, "परेशानी": -2,
+    "धोखा": -3, "शिकायत": -2, "समस्या": -1, "दिक्कत": -1, "नाराज": -2, "घटिया": -3, "बंद": -1,
+    "धीमा": -2, "देर": -1, "बकवास": -3, "लूट": -3,
+}
+
+HINGLISH = {  # romanized Hindi
+    "accha": 2, "acha": 2, "achha": 2, "achhi": 2, "acchi": 2, "badhiya": 3, "badiya": 3,
+    "shukriya": 2, "dhanyavad": 2, "dhanyawad": 2, "khush": 2, "theek": 1, "thik": 1, "sahi": 1,
+    "mast": 2, "zabardast": 3, "jaldi": 1, "madad": 1,
+    "bura": -2, "buri": -2, "kharab": -2, "kharaab": -2, "bekar": -3, "bekaar": -3, "gussa": -3,
+    "pareshan": -2, "pareshani": -2, "dhokha": -3, "shikayat": -2, "samasya": -1, "dikkat": -1,
+    "naraz": -2, "naraaz": -2, "ghatiya": -3, "bakwas": -3, "bakwaas": -3, "loot": -3, "dheema": -2,
+}
+
+TA = {  # Tamil script
+    "நன்றி": 2, "நல்லது": 2, "நல்ல": 2, "சூப்பர்": 3, "அருமை": 3, "மகிழ்ச்சி": 2, "சரி": 1,
+    "உதவி": 1, "சிறப்பு": 3,
+    "மோசம்": -3, "மோசமான": -3, "கெட்ட": -2, "கோபம்": -3, "பிரச்சனை": -1, "பிரச்சினை": -1,
+    "ஏமாற்றம்": -2, "புகார்": -2, "தாமதம்": -1, "வேஸ்ட்": -2,
+}
+
+TANGLISH = {  # romanized Tamil
+    "nandri": 2, "nanri": 2, "nalla": 2, "nallathu": 2, "nallaa": 2, "super": 3, "arumai": 3,
+    "santhosham": 2, "sari": 1, "udhavi": 1, "semma": 3,
+    "mosam": -3, "mosamana": -3, "ketta": -2, "kovam": -3, "prachanai": -1, "pirachanai": -1,
+    "emaatram": -2, "pugar": -2, "thamadham": -1, "waste": -2, "kevalam": -3,
+}
+
+# Words that flip the polarity of the NEXT few tokens (English word order)
+PRE_NEGATORS = {"not", "no", "never", "dont", "don't", "didnt", "didn't", "isnt", "isn't", "wasnt", "wasn't",
+                "cant", "can't", "cannot", "wont", "won't", "nothing", "without", "hardly", "neither", "nor"}
+
+# Words that flip the polarity of the PRECEDING tokens (Hindi/Tamil verb-final order: "accha nahi hai")
+POST_NEGATORS = {"नहीं", "नही", "nahi", "nahin", "nai", "இல்லை", "illa", "illai", "illaye"}
+
+INTENSIFIERS = {
+    "very": 1.5, "really": 1.4, "so": 1.3, "too": 1.3, "extremely": 1.8, "totally": 1.5, "completely": 1.5,
+    "highly": 1.5, "बहुत": 1.5, "bahut": 1.5, "bohot": 1.5, "bahot": 1.5, "ekdum": 1.6,
+    "romba": 1.5, "rombo": 1.5, "rumba": 1.5, "ரொம்ப": 1.5, "மிகவும்": 1.6, "bilkul": 1.4,
+}
+
+LOCALE_LEXICONS = {
+    # Indian-English users code-mix freely, so English locales include the romanized lists
+    "en": (EN, HINGLISH, TANGLISH),
+    "hi": (HI, HINGLISH, EN),
+    "ta": (TA, TANGLISH, EN),
+}
@@ -4,16 +4,105 @@ Sentiment and CSAT prediction service.
 - For fast feedback, use a lightweight local model or heuristics.
 - For higher accuracy, use a small fine-tuned transformer or an LLM prompt.
 - Output: continuous sentiment score [-1, 1] and discrete label.
+
+Engine: lexicon scoring with per-locale tables (English, Hindi, Hinglish, Tamil,
+romanized Tamil) compiled once into a single token -> (kind, value) dict, so each
+token costs one dict lookup. Handles English pre-negation ("not good"), Hindi/Tamil
+post-negation ("accha nahi"), and intensifiers ("bahut kharab", "romba nalla").
+Scores run in microseconds per message; analyze_sentiment_batch() serves backfills.
+See benchmarks/sentiment_benchmark.py for throughput/accuracy vs. TextBlob.
 """
 
-from textblob import TextBlob
+import re
+from functools import lru_cache
+from typing import Iterable, List
+
+import numpy as np
+
+from services.sentiment_lexicon import INTENSIFIERS, LOCALE_LEXICONS, POST_NEGATORS, PRE_NEGATORS
+
+WORD, PRE, POST, BOOST = 0, 1, 2, 3
+NEGATION_SCALE = -0.74   # VADER's empirically tuned negation factor
+NEGATION_WINDOW = 3      # tokens affected by a negator
+NORMALIZE_ALPHA = 15.0   # x / sqrt(x^2 + alpha) maps the raw sum into (-1, 1)
+
+# Latin words (with apostrophes) or runs of Indic-script characters incl. combining vowel signs
+_TOKEN_RE = re.compile(r"[a-z0-9']+|[ऀ-෿]+")
+
+
+@lru_cache(maxsize=None)
+def _table(lang: str) -> dict:
+    """Compile one lookup table per language; earlier lexicons take precedence."""
+    table = {}
+    for lexicon in reversed(LOCALE_LEXICONS.get(lang, LOCALE_LEXICONS["en"])):
+        table.update((word, (WORD, float(weight))) for word, weight in lexicon.items())
+    table.update((word, (BOOST, factor)) for word, factor in INTENSIFIERS.items())
+    table.update((word, (PRE, 0.0)) for word in PRE_NEGATORS)
+    table.update((word, (POST, 0.0)) for word in POST_NEGATORS)
+    return table
+
+
+def _lang(locale: str) -> str:
+    return (locale or "en").split("_", 1)[0].lower()
+
+
+def _raw_score(text: str, table: dict) -> float:
+    total = 0.0
+    boost = 1.0
+    negate_until = -1
+    last_pos, last_weight = -10, 0.0
+    for pos, token in enumerate(_TOKEN_RE.findall(text.casefold())):
+        entry = table.get(token)
+        if entry is None:
+            boost = 1.0
+            continue
+        kind, value = entry
+        if kind == WORD:
+            weight = value * boost
+            if pos <= negate_until:
+                weight *= NEGATION_SCALE
+                negate_until = -1  # a negator scopes over the first sentiment word only
+            total += weight
+            last_pos, last_weight = pos, weight
+            boost = 1.0
+        elif kind == BOOST:
+            boost = value
+        elif kind == PRE:
+            negate_until = pos + NEGATION_WINDOW
+        elif pos - last_pos <= NEGATION_WINDOW:  # POST: flip the sentiment word just before it
+            total += last_weight * (NEGATION_SCALE - 1.0)
+            last_pos = -10
+    return total
+
+
+def _normalize(raw):
+    return raw / np.sqrt(raw * raw + NORMALIZE_ALPHA)
+
 
 def analyze_sentiment(text: str, locale: str = "en_IN") -> float:
     """
     Return a polarity score in [-1.0, 1.0].
-    Note: TextBlob works best for English; for Indian languages consider translation + model.
+    Works for English, Hindi, Tamil and their romanized/code-mixed forms.
     """
     if not text:
         return 0.0
-    tb = TextBlob(text)
-    return tb.sentiment.polarity
+    return round(float(_normalize(_raw_score(text, _table(_lang(locale))))), 4)
+
+
+def analyze_sentiment_batch(texts: Iterable[str], locales: Iterable[str] = None) -> List[float]:
+    """Score many texts (analytics backfills). locales: one per text, or None for en_IN."""
+    texts = list(texts)
+    locales = list(locales) if locales is not None else ["en_IN"] * len(texts)
+    raw = np.fromiter((_raw_score(t, _table(_lang(l))) if t else 0.0 for t, l in zip(texts, locales)),
+                      dtype=np.float64, count=len(texts))
+    return np.round(_normalize(raw), 4).tolist()
+
+
+def sentiment_label(score: float, threshold: float = 0.1) -> str:
+    if score is None:
+        return "neutral"
+    if score >= threshold:
+        return "positive"
+    if score <= -threshold:
+        return "negative"
+    return "neutral"
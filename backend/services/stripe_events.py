@@ -0,0 +1,234 @@
+"""
+Stripe webhook ingestion and processing.
+
+- ingest(): runs on the webhook request after signature verification. One Lua
+  call dedupes by event id (SET NX, STRIPE_EVENT_DEDUPE_TTL_SEC) and appends the
+  raw event to a durable Redis stream, so the endpoint acknowledges in a few ms.
+- Events are sharded by PaymentIntent id (STRIPE_EVENT_SHARDS streams), and each
+  shard is drained by one worker at a time (Redis lock), so events of one
+  PaymentIntent are handled in order.
+- Stripe does not guarantee delivery order, so status updates also compare the
+  event's `created` timestamp and never move a PaymentIntent back in time.
+- A failed event stops its shard (later events for that intent wait) and stays
+  pending in the consumer group; it is reclaimed on the next run. After
+  STRIPE_EVENT_MAX_DELIVERIES failed deliveries it moves to the DEAD_LETTER_KEY
+  stream (raw event + error) and the shard moves on.
+- schedule_pending() (beat sweep) queues a drain only for shards with queued
+  events and no scheduled or running drain.
+"""
+
+import json
+import logging
+import os
+import socket
+import zlib
+from typing import Callable, Dict, Optional
+
+import redis
+from config import Config
+from extensions import redis_client
+from services import context_cache, message_store
+
+STREAM_PREFIX = "stripe:events"
+GROUP = "stripe-processors"
+DEDUPE_PREFIX = "stripe:event"
+LOCK_PREFIX = "stripe:shard:lock"
+SCHEDULED_PREFIX = "stripe:shard:scheduled"
+DEAD_LETTER_KEY = "stripe:events:dead"
+DEAD_LETTER_MAXLEN = 100000
+PAYMENT_PREFIX = "payment"
+
+# KEYS[1] = dedupe key, KEYS[2] = shard stream; ARGV = ttl, raw event
+INGEST_LUA = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+  redis.call('XADD', KEYS[2], '*', 'event', ARGV[2])
+  return 1
+end
+return 0
+"""
+
+_ingest_script = None
+
+
+def ordering_key(event: dict) -> str:
+    """PaymentIntent id the event belongs to (falls back to the event id)."""
+    obj = event.get("data", {}).get("object", {}) or {}
+    if obj.get("object") == "payment_intent":
+        return obj.get("id") or event["id"]
+    return obj.get("payment_intent") or event["id"]
+
+
+def shard_for(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8")) % Config.STRIPE_EVENT_SHARDS
+
+
+def ingest(event: dict, raw_body: bytes) -> bool:
+    """Queue a verified event. Returns False for a redelivered duplicate. Raises on Redis errors."""
+    global _ingest_script
+    if _ingest_script is None:
+        _ingest_script = redis_client.register_script(INGEST_LUA)
+    shard = shard_for(ordering_key(event))
+    added = _ingest_script(keys=[f"{DEDUPE_PREFIX}:{event['id']}", f"{STREAM_PREFIX}:{shard}"],
+                           args=[Config.STRIPE_EVENT_DEDUPE_TTL_SEC, raw_body])
+    if added:
+        _schedule(shard)
+    return bool(added)
+
+
+def _schedule(shard: int) -> bool:
+    """At most one queued drain task per shard. Returns True if a task was queued."""
+    try:
+        if not redis_client.set(f"{SCHEDULED_PREFIX}:{shard}", 1, nx=True, ex=Config.STRIPE_EVENT_SWEEP_SEC or 30):
+            return False
+    except redis.RedisError:
+        return False  # the event is already durable; the beat sweep picks it up
+
+    from tasks.celery_tasks import process_stripe_events_task  # avoid import cycle at module load
+    process_stripe_events_task.delay(shard)
+    return True
+
+
+def schedule_pending() -> int:
+    """Queue a drain for every shard with events waiting and no drain queued or running. Returns shards queued."""
+    pipe = redis_client.pipeline(transaction=False)
+    for shard in range(Config.STRIPE_EVENT_SHARDS):
+        pipe.xlen(f"{STREAM_PREFIX}:{shard}")
+        pipe.exists(f"{LOCK_PREFIX}:{shard}")
+    replies = pipe.execute()
+    scheduled = 0
+    for shard in range(Config.STRIPE_EVENT_SHARDS):
+        waiting, running = replies[2 * shard], replies[2 * shard + 1]
+        if waiting and not running:
+            scheduled += _schedule(shard)
+    return scheduled
+
+
+def drain(shard: int) -> Optional[int]:
+    """
+    Process every queued event of one shard in stream order. Returns the number of
+    events handled, or None when another worker holds the shard.
+    """
+    lock = redis_client.lock(f"{LOCK_PREFIX}:{shard}", timeout=Config.STRIPE_EVENT_CLAIM_IDLE_MS / 1000)
+    if not lock.acquire(blocking=False):
+        return None
+    try:
+        # Cleared after the lock is held: events ingested from here on schedule a new run
+        redis_client.delete(f"{SCHEDULED_PREFIX}:{shard}")
+        stream = f"{STREAM_PREFIX}:{shard}"
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
+        _ensure_group(stream)
+        handled = 0
+        # Pending entries (left by a crashed or failed run) go first to keep order
+        _, stale, *_ = redis_client.xautoclaim(stream, GROUP, consumer, min_idle_time=0, start_id="0-0",
+                                               count=Config.STRIPE_EVENT_BATCH)
+        handled += _process(stream, stale)
+        while True:
+            resp = redis_client.xreadgroup(GROUP, consumer, {stream: ">"}, count=Config.STRIPE_EVENT_BATCH)
+            if not resp or not resp[0][1]:
+                return handled
+            handled += _process(stream, resp[0][1])
+            lock.extend(Config.STRIPE_EVENT_CLAIM_IDLE_MS / 1000, replace_ttl=True)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+
+def _process(stream: str, entries) -> int:
+    handled = 0
+    for entry_id, fields in entries:
+        pipe = redis_client.pipeline(transaction=True)
+        if fields:
+            raw = fields.get(b"event") or fields.get("event")
+            try:
+                handle_event(json.loads(raw))
+            except Exception as exc:
+                if _deliveries(stream, entry_id) < Config.STRIPE_EVENT_MAX_DELIVERIES:
+                    raise  # entry stays pending, shard stops here
+                logging.exception("Dead-lettering Stripe event entry %s of %s", entry_id, stream)
+                pipe.xadd(DEAD_LETTER_KEY, {"event": raw, "error": repr(exc), "stream": stream, "entry_id": entry_id},
+                          maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+        pipe.xack(stream, GROUP, entry_id)
+        pipe.xdel(stream, entry_id)
+        pipe.execute()
+        handled += 1
+    return handled
+
+
+def _deliveries(stream: str, entry_id) -> int:
+    pending = redis_client.xpending_range(stream, GROUP, min=entry_id, max=entry_id, count=1)
+    return pending[0]["times_delivered"] if pending else 0
+
+
+def _ensure_group(stream: str) -> None:
+    try:
+        redis_client.xgroup_create(stream, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def handle_event(event: dict) -> None:
+    handler = HANDLERS.get(event.get("type"))
+    if handler is None:
+        logging.debug("Ignoring Stripe event %s (%s)", event.get("id"), event.get("type"))
+        return
+    handler(event)
+
+
+def payment_status(payment_intent_id: str) -> dict:
+    """Last processed state of a PaymentIntent: {status, amount, currency, event_created}."""
+    raw = redis_client.hgetall(f"{PAYMENT_PREFIX}:{payment_intent_id}")
+    return {k.decode(): v.decode() for k, v in raw.items()}
+
+
+def _record_status(payment_intent_id: str, status: str, event: dict, obj: dict) -> bool:
+    """Store the new status unless a later event already did. Returns True if applied."""
+    key = f"{PAYMENT_PREFIX}:{payment_intent_id}"
+    last = redis_client.hget(key, "event_created")
+    if last is not None and int(last) > int(event["created"]):
+        logging.info("Skipping out-of-order Stripe event %s for %s", event["id"], payment_intent_id)
+        return False
+    redis_client.hset(key, mapping={
+        "status": status,
+        "amount": obj.get("amount") or 0,
+        "currency": obj.get("currency") or "",
+        "event_created": event["created"],
+    })
+    redis_client.expire(key, Config.STRIPE_EVENT_DEDUPE_TTL_SEC)
+    return True
+
+
+def _notify_conversation(metadata: dict, text: str) -> None:
+    conversation_id = (metadata or {}).get("conversation_id")
+    if not conversation_id:
+        return
+    conversation_id = int(conversation_id)
+    context_cache.append_message(conversation_id, "system", text)
+    message_store.persist_message(conversation_id, "system", text, {"source": "stripe"})
+
+
+def _on_payment_intent(status: str, text: str = None) -> Callable[[dict], None]:
+    def handler(event: dict) -> None:
+        obj = event["data"]["object"]
+        if _record_status(obj["id"], status, event, obj) and text:
+            _notify_conversation(obj.get("metadata"), text.format(amount=(obj.get("amount") or 0) / 100,
+                                                                  currency=(obj.get("currency") or "").upper()))
+    return handler
+
+
+def _on_charge_refunded(event: dict) -> None:
+    obj = event["data"]["object"]
+    if obj.get("payment_intent") and _record_status(obj["payment_intent"], "refunded", event, obj):
+        _notify_conversation(obj.get("metadata"), "Your refund has been issued.")
+
+
+HANDLERS: Dict[str, Callable[[dict], None]] = {
+    "payment_intent.created": _on_payment_intent("requires_payment_method"),
+    "payment_intent.processing": _on_payment_intent("processing"),
+    "payment_intent.succeeded": _on_payment_intent("succeeded", "Payment of {amount:.2f} {currency} received. Thank you!"),
+    "payment_intent.payment_failed": _on_payment_intent("failed", "Your payment of {amount:.2f} {currency} failed. Please try again."),
+    "payment_intent.canceled": _on_payment_intent("canceled"),
+    "charge.refunded": _on_charge_refunded,
+}
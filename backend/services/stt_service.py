@@ -6,15 +6,39 @@ Speech-to-Text adapter.
   {"text": "...", "language": "hi", "duration_ms": 2345, "confidence": 0.92}
 - Implements timeouts and per-call retries.
 - For regional accents, prefer model options or domain-specific fine-tuning provided by vendor.
+
+Streaming mode:
+- The upload is read into memory once, so every retry re-sends the same bytes.
+- PCM WAV input is split into utterance segments by an energy-based voice-activity
+  detector (VAD); other formats are sent as a single segment.
+- Segments are transcribed concurrently on a bounded pool (STT_MAX_WORKERS) and
+  stitched back in order, so a long voicemail takes roughly as long as its
+  longest utterance instead of its total duration.
+- transcribe_stream() yields in-order partial transcripts as segments finish;
+  transcribe_audio_file() returns only the stitched result.
 """
 
-import os
+import io
+import logging
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
 import requests
 from config import Config
+from extensions import http_request
+from utils import metrics
+
+WHISPER_URL = Config.WHISPER_API_URL
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
 
-WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
+_executor = ThreadPoolExecutor(max_workers=Config.STT_MAX_WORKERS, thread_name_prefix="stt")
 
-def transcribe_audio_file(file_stream, filename="upload.wav", language=None, max_retries=2):
+
+@metrics.traced("provider_call_seconds", call="transcribe_audio_file")
+def transcribe_audio_file(file_stream, filename="upload.wav", language=None, max_retries=None):
     """
     Send audio stream to STT provider and return JSON response.
 
@@ -22,20 +46,149 @@ def transcribe_audio_file(file_stream, filename="upload.wav", language=None, max
     - Ensure audio sample rate recommended by provider (16k/48k).
     - For voice with accents, pass language hints and prefer vendor models optimized for Indian languages.
     """
+    result = None
+    for result in transcribe_stream(file_stream, filename, language, max_retries):
+        pass
+    return result
+
+
+def transcribe_stream(file_stream, filename="upload.wav", language=None, max_retries=None) -> Iterator[dict]:
+    """
+    Yield {"partial": True, "index", "text", "start_ms", "end_ms"} for each segment in
+    order as soon as it (and every earlier segment) is transcribed, then one final
+    {"partial": False, "text", "language", "duration_ms", "segments"}.
+    Raises if any segment still fails after retries (RuntimeError) or is rejected (HTTPError).
+    """
+    audio = file_stream.read()
+    segments = segment_audio(audio, filename)
+    retries = Config.STT_MAX_RETRIES if max_retries is None else max_retries
+    futures = [_executor.submit(_transcribe_segment, seg["audio"], seg["filename"], language, retries)
+               for seg in segments]
+
+    parts, detected = [], language
+    try:
+        for index, (seg, fut) in enumerate(zip(segments, futures)):
+            res_json = fut.result()
+            text = (res_json.get("text") or "").strip()
+            detected = detected or res_json.get("language")
+            part = {"index": index, "text": text, "start_ms": seg["start_ms"], "end_ms": seg["end_ms"]}
+            parts.append(part)
+            yield {"partial": True, **part}
+    finally:
+        for fut in futures:
+            fut.cancel()
+
+    yield {
+        "partial": False,
+        "text": " ".join(p["text"] for p in parts if p["text"]),
+        "language": detected,
+        "duration_ms": segments[-1]["end_ms"] if segments else 0,
+        "segments": parts,
+    }
+
+
+def segment_audio(audio: bytes, filename: str = "upload.wav") -> List[dict]:
+    """
+    Split audio into utterance segments: [{"audio": bytes, "filename", "start_ms", "end_ms"}].
+    Only 16-bit PCM WAV is decoded; anything else comes back as one segment.
+    """
+    try:
+        with wave.open(io.BytesIO(audio)) as wav:
+            params = wav.getparams()
+            pcm = wav.readframes(params.nframes)
+    except (wave.Error, EOFError):
+        return [{"audio": audio, "filename": filename, "start_ms": 0, "end_ms": 0}]
+    if params.sampwidth != 2 or not params.nframes:
+        duration_ms = int(params.nframes * 1000 / params.framerate) if params.framerate else 0
+        return [{"audio": audio, "filename": filename, "start_ms": 0, "end_ms": duration_ms}]
+
+    samples = np.frombuffer(pcm, dtype="<i2").reshape(-1, params.nchannels)
+    spans = _detect_speech(samples.mean(axis=1), params.framerate)
+    out = []
+    for start, end in spans:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as seg_wav:
+            seg_wav.setparams(params)
+            seg_wav.writeframes(samples[start:end].tobytes())
+        out.append({
+            "audio": buf.getvalue(),
+            "filename": f"segment-{len(out)}.wav",
+            "start_ms": int(start * 1000 / params.framerate),
+            "end_ms": int(end * 1000 / params.framerate),
+        })
+    return out
+
+
+def _detect_speech(mono: np.ndarray, rate: int) -> List[tuple]:
+    """
+    Energy VAD: frame RMS above an adaptive threshold (noise floor x 3) is speech.
+    Returns (start_sample, end_sample) spans split on pauses >= STT_VAD_MIN_SILENCE_MS
+    and capped at STT_VAD_MAX_SEGMENT_SEC.
+    """
+    frame = max(1, rate * Config.STT_VAD_FRAME_MS // 1000)
+    n_frames = len(mono) // frame
+    if n_frames == 0:
+        return [(0, len(mono))]
+    frames = mono[:n_frames * frame].astype(np.float64).reshape(n_frames, frame)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    noise_floor = np.percentile(rms, 10)
+    threshold = max(noise_floor * 3.0, 200.0)  # absolute floor keeps digital silence from counting as speech
+    voiced = rms > threshold
+
+    min_silence = max(1, Config.STT_VAD_MIN_SILENCE_MS // Config.STT_VAD_FRAME_MS)
+    min_speech = max(1, Config.STT_VAD_MIN_SPEECH_MS // Config.STT_VAD_FRAME_MS)
+    max_frames = max(1, Config.STT_VAD_MAX_SEGMENT_SEC * 1000 // Config.STT_VAD_FRAME_MS)
+    pad = Config.STT_VAD_PAD_MS // Config.STT_VAD_FRAME_MS
+
+    spans, start, silence = [], None, 0
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced:
+            if start is None:
+                start = i
+            silence = 0
+        elif start is not None:
+            silence += 1
+            if silence >= min_silence:
+                spans.append((start, i - silence + 1))
+                start, silence = None, 0
+        if start is not None and i + 1 - start >= max_frames:
+            spans.append((start, i + 1))
+            start, silence = None, 0
+    if start is not None:
+        spans.append((start, n_frames - silence))
+
+    out = []
+    for s, e in spans:
+        if e - s < min_speech:
+            continue
+        s, e = max(0, s - pad), min(n_frames, e + pad)
+        if out and s <= out[-1][1]:
+            s = out[-1][1]  # padding must not overlap the previous segment
+        out.append((s, e))
+    return [(s * frame, e * frame) for s, e in out]
+
+
+def _transcribe_segment(audio: bytes, filename: str, language: Optional[str], max_retries: int) -> dict:
+    """POST one buffered segment; every attempt re-sends the full bytes. Retries only transient failures."""
     headers = {"Authorization": f"Bearer {Config.WHISPER_API_KEY}"}
-    files = {"file": (filename, file_stream)}
     data = {"model": "whisper-1"}
     if language:
         data["language"] = language
 
-    for attempt in range(max_retries):
-        resp = requests.post(WHISPER_URL, headers=headers, files=files, data=data, timeout=Config.STT_REQUEST_TIMEOUT_SEC)
-        if resp.ok:
-            res_json = resp.json()
-            return {
-                "text": res_json.get("text"),
-                "language": res_json.get("language", language),
-                "raw": res_json
-            }
+    for attempt in range(max_retries + 1):
+        try:
+            files = {"file": (filename, io.BytesIO(audio))}
+            with metrics.span("stt_request_seconds"):
+                resp = http_request("POST", WHISPER_URL, headers=headers, files=files, data=data,
+                                    timeout=Config.STT_REQUEST_TIMEOUT_SEC)
+            if resp.ok:
+                return resp.json()
+            if resp.status_code not in RETRYABLE_STATUS:
+                resp.raise_for_status()
+            logging.warning("STT attempt %d for %s returned %s", attempt + 1, filename, resp.status_code)
+        except (requests.ConnectionError, requests.Timeout):
+            logging.warning("STT attempt %d for %s failed", attempt + 1, filename, exc_info=True)
+        if attempt < max_retries:
+            time.sleep(0.2 * (2 ** attempt))
     # If everything fails:
     raise RuntimeError("STT service failed after retries")
@@ -0,0 +1,125 @@
+"""
+Rolling conversation summarization (context compaction).
+
+- Messages older than the live context window are folded into a running summary
+  stored in Conversation.meta: {"summary", "summary_upto_id", "summary_updated_at"}.
+- Updates are incremental: only messages after summary_upto_id are sent to the
+  LLM together with the previous summary, never the whole history.
+- maybe_schedule() runs on the request path and costs one Redis INCR; the LLM
+  work happens in tasks.celery_tasks.summarize_conversation_task.
+"""
+
+import logging
+from datetime import datetime
+
+import redis
+from config import Config
+from extensions import db, redis_client
+from models import Conversation, Message
+from services.context_cache import SENDER_ROLES
+from services.llm_service import summarize_messages
+
+COUNTER_PREFIX = "summary:count"
+LOCK_PREFIX = "summary:lock"
+TEXT_PREFIX = "summary:text"
+
+
+def get_summary(conversation_id: int) -> str:
+    """
+    Current summary for the prompt. Served from Redis; a miss loads Conversation.meta
+    once and caches the result (an empty string when there is no summary yet).
+    """
+    key = f"{TEXT_PREFIX}:{conversation_id}"
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return cached.decode("utf-8") or None
+    except redis.RedisError:
+        logging.warning("Summary cache read failed for conversation %s", conversation_id, exc_info=True)
+    meta = Conversation.query.with_entities(Conversation.meta).filter_by(id=conversation_id).scalar()
+    summary = (meta or {}).get("summary") or ""
+    _cache_summary(conversation_id, summary)
+    return summary or None
+
+
+def _cache_summary(conversation_id: int, summary: str) -> None:
+    try:
+        redis_client.set(f"{TEXT_PREFIX}:{conversation_id}", summary, ex=Config.CONTEXT_CACHE_TTL_SEC)
+    except redis.RedisError:
+        logging.warning("Summary cache write failed for conversation %s", conversation_id, exc_info=True)
+
+
+def maybe_schedule(conversation_id: int, new_messages: int = 1) -> bool:
+    """
+    Count persisted messages and enqueue a compaction once the conversation is past
+    SUMMARY_TRIGGER_MESSAGES, then again every SUMMARY_BATCH_MESSAGES.
+    """
+    key = f"{COUNTER_PREFIX}:{conversation_id}"
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incrby(key, new_messages)
+        pipe.expire(key, Config.CONTEXT_CACHE_TTL_SEC)
+        count, _ = pipe.execute()
+        if count < Config.SUMMARY_TRIGGER_MESSAGES:
+            return False
+        if (count - Config.SUMMARY_TRIGGER_MESSAGES) % Config.SUMMARY_BATCH_MESSAGES >= new_messages:
+            return False
+        # One queued/running compaction per conversation at a time
+        if not redis_client.set(f"{LOCK_PREFIX}:{conversation_id}", 1, nx=True, ex=Config.SUMMARY_LOCK_TTL_SEC):
+            return False
+    except redis.RedisError:
+        logging.warning("Summary scheduling skipped for conversation %s", conversation_id, exc_info=True)
+        return False
+
+    from tasks.celery_tasks import summarize_conversation_task  # avoid import cycle at module load
+    summarize_conversation_task.delay(conversation_id)
+    return True
+
+
+def update_summary(conversation_id: int) -> dict:
+    """
+    Fold unsummarized messages that have left the context window into the summary.
+    Safe to run concurrently: the write is a compare-and-set on summary_upto_id.
+    """
+    try:
+        conv = Conversation.query.get(conversation_id)
+        if conv is None:
+            return {"updated": False, "reason": "not_found"}
+        meta = conv.meta or {}
+        upto_id = meta.get("summary_upto_id") or 0
+
+        rows = (
+            Message.query.with_entities(Message.id, Message.sender, Message.text)
+            .filter(Message.conversation_id == conversation_id, Message.id > upto_id)
+            .order_by(Message.id)
+            .all()
+        )
+        to_fold = rows[:-Config.MAX_CONTEXT_MESSAGES][:Config.SUMMARY_MAX_FOLD_MESSAGES]
+        if len(to_fold) < Config.SUMMARY_MIN_FOLD_MESSAGES:
+            return {"updated": False, "reason": "below_threshold", "pending": len(to_fold)}
+
+        entries = [{"role": SENDER_ROLES.get(sender, "user"), "content": text} for _, sender, text in to_fold]
+        summary, llm_meta = summarize_messages(meta.get("summary"), entries, conv.language or "en_IN")
+
+        # populate_existing: the row from the first read is in the identity map and would
+        # otherwise come back with its stale meta, hiding another worker's write
+        conv = Conversation.query.filter_by(id=conversation_id).with_for_update().populate_existing().first()
+        current = conv.meta or {}
+        if (current.get("summary_upto_id") or 0) != upto_id:
+            db.session.rollback()
+            return {"updated": False, "reason": "superseded"}
+        current = dict(current)
+        current.update({
+            "summary": summary,
+            "summary_upto_id": to_fold[-1][0],
+            "summary_updated_at": datetime.utcnow().isoformat(),
+        })
+        conv.meta = current  # reassign so the JSONB change is flushed
+        db.session.commit()
+        _cache_summary(conversation_id, summary)
+        return {"updated": True, "folded": len(to_fold), "model": llm_meta.get("model")}
+    finally:
+        try:
+            redis_client.delete(f"{LOCK_PREFIX}:{conversation_id}")
+        except redis.RedisError:
+            pass
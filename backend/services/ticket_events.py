@@ -0,0 +1,139 @@
+"""
+Ticket change feed for the agent UI.
+
+- publish() appends {type, ticket_id, ...} to a capped Redis stream ("tickets:events")
+  whenever a ticket is created, claimed or closed.
+- Each web process runs ONE reader thread (XREAD BLOCK) that fans events out to all
+  of its SSE/long-poll agents through an in-memory buffer, so hundreds of connected
+  agents cost one Redis connection per process and no Postgres queries.
+- Stream ids double as resume cursors (SSE Last-Event-ID); cursors older than the
+  local buffer are served from the stream with XRANGE.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+import redis
+from config import Config
+from extensions import redis_client
+
+STREAM_KEY = "tickets:events"
+
+
+def parse_cursor(stream_id: str) -> Tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _decode(entry) -> Tuple[str, dict]:
+    entry_id, fields = entry
+    entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+    raw = fields.get(b"event") or fields.get("event")
+    return entry_id, json.loads(raw)
+
+
+def ticket_payload(event_type: str, ticket) -> dict:
+    return {
+        "type": event_type,
+        "ticket_id": ticket.id,
+        "conversation_id": ticket.conversation_id,
+        "status": ticket.status,
+        "assigned_agent": ticket.assigned_agent,
+        "created_at": ticket.created_at.isoformat() if ticket.created_at else None,
+    }
+
+
+def publish(event_type: str, ticket) -> Optional[str]:
+    """Append a ticket event; returns its stream id. Failures are logged (agents fall back to paging)."""
+    try:
+        entry_id = redis_client.xadd(STREAM_KEY, {"event": json.dumps(ticket_payload(event_type, ticket))},
+                                     maxlen=Config.TICKET_EVENTS_MAXLEN, approximate=True)
+        return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+    except redis.RedisError:
+        logging.warning("Ticket event publish failed (%s, ticket %s)", event_type, ticket.id, exc_info=True)
+        return None
+
+
+class TicketFeed:
+    """Per-process fan-out of the ticket stream to waiting request threads."""
+
+    def __init__(self, buffer_size: int):
+        self._buffer_size = buffer_size
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._start()
+
+    def _start(self) -> None:
+        # First use in this process (or first use after fork: threads don't survive it)
+        self._events = deque(maxlen=self._buffer_size)
+        self._cond = threading.Condition()
+        start_id = self.current_id()
+        self._floor = parse_cursor(start_id)  # cursors older than this are replayed from Redis
+        threading.Thread(target=self._run, args=(start_id,), name="ticket-feed", daemon=True).start()
+        self._pid = os.getpid()
+
+    def _run(self, last_id: str) -> None:
+        while True:
+            try:
+                resp = redis_client.xread({STREAM_KEY: last_id}, block=5000, count=100)
+            except redis.RedisError:
+                logging.warning("Ticket feed read failed; retrying", exc_info=True)
+                time.sleep(1)
+                continue
+            if not resp:
+                continue
+            entries = [_decode(entry) for entry in resp[0][1]]
+            last_id = entries[-1][0]
+            with self._cond:
+                for entry in entries:
+                    if len(self._events) == self._events.maxlen:
+                        self._floor = parse_cursor(self._events[0][0])
+                    self._events.append(entry)
+                self._cond.notify_all()
+
+    def current_id(self) -> str:
+        """Id of the newest event; "0-0" if the stream is empty or unavailable."""
+        try:
+            newest = redis_client.xrevrange(STREAM_KEY, count=1)
+        except redis.RedisError:
+            return "0-0"
+        return _decode(newest[0])[0] if newest else "0-0"
+
+    def wait(self, after_id: str, timeout: float) -> List[Tuple[str, dict]]:
+        """Events newer than after_id; blocks up to timeout seconds when there are none yet."""
+        self._ensure_started()
+        with self._cond:
+            events = self._after(after_id)
+            if events == []:
+                self._cond.wait(timeout)
+                events = self._after(after_id)
+        return self._replay(after_id) if events is None else events
+
+    def _after(self, after_id: str) -> Optional[List[Tuple[str, dict]]]:
+        """None when after_id predates the buffer (caller replays from Redis)."""
+        cursor = parse_cursor(after_id)
+        if cursor < self._floor:
+            return None
+        return [(eid, ev) for eid, ev in self._events if parse_cursor(eid) > cursor]
+
+    def _replay(self, after_id: str) -> List[Tuple[str, dict]]:
+        try:
+            entries = redis_client.xrange(STREAM_KEY, min=f"({after_id}", count=self._buffer_size)
+        except redis.RedisError:
+            logging.warning("Ticket feed replay failed", exc_info=True)
+            return []
+        return [_decode(entry) for entry in entries]
+
+
+feed = TicketFeed(Config.TICKET_FEED_BUFFER)
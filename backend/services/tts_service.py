@@ -4,9 +4,68 @@ Text-to-Speech adapter.
 - Offer TTS using Google TTS or vendor of choice.
 - Return path to audio file or an in-memory bytes object depending on integration.
 - For production, stream audio to client or use signed URL storage (S3).
+
+Caching:
+- Content-addressed: key = sha256(voice, format, normalized text), stable across
+  processes and restarts (unlike hash()), so every worker shares hits.
+- Files live under TTS_CACHE_DIR/<key[:2]>/<key>.<format>, written atomically
+  (temp file + os.replace) so readers never see partial audio.
+- Size-capped LRU: hits bump mtime; once TTS_CACHE_MAX_BYTES is exceeded the
+  least recently used files are evicted down to the low-water mark. In-flight
+  temp files are skipped (only orphans older than TEMP_GRACE_SEC are removed).
+- Optional shared Redis index (TTS_CACHE_REDIS_INDEX) keeps a sorted set of
+  last-access times so eviction doesn't need a directory scan.
+- prewarm() synthesizes the most frequent bot replies ahead of time.
 """
 
+import base64
+import hashlib
+import logging
 import os
+import tempfile
+import threading
+import time
+from typing import Iterable, List, Tuple
+
+import redis
+from config import Config
+from extensions import http_request, redis_client
+from utils import metrics
+from utils.cache import SingleFlight
+
+GOOGLE_TTS_URL = Config.TTS_API_URL
+INDEX_KEY = "tts:lru"
+SIZE_KEY = "tts:size"
+AUDIO_ENCODINGS = {"mp3": "MP3", "wav": "LINEAR16", "ogg": "OGG_OPUS"}
+TEMP_SUFFIX = ".part"  # in-flight writes (mkstemp + os.replace)
+TEMP_GRACE_SEC = 600  # eviction leaves younger temp files alone
+
+# Highest-traffic bot replies; warmed on worker start (tasks.celery_tasks.prewarm_tts_task)
+COMMON_PHRASES = [
+    ("Hello! How can I help you today?", "en-IN"),
+    ("Thank you for contacting us. Is there anything else I can help with?", "en-IN"),
+    ("We're unable to process this request right now. We'll escalate to a human agent.", "en-IN"),
+    ("I'm connecting you to a human agent. Please stay on the line.", "en-IN"),
+    ("नमस्ते! मैं आपकी क्या सहायता कर सकता हूँ?", "hi-IN"),
+    ("मैं आपको एक एजेंट से जोड़ रहा हूँ। कृपया लाइन पर बने रहें।", "hi-IN"),
+    ("வணக்கம்! நான் உங்களுக்கு எப்படி உதவ முடியும்?", "ta-IN"),
+]
+
+_inflight = SingleFlight()
+_size_lock = threading.Lock()
+_approx_bytes = None  # per-process estimate of cache size; seeded by one directory scan
+
+
+def cache_key(text: str, voice: str = "en-IN", format: str = "mp3") -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{voice}\x1f{format}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+
+def cache_path(key: str, format: str = "mp3") -> str:
+    return os.path.join(Config.TTS_CACHE_DIR, key[:2], f"{key}.{format}")
+
+
+@metrics.traced("provider_call_seconds", call="synthesize_speech")
 def synthesize_speech(text: str, voice: str = "en-IN", format: str = "mp3"):
     """
     Synthesize text and return path to audio file.
@@ -14,7 +73,168 @@ def synthesize_speech(text: str, voice: str = "en-IN", format: str = "mp3"):
     - Keep TTS latency under 1-2s if possible.
     - Cache repeated TTS outputs in Redis or CDN.
     """
-    # Pseudocode -> Implement vendor SDK call here
-    output_path = f"/tmp/tts_{hash(text)}.mp3"
-    # vendor.synthesize(text, output_path, voice=voice)
-    return output_path
+    key = cache_key(text, voice, format)
+    path = cache_path(key, format)
+    if _touch(path):
+        _index_access(key, path)
+        return path
+    # Concurrent requests for the same phrase in this worker share one vendor call
+    path, _ = _inflight.do(key, _synthesize_to_cache, text, voice, format, key, path)
+    return path
+
+
+def prewarm(phrases: Iterable[Tuple[str, str]] = None, format: str = "mp3") -> List[str]:
+    """Synthesize phrases that aren't cached yet; returns the paths. Failures are logged and skipped."""
+    paths = []
+    for text, voice in phrases or COMMON_PHRASES:
+        try:
+            paths.append(synthesize_speech(text, voice, format))
+        except Exception:
+            logging.exception("TTS prewarm failed for voice %s", voice)
+    return paths
+
+
+def _synthesize_to_cache(text: str, voice: str, format: str, key: str, path: str) -> str:
+    if _touch(path):  # another worker finished it while we waited
+        return path
+    audio = _vendor_synthesize(text, voice, format)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(audio)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _index_access(key, path, len(audio))
+    _account(len(audio))
+    return path
+
+
+def _vendor_synthesize(text: str, voice: str, format: str) -> bytes:
+    """Google Cloud TTS REST call; swap for the vendor SDK of choice."""
+    payload = {
+        "input": {"text": text},
+        "voice": {"languageCode": voice},
+        "audioConfig": {"audioEncoding": AUDIO_ENCODINGS.get(format, "MP3")},
+    }
+    with metrics.span("tts_request_seconds"):
+        resp = http_request("POST", GOOGLE_TTS_URL, params={"key": Config.TTS_API_KEY}, json=payload,
+                            timeout=Config.TTS_REQUEST_TIMEOUT_SEC)
+    resp.raise_for_status()
+    return base64.b64decode(resp.json()["audioContent"])
+
+
+def _touch(path: str) -> bool:
+    """Mark a cached file as recently used; False if it doesn't exist."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _index_access(key: str, path: str, size: int = None) -> None:
+    if not Config.TTS_CACHE_REDIS_INDEX:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zadd(INDEX_KEY, {path: time.time()})
+        if size is not None:
+            pipe.hset(SIZE_KEY, path, size)
+        pipe.execute()
+    except redis.RedisError:
+        logging.warning("TTS index update failed", exc_info=True)
+
+
+def _account(added: int) -> None:
+    global _approx_bytes
+    with _size_lock:
+        if _approx_bytes is None:
+            _approx_bytes = _scan_size()
+        else:
+            _approx_bytes += added
+        over = _approx_bytes > Config.TTS_CACHE_MAX_BYTES
+    if over:
+        evict()
+
+
+def _scan_size() -> int:
+    total = 0
+    for root, _, files in os.walk(Config.TTS_CACHE_DIR):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def evict(target_bytes: int = None) -> int:
+    """Delete least recently used audio until the cache is under target_bytes. Returns bytes freed."""
+    global _approx_bytes
+    target = target_bytes if target_bytes is not None else int(Config.TTS_CACHE_MAX_BYTES * Config.TTS_CACHE_LOW_WATER)
+    freed = 0
+    if Config.TTS_CACHE_REDIS_INDEX:
+        try:
+            freed = _evict_indexed(target)
+        except redis.RedisError:
+            logging.warning("TTS index eviction failed; falling back to directory scan", exc_info=True)
+            freed = _evict_scan(target)
+    else:
+        freed = _evict_scan(target)
+    with _size_lock:
+        _approx_bytes = _scan_size()
+    return freed
+
+
+def _evict_scan(target: int) -> int:
+    entries = []
+    now = time.time()
+    for root, _, files in os.walk(Config.TTS_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(TEMP_SUFFIX) and now - st.st_mtime < TEMP_GRACE_SEC:
+                continue  # being written; os.replace publishes it. Older ones are orphans of a crash.
+            entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.unlink(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+def _evict_indexed(target: int) -> int:
+    sizes = {k.decode(): int(v) for k, v in redis_client.hgetall(SIZE_KEY).items()}
+    total = sum(sizes.values())
+    freed = 0
+    while total - freed > target:
+        oldest = redis_client.zrange(INDEX_KEY, 0, 99)
+        if not oldest:
+            break
+        for raw in oldest:
+            path = raw.decode()
+            size = sizes.get(path, 0)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            redis_client.zrem(INDEX_KEY, path)
+            redis_client.hdel(SIZE_KEY, path)
+            freed += size
+            if total - freed <= target:
+                break
+    return freed
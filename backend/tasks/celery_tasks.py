@@ -1,22 +1,228 @@
 """
 Background tasks to offload heavy or delayed work:
 - Sending SMS / Email
-- Creating CRM tickets
+- Creating CRM tickets (and the local ticket of an escalated conversation)
+- Rolling conversation summarization (context compaction)
+- Draining write-behind message persistence
+- Knowledge-base indexing for retrieval (RAG)
+- Pre-warming the TTS audio cache
 - Periodic analytics and retraining jobs
 """
 
-from extensions import celery
-from services.notifications import send_sms, send_email
-from services.crm_service import create_crm_ticket
+from config import Config
+from celery.signals import worker_ready
+from extensions import celery, db
+from services import notification_dispatcher
+from services import crm_cache, pii_service, stripe_events, ticket_events
+from services.summary_service import get_summary, update_summary
+from services.message_store import drain as drain_message_stream
+from services import retrieval
+from services.tts_service import prewarm as prewarm_tts
+from models import KnowledgeDocument, Ticket
+
+@celery.task
+def send_sms_task(to_number, body, priority="transactional"):
+    """Queue an SMS for batched dispatch; returns False if it was a duplicate."""
+    return notification_dispatcher.enqueue_sms(to_number, body, priority)
+
+@celery.task
+def send_email_task(to_email, subject, html_body, priority="transactional"):
+    """Queue an email for batched dispatch; returns False if it was a duplicate."""
+    return notification_dispatcher.enqueue_email(to_email, subject, html_body, priority)
 
 @celery.task(bind=True, max_retries=3)
-def send_sms_task(self, to_number, body):
+def flush_notifications_task(self, channel, priority):
+    """Send everything queued for (channel, priority); per-message failures back off inside the dispatcher."""
     try:
-        return send_sms(to_number, body)
+        return notification_dispatcher.flush(channel, priority)
     except Exception as exc:
-        raise self.retry(exc=exc, countdown=30)
+        raise self.retry(exc=exc, countdown=notification_dispatcher.backoff_delay(self.request.retries))
 
 @celery.task(bind=True)
 def create_ticket_task(self, conversation_id, summary, metadata=None):
-    # call CRM and persist mapping in DB if required
-    return create_crm_ticket(conversation_id, summary, metadata)
+    # Deduped per conversation and batched; the id is stored on the Ticket by flush_crm_tickets_task
+    return crm_cache.request_ticket(conversation_id, summary, metadata)
+
+@celery.task(bind=True, max_retries=3)
+def escalate_conversation_task(self, conversation_id, reply, sentiment):
+    """Open a local ticket for an escalated conversation (one open ticket per conversation) and request its CRM ticket."""
+    try:
+        ticket = Ticket.query.filter_by(conversation_id=conversation_id, status="open").first()
+        if ticket is None:
+            ticket = Ticket(conversation_id=conversation_id, status="open")
+            db.session.add(ticket)
+            db.session.commit()
+            ticket_events.publish("ticket.created", ticket)  # pushed to connected agents
+    except Exception as exc:
+        db.session.rollback()
+        raise self.retry(exc=exc, countdown=10)
+    # Deduped per conversation and batched into bulk CRM calls (services.crm_cache.request_ticket)
+    create_ticket_task.delay(conversation_id, get_summary(conversation_id) or reply,
+                             {"ticket_id": ticket.id, "sentiment": sentiment})
+    return ticket.id
+
+@celery.task(bind=True, max_retries=5)
+def flush_crm_tickets_task(self):
+    """Send queued CRM tickets in bulk calls; a failed batch stays in the processing list and is resent."""
+    try:
+        return crm_cache.flush_tickets()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+
+@celery.task(bind=True, max_retries=2)
+def refresh_crm_profile_task(self, external_user_id):
+    """Stale-while-revalidate refresh for one cached CRM profile."""
+    try:
+        crm_cache.refresh_profile(external_user_id)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+
+@celery.task
+def prefetch_crm_profiles_task(force=False):
+    """Warm CRM profiles for every user with an open ticket."""
+    return crm_cache.prefetch_open_ticket_profiles(force)
+
+@celery.task(bind=True, max_retries=8)
+def process_stripe_events_task(self, shard):
+    """
+    Handle queued Stripe events of one shard in order; a failing event blocks only its shard.
+    Once retries run out the beat sweep schedules the shard again, and an event that keeps
+    failing is dead-lettered after STRIPE_EVENT_MAX_DELIVERIES.
+    """
+    try:
+        handled = stripe_events.drain(shard)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=min(300, 2 ** self.request.retries))
+    if handled is None:  # another worker is draining; check again once it is likely done
+        raise self.retry(countdown=1)
+    return handled
+
+@celery.task
+def sweep_stripe_events_task():
+    """Safety net for events whose drain task was lost: schedule shards with waiting events and no drain."""
+    return stripe_events.schedule_pending()
+
+@celery.task(bind=True, max_retries=5)
+def rotate_pii_task(self, after_id=0, skipped=()):
+    """
+    Re-encrypt one batch of users under the newest Fernet key, then chain the next batch.
+    Rows that were locked during the pass are collected and handed to rotate_pii_skipped_task.
+    """
+    try:
+        result = pii_service.rotate_batch(after_id)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+    skipped = [*skipped, *result["skipped"]]
+    if result["next_after_id"] is not None:
+        rotate_pii_task.delay(result["next_after_id"], skipped)
+    elif skipped:
+        rotate_pii_skipped_task.apply_async((skipped,), countdown=30)
+    return result
+
+@celery.task(bind=True, max_retries=10)
+def rotate_pii_skipped_task(self, user_ids):
+    """Rotate users the keyset pass skipped as locked; retries until none are left."""
+    try:
+        result = pii_service.rotate_users(user_ids)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+    if result["skipped"]:
+        raise self.retry(args=(result["skipped"],), countdown=30)
+    return result
+
+@celery.task(bind=True, max_retries=2)
+def summarize_conversation_task(self, conversation_id):
+    """Fold messages that left the context window into Conversation.meta["summary"]."""
+    try:
+        return update_summary(conversation_id)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+
+@celery.task(bind=True, max_retries=3)
+def drain_message_stream_task(self):
+    """Batch-insert queued Message rows; bad rows are dead-lettered, the rest wait for the next beat run."""
+    try:
+        return drain_message_stream()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=5)
+
+@celery.task(bind=True, max_retries=3)
+def index_document_task(self, doc_id):
+    """(Re)embed a KnowledgeDocument after it is created or edited."""
+    doc = KnowledgeDocument.query.get(doc_id)
+    if doc is None:
+        return retrieval.remove_document(doc_id)
+    try:
+        return retrieval.index_document(doc.id, f"{doc.title}\n{doc.content}")
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+
+@celery.task
+def remove_document_task(doc_id):
+    return retrieval.remove_document(doc_id)
+
+@celery.task
+def maintain_knowledge_index_task():
+    """Compact tombstones and rebuild the IVF lists once the corpus is large."""
+    return retrieval.maintain()
+
+@celery.task
+def prewarm_tts_task(phrases=None):
+    """Synthesize frequent bot replies (greetings, escalation notices) into the TTS cache."""
+    return prewarm_tts([tuple(p) for p in phrases] if phrases else None)
+
+@worker_ready.connect
+def _prewarm_tts_on_start(sender=None, **kwargs):
+    if Config.TTS_PREWARM_ON_START:
+        prewarm_tts_task.delay()
+
+if Config.MESSAGE_WRITE_BEHIND:
+    celery.conf.beat_schedule = {
+        **(celery.conf.beat_schedule or {}),
+        "drain-message-stream": {
+            "task": drain_message_stream_task.name,
+            "schedule": Config.MESSAGE_WRITE_BEHIND_FLUSH_SEC,
+        },
+    }
+
+if Config.CRM_PREFETCH_INTERVAL_SEC:
+    celery.conf.beat_schedule = {
+        **(celery.conf.beat_schedule or {}),
+        "prefetch-crm-profiles": {
+            "task": prefetch_crm_profiles_task.name,
+            "schedule": Config.CRM_PREFETCH_INTERVAL_SEC,
+        },
+    }
+
+if Config.CRM_TICKET_SWEEP_SEC:
+    celery.conf.beat_schedule = {
+        **(celery.conf.beat_schedule or {}),
+        "sweep-crm-tickets": {
+            "task": flush_crm_tickets_task.name,
+            "schedule": Config.CRM_TICKET_SWEEP_SEC,
+        },
+    }
+
+if Config.STRIPE_EVENT_SWEEP_SEC:
+    celery.conf.beat_schedule = {
+        **(celery.conf.beat_schedule or {}),
+        "sweep-stripe-events": {
+            "task": sweep_stripe_events_task.name,
+            "schedule": Config.STRIPE_EVENT_SWEEP_SEC,
+        },
+    }
+
+# Position of the priority argument when passed positionally
+_NOTIFY_PRIORITY_ARG = {send_sms_task.name: 2, send_email_task.name: 3}
+
+def _route_notification(name, args, kwargs, options, task=None, **kw):
+    """Enqueue tasks go to the queue of their priority, so a broadcast never lands on the transactional queue."""
+    position = _NOTIFY_PRIORITY_ARG.get(name)
+    if position is None:
+        return None
+    priority = (kwargs or {}).get("priority")
+    if priority is None:
+        priority = args[position] if args and len(args) > position else notification_dispatcher.TRANSACTIONAL
+    return {"queue": notification_dispatcher.queue_name(priority)}
+
+celery.conf.task_routes = (celery.conf.task_routes or {}, _route_notification)
@@ -5,6 +5,121 @@ General helpers used across the app:
 - small util functions
 """
 
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+try:  # optional: exact counts for OpenAI models
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # pragma: no cover - tokenizer not installed / no local BPE file
+    _encoding = None
+
+# Per-message framing overhead in the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Sentence ends: Latin punctuation, Devanagari danda, or a newline; followed by whitespace
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?।॥])\s+|\n+")
+
+KNOWLEDGE_HEADER = "Relevant knowledge:\n"
+SUMMARY_HEADER = "Conversation so far:\n"
+
+
 def truncate_context(messages, max_messages=8):
     """Keep the last N messages for LLM context window."""
     return messages[-max_messages:]
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Token count for text using the local tokenizer.
+
+    Falls back to a conservative estimate when tiktoken isn't available:
+    ~4 chars/token for ASCII, ~1 token/char for Indic and other non-Latin scripts.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def message_tokens(message: dict) -> int:
+    """Token cost of one chat message; reuses a memoized "tokens" field when present."""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = count_tokens(message.get("content") or "")
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def assemble_prompt(system_prompt: str, context_messages: List[dict], user_message: str, budget: int,
+                    knowledge: Optional[List[str]] = None, summary: Optional[str] = None) -> List[dict]:
+    """
+    Pack a provider message list into `budget` prompt tokens.
+
+    Priority: system prompt and current user message always; then the rolling
+    conversation summary (if it fits); then retrieved knowledge snippets in rank order; then the newest context messages, walking
+    backwards until the budget is spent. Only the current turn is tokenized when
+    context entries carry memoized "tokens" (see services.context_cache).
+    """
+    system = {"role": "system", "content": system_prompt}
+    user = {"role": "user", "content": user_message}
+    remaining = budget - message_tokens(system) - message_tokens(user)
+
+    summary_msg = None
+    if summary:
+        summary_msg = {"role": "system", "content": SUMMARY_HEADER + summary}
+        cost = message_tokens(summary_msg)
+        if cost <= remaining:
+            remaining -= cost
+        else:
+            summary_msg = None
+
+    snippets = []
+    if knowledge:
+        available = remaining - MESSAGE_OVERHEAD_TOKENS - count_tokens(KNOWLEDGE_HEADER)
+        for snippet in knowledge:
+            cost = count_tokens(snippet) + 1  # newline separator
+            if cost > available:
+                break
+            snippets.append(snippet)
+            available -= cost
+        if snippets:
+            remaining = available
+
+    packed = []
+    for message in reversed(context_messages):
+        cost = message_tokens(message)
+        if cost > remaining:
+            break
+        packed.append({"role": message["role"], "content": message["content"]})
+        remaining -= cost
+    packed.reverse()
+
+    messages = [system]
+    if summary_msg:
+        messages.append(summary_msg)
+    if snippets:
+        messages.append({"role": "system", "content": KNOWLEDGE_HEADER + "\n".join(snippets)})
+    messages.extend(packed)
+    messages.append(user)
+    return messages
+
+
+def split_sentences(buffer: str, min_chars: int = 20) -> Tuple[List[str], str]:
+    """
+    Split streamed text into complete sentences and the unfinished remainder.
+    Sentences shorter than min_chars are merged forward so TTS isn't called per word.
+    """
+    parts = _SENTENCE_BREAK_RE.split(buffer)
+    remainder = parts.pop()
+    sentences, current = [], ""
+    for part in parts:
+        current = f"{current} {part}".strip() if current else part.strip()
+        if len(current) >= min_chars:
+            sentences.append(current)
+            current = ""
+    if current:
+        remainder = f"{current} {remainder}" if remainder else current
+    return sentences, remainder
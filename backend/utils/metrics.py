@@ -0,0 +1,204 @@
+"""
+In-process latency histograms and counters, exported in Prometheus text format.
+
+- span(name, **labels) times a block into a fixed-bucket histogram; traced() is
+  the decorator form. An observation is a bisect and three increments under one
+  lock, so spans can wrap every stage, provider call and Redis command.
+- inc(name, value, **labels) bumps a counter (SLA breaches, LLM tokens).
+- Multi-process safe: each Gunicorn/Celery process keeps its own registry and a
+  daemon thread adds its deltas to one Redis hash (HINCRBYFLOAT pipeline) every
+  METRICS_FLUSH_SEC. render() serves the totals for every process, and falls back
+  to this process's values if Redis is unavailable. A forked child starts from
+  an empty registry so nothing is counted twice.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Tuple
+
+import redis
+from config import Config
+import extensions
+
+REDIS_KEY = "metrics"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)  # seconds
+_SEP = "\x1f"
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one flush at a time, or two would send the same delta
+_histograms: Dict[Tuple[str, str], list] = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters: Dict[Tuple[str, str], float] = {}
+_flushed: Dict[str, float] = {}  # field -> value already added to Redis by this process
+_flusher = {"pid": None}
+
+
+def _labels(labels: dict) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    if not Config.METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    idx = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        hist[idx] += 1
+        hist[-1] += seconds
+    _ensure_flusher()
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if not Config.METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time the block into histogram `name`; adds outcome="ok"|"error"."""
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe(name, time.perf_counter() - t0, outcome=outcome, **labels)
+
+
+def traced(name: str, **labels) -> Callable:
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _snapshot() -> Dict[str, float]:
+    """Flat {field: value} view of this process's registry (field = kind, name, labels, part)."""
+    fields = {}
+    with _lock:
+        for (name, labels), hist in _histograms.items():
+            for i, count in enumerate(hist[:-1]):
+                if count:
+                    fields[_SEP.join(("h", name, labels, str(i)))] = count
+            fields[_SEP.join(("h", name, labels, "sum"))] = hist[-1]
+        for (name, labels), value in _counters.items():
+            fields[_SEP.join(("c", name, labels, ""))] = value
+    return fields
+
+
+def flush() -> bool:
+    """Add this process's changes since the last flush to the shared Redis hash."""
+    client = extensions.redis_client
+    if client is None:
+        return False
+    with _flush_lock:
+        current = _snapshot()
+        deltas = {f: v - _flushed.get(f, 0) for f, v in current.items() if v != _flushed.get(f, 0)}
+        if not deltas:
+            return True
+        try:
+            pipe = client.pipeline(transaction=False)
+            for field, delta in deltas.items():
+                pipe.hincrbyfloat(REDIS_KEY, field, delta)
+            pipe.execute()
+        except redis.RedisError:
+            logging.warning("Metrics flush failed; will retry", exc_info=True)
+            return False
+        _flushed.update(current)
+        return True
+
+
+def _ensure_flusher() -> None:
+    if _flusher["pid"] == os.getpid() or Config.METRICS_FLUSH_SEC <= 0:
+        return
+    with _lock:
+        if _flusher["pid"] == os.getpid():
+            return
+        _flusher["pid"] = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(Config.METRICS_FLUSH_SEC)
+        flush()
+
+
+def _reset_after_fork() -> None:
+    # The parent flushes its own values; the child must not report them again
+    global _lock, _flush_lock
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _histograms.clear()
+    _counters.clear()
+    _flushed.clear()
+    _flusher["pid"] = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def render() -> str:
+    """Prometheus text exposition (format 0.0.4) of the totals for every process."""
+    fields = None
+    if Config.METRICS_FLUSH_SEC > 0 and flush():
+        try:
+            raw = extensions.redis_client.hgetall(REDIS_KEY)
+            fields = {k.decode(): float(v) for k, v in raw.items()}
+        except redis.RedisError:
+            logging.warning("Metrics read failed; serving this process only", exc_info=True)
+    if fields is None:
+        fields = _snapshot()
+
+    histograms, counters = {}, {}
+    for field, value in fields.items():
+        kind, name, labels, part = field.split(_SEP)
+        if kind == "c":
+            counters.setdefault(name, {})[labels] = value
+            continue
+        hist = histograms.setdefault(name, {}).setdefault(labels, [0] * (len(BUCKETS) + 1) + [0.0])
+        hist[-1 if part == "sum" else int(part)] = value
+
+    lines = []
+    for name in sorted(counters):
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(counters[name].items()):
+            lines.append(f"{_series(name, labels)} {_num(value)}")
+    for name in sorted(histograms):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, hist in sorted(histograms[name].items()):
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), hist[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {_num(cumulative)}')
+            lines.append(f"{_series(name + '_sum', labels)} {_num(hist[-1])}")
+            lines.append(f"{_series(name + '_count', labels)} {_num(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+
+def _series(name: str, labels: str) -> str:
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -0,0 +1,81 @@
+"""
+Staged request pipeline on a bounded thread pool.
+
+- run_stages(): run independent stages concurrently, each inside its own Flask
+  app context (own DB session), and return their results plus per-stage timings.
+- run_background(): fire-and-forget work that is not needed for the reply and
+  may be lost if the process dies (e.g. caching a detected language); failures
+  are logged, never raised. Durable writes go through Celery or the
+  message_store stream instead.
+- submit(): per-sentence work of streamed voice replies (TTS).
+
+Each kind has its own bounded pool (PIPELINE_MAX_WORKERS, PIPELINE_BACKGROUND_WORKERS,
+PIPELINE_VOICE_WORKERS), so a long voice reply or a burst of background writes
+queues on its own pool instead of stalling the request-path stages. Every stage
+duration also lands in the pipeline_stage_seconds histogram (utils.metrics).
+"""
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+from flask import current_app
+from config import Config
+from utils import metrics
+
+_executor = ThreadPoolExecutor(max_workers=Config.PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline")
+_background = ThreadPoolExecutor(max_workers=Config.PIPELINE_BACKGROUND_WORKERS, thread_name_prefix="background")
+_voice = ThreadPoolExecutor(max_workers=Config.PIPELINE_VOICE_WORKERS, thread_name_prefix="voice")
+
+
+def _in_app_context(app, fn: Callable, *args, **kwargs):
+    with app.app_context():
+        return fn(*args, **kwargs)
+
+
+def _timed(app, name: str, fn: Callable, *args, **kwargs):
+    t0 = time.perf_counter()
+    with metrics.span("pipeline_stage_seconds", stage=name):
+        result = _in_app_context(app, fn, *args, **kwargs)
+    return result, round((time.perf_counter() - t0) * 1000, 2)
+
+
+def run_stages(stages: Dict[str, Tuple]) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    stages: {name: (fn, *args)}. All stages start at once; the call returns when
+    every stage has finished. The first stage exception is re-raised.
+    """
+    app = current_app._get_current_object()
+    futures = {name: _executor.submit(_timed, app, name, spec[0], *spec[1:]) for name, spec in stages.items()}
+    results, timings = {}, {}
+    for name, fut in futures.items():
+        results[name], timings[name] = fut.result()
+    return results, timings
+
+
+def timed_stage(timings: Dict[str, float], name: str, fn: Callable, *args, **kwargs):
+    """Run one stage inline on the request thread and record its duration."""
+    t0 = time.perf_counter()
+    try:
+        with metrics.span("pipeline_stage_seconds", stage=name):
+            return fn(*args, **kwargs)
+    finally:
+        timings[name] = round((time.perf_counter() - t0) * 1000, 2)
+
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """Start one voice stage on its pool (inside an app context) and return its Future."""
+    return _voice.submit(_in_app_context, current_app._get_current_object(), fn, *args, **kwargs)
+
+
+def run_background(fn: Callable, *args, **kwargs) -> None:
+    app = current_app._get_current_object()
+
+    def task():
+        try:
+            _in_app_context(app, fn, *args, **kwargs)
+        except Exception:
+            logging.exception("Background pipeline stage %s failed", getattr(fn, "__name__", fn))
+
+    _background.submit(task)
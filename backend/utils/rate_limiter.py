@@ -1,30 +1,150 @@
 """
-Simple rate-limiter decorator using Redis.
+Token-bucket rate-limiter decorator using Redis.
 
-- Use token bucket / leaky bucket algorithm.
-- Keep limits per user and per IP for abuse protection.
+- One atomic Lua script per request (single round trip, no check-then-set race).
+- Buckets per user (X-User-Id) and per IP are checked together; a request
+  spends a token from every bucket or from none.
+- Optional in-process pre-filter remembers recently rejected buckets until their
+  Retry-After, so obvious abusers are turned away without touching Redis.
+- Every response carries RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset;
+  429s also carry Retry-After. Redis errors fail open.
 """
 
+import logging
+import math
 import time
 from functools import wraps
+
+import redis
+from config import Config
 from extensions import redis_client
-from flask import request, jsonify
+from flask import request, jsonify, make_response
+from utils.cache import LRUCache
+
+# KEYS: bucket keys. ARGV: capacity_1, refill_per_ms_1, capacity_2, refill_per_ms_2, ...
+# Returns {allowed, remaining, retry_after_ms, reset_ms, limiting_index}
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local allowed = 1
+local retry_ms = 0
+local tokens = {}
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', KEYS[i], 'tk', 'ts')
+  local tk = tonumber(state[1]) or cap
+  local ts = tonumber(state[2]) or now
+  tk = math.min(cap, tk + math.max(0, now - ts) * rate)
+  tokens[i] = tk
+  if tk < 1 then
+    allowed = 0
+    retry_ms = math.max(retry_ms, math.ceil((1 - tk) / rate))
+  end
+end
+local remaining = -1
+local reset_ms = 0
+local limiting = 1
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local tk = tokens[i]
+  if allowed == 1 then tk = tk - 1 end
+  redis.call('HSET', KEYS[i], 'tk', tk, 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil(cap / rate) + 1000)
+  local left = math.floor(tk)
+  if remaining < 0 or left < remaining then
+    remaining = left
+    reset_ms = math.ceil((cap - tk) / rate)
+    limiting = i
+  end
+end
+return {allowed, remaining, retry_ms, reset_ms, limiting}
+"""
+
+_script = None
+_local_blocks = LRUCache(maxsize=Config.RATE_LIMIT_LOCAL_MAX_KEYS)
+
+
+def _bucket_script():
+    global _script
+    if _script is None:
+        _script = redis_client.register_script(TOKEN_BUCKET_LUA)
+    return _script
+
+
+def _buckets(key_prefix: str, limit: int, period: int, ip_limit: int):
+    """[(redis_key, capacity, refill_per_ms)] for the caller: per-user (if identified) and per-IP."""
+    buckets = []
+    user_id = request.headers.get("X-User-Id")
+    if user_id:
+        buckets.append((f"rl:{key_prefix}:u:{user_id}", limit, limit / (period * 1000.0)))
+    buckets.append((f"rl:{key_prefix}:ip:{request.remote_addr}", ip_limit, ip_limit / (period * 1000.0)))
+    return buckets
+
+
+def _locally_blocked(buckets):
+    """Retry-After seconds if any bucket is still inside a recent rejection window, else None."""
+    now = time.monotonic()
+    for key, capacity, _ in buckets:
+        until = _local_blocks.get(key)
+        if until is not None and until > now:
+            return capacity, math.ceil(until - now)
+    return None
+
+
+def consume(buckets):
+    """Spend one token from every bucket atomically. Returns (allowed, limit, remaining, reset_s, retry_after_s)."""
+    keys = [b[0] for b in buckets]
+    args = []
+    for _, capacity, rate in buckets:
+        args.extend([capacity, rate])
+    allowed, remaining, retry_ms, reset_ms, limiting = _bucket_script()(keys=keys, args=args)
+    limit = buckets[int(limiting) - 1][1]
+    retry_after = math.ceil(int(retry_ms) / 1000.0)
+    if not allowed and Config.RATE_LIMIT_LOCAL_PREFILTER:
+        _local_blocks.set(keys[int(limiting) - 1], time.monotonic() + retry_after, ttl=retry_after)
+    return bool(allowed), limit, max(int(remaining), 0), math.ceil(int(reset_ms) / 1000.0), retry_after
+
+
+def _with_headers(resp, limit, remaining, reset, retry_after=None):
+    resp.headers["RateLimit-Limit"] = str(limit)
+    resp.headers["RateLimit-Remaining"] = str(remaining)
+    resp.headers["RateLimit-Reset"] = str(reset)
+    if retry_after is not None:
+        resp.headers["Retry-After"] = str(max(retry_after, 1))
+    return resp
+
+
+def _rejected(limit, reset, retry_after):
+    return _with_headers(make_response(jsonify({"error": "rate_limited"}), 429), limit, 0, reset, retry_after)
+
+
+def rate_limit(key_prefix: str, limit: int = 120, period: int = 60, ip_limit: int = None):
+    """
+    Decorator that rate-limits the wrapped view.
+
+    `limit` tokens per `period` seconds per user; the per-IP bucket defaults to
+    limit * RATE_LIMIT_IP_MULTIPLIER so users behind a shared NAT aren't starved.
+    """
+    ip_limit = ip_limit or limit * Config.RATE_LIMIT_IP_MULTIPLIER
 
-def rate_limit(key_prefix: str, limit: int = 120, period: int = 60):
-    """Decorator that rate-limits the wrapped view."""
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            identifier = request.headers.get("X-User-Id") or request.remote_addr
-            key = f"rl:{key_prefix}:{identifier}"
-            current = redis_client.get(key)
-            if current is None:
-                redis_client.set(key, 1, ex=period)
-            else:
-                count = int(current)
-                if count >= limit:
-                    return jsonify({"error": "rate_limited"}), 429
-                redis_client.incr(key)
-            return fn(*args, **kwargs)
+            buckets = _buckets(key_prefix, limit, period, ip_limit)
+            if Config.RATE_LIMIT_LOCAL_PREFILTER:
+                blocked = _locally_blocked(buckets)
+                if blocked:
+                    capacity, retry_after = blocked
+                    return _rejected(capacity, retry_after, retry_after)
+            try:
+                allowed, cap, remaining, reset, retry_after = consume(buckets)
+            except redis.RedisError:
+                logging.warning("Rate limiter unavailable; allowing request", exc_info=True)
+                return fn(*args, **kwargs)
+            if not allowed:
+                return _rejected(cap, reset, retry_after)
+            return _with_headers(make_response(fn(*args, **kwargs)), cap, remaining, reset)
         return wrapper
     return decorator
@@ -5,16 +5,48 @@ and webhook signature helpers.
 Important:
 - Do NOT keep encryption keys in source or .env in prod; use KMS (AWS/GCP/Azure).
 - Use minimal encryption at application level for small fields; for DB-level encryption use DB features if available.
+
+Agent JWTs:
+- Signing config (HS256 secret, or RS256/ES256 keys from a local JWKS file) is
+  loaded once; the JWKS file is re-read only when its mtime changes.
+- Tokens must carry exp. Verified claims are cached in an LRU keyed by
+  sha256(token) until exp, so a repeat request costs one hash + dict lookup
+  instead of a signature check.
+- Revoked token ids (jti) live in a Redis sorted set mirrored into an in-process
+  set every JWT_REVOCATION_REFRESH_SEC; the per-request check is O(1).
 """
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
+import hashlib
+import hmac
+import json
+import logging
 import os
+import re
+import threading
+import time
 import jwt
+import redis
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from typing import Iterable, List, Optional
 from flask import request, jsonify, current_app
+from config import Config
+from utils.cache import LRUCache
+import extensions
+
+# Newest key first: encrypt_field uses it, decrypt_field accepts any listed key
+_key_env = Config.FERNET_KEYS or Config.FERNET_KEY or Fernet.generate_key().decode()
+FERNET_KEYS = [k.strip() for k in _key_env.split(",") if k.strip()]
+FERNET_KEY = FERNET_KEYS[0]
+fernet = MultiFernet([Fernet(k.encode()) for k in FERNET_KEYS])
+# No fallback: a per-process random key would make stored blind indexes unmatchable.
+# Checked when an index is computed (and flagged at startup by Config.validate), so
+# the rest of the app still runs without it.
+BLIND_INDEX_KEY = Config.BLIND_INDEX_KEY.encode() if Config.BLIND_INDEX_KEY else None
 
-FERNET_KEY = os.getenv("FERNET_KEY", Fernet.generate_key().decode())
-fernet = Fernet(FERNET_KEY.encode())
+_decrypt_pool = ThreadPoolExecutor(max_workers=Config.PII_DECRYPT_WORKERS, thread_name_prefix="pii")
+_decrypted = LRUCache(maxsize=Config.PII_CACHE_MAX, ttl=Config.PII_CACHE_TTL_SEC)
 
 def encrypt_field(plaintext: str) -> bytes:
     if plaintext is None:
@@ -26,6 +58,146 @@ def decrypt_field(cipher: bytes) -> str:
         return None
     return fernet.decrypt(cipher).decode("utf-8")
 
+def rotate_field(cipher: bytes) -> bytes:
+    """Re-encrypt under the newest key (no-op for None)."""
+    if cipher is None:
+        return None
+    return fernet.rotate(cipher)
+
+def decrypt_many(ciphers: Iterable[Optional[bytes]], use_cache: bool = False) -> List[Optional[str]]:
+    """
+    Decrypt many fields in parallel on a bounded pool (PII_DECRYPT_CHUNK per task).
+    use_cache serves repeats from a short-TTL in-memory cache keyed by ciphertext
+    digest (for hot agent views); plaintext never leaves this process.
+    """
+    ciphers = list(ciphers)
+    out: List[Optional[str]] = [None] * len(ciphers)
+    todo = []
+    for i, cipher in enumerate(ciphers):
+        if cipher is None:
+            continue
+        if use_cache:
+            hit = _decrypted.get(_cipher_digest(cipher))
+            if hit is not None:
+                out[i] = hit
+                continue
+        todo.append(i)
+    chunk = Config.PII_DECRYPT_CHUNK
+    if len(todo) <= chunk:
+        plain = [_decrypt_chunk([ciphers[i] for i in todo])]
+    else:
+        plain = list(_decrypt_pool.map(_decrypt_chunk, [[ciphers[i] for i in todo[j:j + chunk]]
+                                                        for j in range(0, len(todo), chunk)]))
+    for i, value in zip(todo, (v for part in plain for v in part)):
+        out[i] = value
+        if use_cache:
+            _decrypted.set(_cipher_digest(ciphers[i]), value)
+    return out
+
+def _decrypt_chunk(ciphers: List[bytes]) -> List[str]:
+    return [fernet.decrypt(c).decode("utf-8") for c in ciphers]
+
+def _cipher_digest(cipher: bytes) -> bytes:
+    return hashlib.sha256(cipher).digest()
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def normalize_phone(phone: str) -> str:
+    """Digits with country code, e.g. "+91 98765-43210" / "09876543210" -> "919876543210"."""
+    digits = re.sub(r"\D", "", phone)
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = Config.PII_DEFAULT_COUNTRY_CODE + digits[1:]
+    elif len(digits) == 10:
+        digits = Config.PII_DEFAULT_COUNTRY_CODE + digits
+    return digits
+
+def blind_index(value: str, kind: str) -> Optional[bytes]:
+    """
+    Deterministic HMAC-SHA256 of the normalized value, domain-separated by kind
+    ("email"/"phone"). Equal inputs give equal indexes, so the column supports
+    indexed equality lookups; it reveals nothing without BLIND_INDEX_KEY.
+    """
+    if value is None:
+        return None
+    if BLIND_INDEX_KEY is None:
+        raise RuntimeError("BLIND_INDEX_KEY is not set; email/phone lookups need a stable HMAC key")
+    normalized = normalize_email(value) if kind == "email" else normalize_phone(value) if kind == "phone" else value
+    return hmac.new(BLIND_INDEX_KEY, f"{kind}:{normalized}".encode("utf-8"), hashlib.sha256).digest()
+
+REVOKED_KEY = "jwt:revoked"  # sorted set: jti -> exp
+
+_claims_cache = LRUCache(maxsize=Config.JWT_CACHE_MAX)
+_jwt_lock = threading.Lock()
+_jwt_keys = {"mtime": None, "by_kid": {}, "default": None}
+_revoked = {"ids": frozenset(), "checked_at": 0.0}
+
+def _signing_key(token: str):
+    """Key for token: the HS secret, or the JWKS entry named by the header kid."""
+    algorithms = _algorithms()
+    if not Config.JWT_JWKS_PATH:
+        return Config.JWT_SECRET
+    mtime = os.stat(Config.JWT_JWKS_PATH).st_mtime
+    if mtime != _jwt_keys["mtime"]:
+        with _jwt_lock:
+            if mtime != _jwt_keys["mtime"]:
+                with open(Config.JWT_JWKS_PATH) as fh:
+                    jwks = jwt.PyJWKSet.from_dict(json.load(fh))
+                by_kid = {k.key_id: k.key for k in jwks.keys if k.key_id}
+                _jwt_keys.update(mtime=mtime, by_kid=by_kid, default=jwks.keys[0].key if len(jwks.keys) == 1 else None)
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = _jwt_keys["by_kid"].get(kid) if kid else _jwt_keys["default"]
+    if key is None:
+        raise jwt.InvalidTokenError(f"unknown signing key {kid!r} for algorithms {algorithms}")
+    return key
+
+def _algorithms():
+    return [a.strip() for a in Config.JWT_ALGORITHMS.split(",") if a.strip()]
+
+def verify_agent_token(token: str) -> dict:
+    """
+    Verified claims for token; raises jwt.InvalidTokenError when the token is
+    invalid, expired, revoked or has no exp (revocations are kept only until exp).
+    Cache hits skip signature verification.
+    """
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = _claims_cache.get(digest)
+    if claims is None:
+        claims = jwt.decode(token, _signing_key(token), algorithms=_algorithms(), audience=Config.JWT_AUDIENCE,
+                            issuer=Config.JWT_ISSUER, leeway=Config.JWT_LEEWAY_SEC,
+                            options={"verify_aud": bool(Config.JWT_AUDIENCE), "require": ["exp"]})
+        ttl = claims["exp"] + Config.JWT_LEEWAY_SEC - time.time()
+        if ttl > 0:
+            _claims_cache.set(digest, claims, ttl=ttl)
+    jti = claims.get("jti")
+    if jti is not None and jti in _revoked_ids():
+        raise jwt.InvalidTokenError("token revoked")
+    return claims
+
+def revoke_token(jti: str, exp: float) -> None:
+    """Revoke a token id until its exp. Takes effect in every process within JWT_REVOCATION_REFRESH_SEC."""
+    extensions.redis_client.zadd(REVOKED_KEY, {jti: exp})
+    _revoked["ids"] = _revoked["ids"] | {jti}
+
+def _revoked_ids() -> frozenset:
+    now = time.time()
+    if now - _revoked["checked_at"] < Config.JWT_REVOCATION_REFRESH_SEC:
+        return _revoked["ids"]
+    _revoked["checked_at"] = now
+    if extensions.redis_client is None:
+        return _revoked["ids"]
+    try:
+        pipe = extensions.redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(REVOKED_KEY, "-inf", now)  # expired tokens fail exp anyway
+        pipe.zrange(REVOKED_KEY, 0, -1)
+        _, members = pipe.execute()
+        _revoked["ids"] = frozenset(m.decode() for m in members)
+    except redis.RedisError:
+        logging.warning("JWT revocation refresh failed; keeping previous set", exc_info=True)
+    return _revoked["ids"]
+
 def admin_required(f):
     """Agent/employee auth decorator. Replace simple JWT verification with real auth in prod."""
     @wraps(f)
@@ -35,11 +207,11 @@ def admin_required(f):
             return jsonify({"error": "Unauthorized"}), 401
         token = auth_header.split(" ", 1)[1]
         try:
-            payload = jwt.decode(token, os.getenv("JWT_SECRET", "secret"), algorithms=["HS256"])
-            if payload.get("role") != "agent":
-                return jsonify({"error": "Forbidden"}), 403
-            request.agent = payload  # attach agent info
+            payload = verify_agent_token(token)
         except Exception:
             return jsonify({"error": "Unauthorized"}), 401
+        if payload.get("role") != "agent":
+            return jsonify({"error": "Forbidden"}), 403
+        request.agent = payload  # attach agent info
         return f(*args, **kwargs)
     return wrapper